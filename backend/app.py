@@ -3,26 +3,44 @@ import json
 import base64
 import uuid
 import os
+import atexit
+import signal
+import sys
 import decimal
 from datetime import datetime
+from crossmodal.lexicon import Lexicon, DEFAULT_LEXICON_PATH
+from crossmodal.rules import RuleSet, DEFAULT_RULES_PATH
+from crossmodal.persistence import BatchWriter
 
 
 rekognition = boto3.client('rekognition', region_name='us-east-1')
 comprehend = boto3.client('comprehend', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-table = dynamodb.Table('ContentModerationResults')
+dynamodb = boto3.resource('dynamodb', region_name='us-east-1',
+                          endpoint_url=os.getenv("DYNAMODB_ENDPOINT_URL") or None)
 
+# Results are written by a background thread, with batching and retries.
+# The thread is frozen as soon as the handler returns, and an idle
+# environment can be shut down without SIGTERM or atexit running (Lambda
+# only signals the runtime when an extension is registered), so each
+# invocation flushes its result before returning, waiting at most
+# PERSIST_DRAIN_TIMEOUT seconds. The shutdown drain is only a backstop.
+WRITER = BatchWriter.from_env(dynamodb, os.getenv("DYNAMODB_TABLE", "ContentModerationResults"))
+PERSIST_DRAIN_TIMEOUT = float(os.getenv("PERSIST_DRAIN_TIMEOUT", "1.5"))
 
-UNSAFE_WORDS = {
-    'kill', 'murder', 'bomb', 'terrorist', 'weapon', 'gun', 'attack', 
-    'racist', 'hate', 'porn', 'violent', 'protest', 'riot', 'assault',
-    'weapons', 'violence', 'harm', 'danger', 'threat', 'death', 'dead',
-    'suicide', 'bombing', 'explosion', 'shoot', 'shooting', 'hostage',
-    'terrorism', 'extremist', 'radical', 'abuse', 'assault', 'rape',
-    'pedophile', 'child abuse', 'molest', 'blackmail', 'extortion'
-}
+def drain_writer(signum=None, frame=None):
+    WRITER.close(PERSIST_DRAIN_TIMEOUT)
+    if signum is not None:
+        sys.exit(0)
 
-SAFE_WORDS = {'family', 'education', 'health', 'safety', 'community', 'peace'}
+atexit.register(drain_writer)
+signal.signal(signal.SIGTERM, drain_writer)
+
+
+# Word lists and category tables come from the shared versioned lexicon file
+LEXICON = Lexicon.load(os.getenv("LEXICON_PATH", DEFAULT_LEXICON_PATH))
+
+# Risk rules come from the shared versioned rules file, compiled once per cold start
+RULES = RuleSet.load(os.getenv("RULES_PATH", DEFAULT_RULES_PATH)).compile(LEXICON)
 
 def lambda_handler(event, context):
     try:
@@ -46,7 +64,7 @@ def lambda_handler(event, context):
         
         image_result = analyze_image(image_bytes)
         text_result = analyze_text(body['text'])
-        risk_score = assess_risk(image_result, text_result)
+        risk_score, rules_fired = assess_risk(image_result, text_result)
         
         analysis_id = f"mod_{uuid.uuid4().hex[:8]}"
         
@@ -60,9 +78,15 @@ def lambda_handler(event, context):
             'text_sentiment': text_result['sentiment'],
             'unsafe_words_found': text_result['unsafe_found'],
             'moderation_flagged': image_result['moderation_flagged'],
-            'explanation': generate_explanation(risk_score, image_result, text_result)
+            'explanation': generate_explanation(risk_score, image_result, text_result),
+            'rules_fired': rules_fired,
+            'rules_version': RULES.version,
+            'lexicon_version': LEXICON.version
         }
-        table.put_item(Item=item)
+        if not WRITER.put(item):
+            print(f"⚠️ Persistence queue full, {analysis_id} not persisted")
+        elif not WRITER.flush(PERSIST_DRAIN_TIMEOUT):
+            print(f"⚠️ {analysis_id} not written within {PERSIST_DRAIN_TIMEOUT}s, it may be lost if this environment is shut down")
         
         return {
             'statusCode': 200,
@@ -74,7 +98,10 @@ def lambda_handler(event, context):
                 'image_categories': image_result['categories'][:3],
                 'text_sentiment': text_result['sentiment'],
                 'unsafe_found': text_result['unsafe_found'],
-                'explanation': generate_explanation(risk_score, image_result, text_result)
+                'explanation': generate_explanation(risk_score, image_result, text_result),
+                'rules_fired': rules_fired,
+                'rules_version': RULES.version,
+                'lexicon_version': LEXICON.version
             })
         }
         
@@ -93,13 +120,7 @@ def analyze_image(image_bytes):
 
 def analyze_text(text):
     sentiment = comprehend.detect_sentiment(Text=text, LanguageCode='en')
-    text_lower = text.lower()
-    
-    
-    unsafe_found = []
-    for word in UNSAFE_WORDS:
-        if f' {word} ' in f' {text_lower} ':
-            unsafe_found.append(word)
+    unsafe_found = LEXICON.unsafe_matcher.matched_terms(text)
     
     return {
         'sentiment': sentiment['Sentiment'],
@@ -108,51 +129,10 @@ def analyze_text(text):
     }
 
 def assess_risk(image, text):
-    risk = 0.0
-    
-    
-    SAFE_IMAGE_CATEGORIES = {'Family', 'Child', 'Person', 'Nature', 'Animal', 'People', 'Face', 'Portrait', 'Kid', 'Baby'}
-    UNSAFE_IMAGE_CATEGORIES = {'Weapon', 'Violence', 'Fire', 'Riot', 'Protest', 'Drugs', 'Alcohol'}
-    
-    # 1. CONTEXTUAL MISMATCH DETECTION 
-    image_safe = any(cat in SAFE_IMAGE_CATEGORIES for cat in image['categories'])
-    image_unsafe = any(cat in UNSAFE_IMAGE_CATEGORIES for cat in image['categories'])
-    has_unsafe_words = len(text['unsafe_found']) > 0
-    
-    
-    if image_safe and has_unsafe_words:
-        risk += 0.6  
-        print(f"🚨 CONTEXTUAL MISMATCH: Safe image with unsafe words: {text['unsafe_found']}")
-    
-      
-    if image_unsafe and text['sentiment'] == 'POSITIVE':
-        risk += 0.5
-        print(f"🚨 CONTEXTUAL MISMATCH: Unsafe image with positive text")
-    
-    # 2. INDIVIDUAL RISK FACTORS
-    if has_unsafe_words:
-        risk += 0.3
-        print(f"⚠️ UNSAFE WORDS DETECTED: {text['unsafe_found']}")
-    
-    if image['moderation_flagged']:
-        risk += 0.4
-        print(f"⚠️ IMAGE MODERATION FLAGGED: {image.get('moderation_labels', [])}")
-    
-    if text['sentiment'] == 'NEGATIVE':
-        risk += 0.2
-        print(f"📝 NEGATIVE SENTIMENT DETECTED")
-    
-    # 3. CONTEXTUAL ALIGNMENT BONUS (REDUCE RISK)
-    if image_safe and text['sentiment'] == 'POSITIVE' and not has_unsafe_words:
-        risk -= 0.3  
-        risk = max(risk, 0.0)  
-        print(f"✅ CONTEXTUALLY ALIGNED: Safe image with positive text")
-    
-    
-    final_risk = min(max(risk, 0.0), 1.0)
-    print(f"🎯 FINAL RISK SCORE: {final_risk}")
-    
-    return final_risk
+    """Score with the compiled rule set; returns the score and the ids of the rules that fired"""
+    result = RULES.evaluate(image, text)
+    print(f"🎯 FINAL RISK SCORE: {result.score} (rules: {', '.join(result.fired) or 'none'})")
+    return result
 
 def generate_explanation(risk_score, image, text):
     if risk_score > 0.7:
@@ -2,6 +2,7 @@ import streamlit as st
 import requests
 import json
 import base64
+import os
 import plotly.graph_objects as go
 import plotly.express as px
 from datetime import datetime
@@ -15,6 +16,44 @@ st.set_page_config(
 
 
 API_URL = "https://nhe6kure30.execute-api.us-east-1.amazonaws.com/prod/moderate"
+# Fusion service, which keeps the queryable copy of every result
+ANALYTICS_URL = os.getenv("ANALYTICS_URL", "http://localhost:8005")
+
+RISK_BAND_LABELS = {'very_low': 'Very Low Risk', 'low': 'Low Risk', 'medium': 'Medium Risk', 'high': 'High Risk'}
+
+
+@st.cache_data(ttl=30)
+def fetch_summary(window):
+    response = requests.get(f"{ANALYTICS_URL}/analytics/summary",
+                            params={"window": window, "compare": "true"}, timeout=5)
+    response.raise_for_status()
+    summary = response.json()
+    if 'error' in summary:
+        raise RuntimeError(summary['error'])
+    return summary
+
+
+@st.cache_data(ttl=10)
+def fetch_live_stats(resolution, last):
+    response = requests.get(f"{ANALYTICS_URL}/stats",
+                            params={"resolution": resolution, "last": last, "top": 10}, timeout=5)
+    response.raise_for_status()
+    stats = response.json()
+    if 'error' in stats:
+        raise RuntimeError(stats['error'])
+    return stats
+
+
+def percent_change(current, previous):
+    if not previous:
+        return None
+    return f"{(current - previous) / previous:+.0%}"
+
+
+def format_latency(latency_ms):
+    if latency_ms is None:
+        return "n/a"
+    return f"{latency_ms / 1000:.2f}s" if latency_ms >= 1000 else f"{latency_ms:.0f}ms"
 
 
 st.markdown("""
@@ -221,33 +260,76 @@ with tab1:
 with tab2:
     st.subheader("System Analytics & Insights")
     
+    window = st.selectbox("Time window", ["1h", "24h", "7d", "30d"], index=1)
     
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("Total Analyses", "1,247", "12%")
-    with col2:
-        st.metric("Flagged Content", "86", "-3%")
-    with col3:
-        st.metric("Accuracy Rate", "94%", "2%")
-    with col4:
-        st.metric("Avg Processing Time", "1.2s", "0.3s")
+    try:
+        summary = fetch_summary(window)
+    except Exception as e:
+        st.warning(f"Analytics unavailable from {ANALYTICS_URL}: {str(e)}")
+        summary = None
     
+    if summary:
+        previous = summary['previous']
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("Total Analyses", f"{summary['total']:,}", percent_change(summary['total'], previous['total']))
+        with col2:
+            st.metric("Flagged Content", f"{summary['needs_review']:,}",
+                      percent_change(summary['needs_review'], previous['needs_review']), delta_color="inverse")
+        with col3:
+            st.metric("Avg Risk Score", f"{summary['avg_risk']:.2f}",
+                      f"{summary['avg_risk'] - previous['avg_risk']:+.2f}" if previous['total'] else None,
+                      delta_color="inverse")
+        with col4:
+            p95, previous_p95 = summary['latency_ms']['p95'], previous['latency_ms']['p95']
+            st.metric("p95 Processing Time", format_latency(p95),
+                      f"{(p95 - previous_p95) / 1000:+.2f}s" if p95 is not None and previous_p95 is not None else None,
+                      delta_color="inverse")
+        
+        if summary['total']:
+            col1, col2 = st.columns(2)
+            
+            with col1:
+                risk_data = {RISK_BAND_LABELS[band]: count for band, count in summary['risk_bands'].items()}
+                fig = px.pie(values=list(risk_data.values()), names=list(risk_data.keys()), title="Risk Distribution")
+                st.plotly_chart(fig, use_container_width=True)
+            
+            with col2:
+                sentiment_data = {sentiment.title(): count for sentiment, count in summary['sentiments'].items()}
+                fig = px.bar(x=list(sentiment_data.keys()), y=list(sentiment_data.values()), 
+                             title="Text Sentiment Analysis")
+                st.plotly_chart(fig, use_container_width=True)
+        else:
+            st.info(f"No analyses in the last {window}")
     
-    col1, col2 = st.columns(2)
+    st.markdown("#### Live Trends (last 24 hours)")
+    try:
+        live = fetch_live_stats("1h", 23)
+    except Exception as e:
+        st.warning(f"Live stats unavailable from {ANALYTICS_URL}: {str(e)}")
+        live = None
     
-    with col1:
+    if live:
+        col1, col2 = st.columns(2)
         
-        risk_data = {'Low Risk': 65, 'Medium Risk': 25, 'High Risk': 10}
-        fig = px.pie(values=risk_data.values(), names=risk_data.keys(), title="Risk Distribution")
-        st.plotly_chart(fig, use_container_width=True)
-    
-    with col2:
+        with col1:
+            categories = live['top_categories']
+            if categories:
+                fig = px.bar(x=[c['count'] for c in categories], y=[c['value'] for c in categories],
+                             orientation='h', title="Top Image Categories")
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No image categories yet")
         
-        sentiment_data = {'Positive': 45, 'Negative': 30, 'Neutral': 20, 'Mixed': 5}
-        fig = px.bar(x=list(sentiment_data.keys()), y=list(sentiment_data.values()), 
-                     title="Text Sentiment Analysis")
-        st.plotly_chart(fig, use_container_width=True)
+        with col2:
+            terms = live['top_terms']
+            if terms:
+                fig = px.bar(x=[t['count'] for t in terms], y=[t['value'] for t in terms],
+                             orientation='h', title="Top Matched Unsafe Terms")
+                st.plotly_chart(fig, use_container_width=True)
+            else:
+                st.info("No unsafe terms matched")
 
 with tab3:
     st.subheader("About This Project")
@@ -0,0 +1,133 @@
+"""Benchmark: Comprehend calls, throttling and latency for a burst of texts, with and without batching.
+
+Posts --texts texts at once (in --languages languages, one in ten over
+Comprehend's 5,000 byte limit) to text-service's /analyze in-process,
+once with a detect_sentiment call per text and once with
+batch_detect_sentiment micro-batching (COMPREHEND_BATCHING). Comprehend
+is replaced by a stand-in that takes --rtt-ms per call and throttles
+calls beyond --tps per second, as the real API does. The result cache
+is off. Needs the text-service requirements and httpx installed. Run
+from ml-microservices-platform/:
+
+    python benchmarks/bench_comprehend_batching.py [--texts 400] [--tps 20] [--rtt-ms 80]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'services', 'text-service'))
+os.environ.update({
+    'RESULT_CACHE_MAX_ENTRIES': '0',
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+})
+
+import httpx
+import app as text_service
+from batching import COMPREHEND_MAX_BYTES, SentimentBatcher
+
+SAMPLES = {
+    'en': "I really love how this turned out, it is the best one yet",
+    'es': "No me gusta nada, es muy malo y el servicio fue peor",
+    'fr': "Je suis très content de cette photo avec mes amis",
+    'de': "Das ist nicht gut und ich bin sehr enttäuscht von dem Produkt",
+}
+
+
+class ThrottledComprehend:
+    """Comprehend stand-in: ``rtt`` per call, and ThrottlingException past ``tps`` calls in any second"""
+
+    def __init__(self, tps: int, rtt_ms: float):
+        self.tps = tps
+        self.rtt = rtt_ms / 1000
+        self.lock = threading.Lock()
+        self.started = []
+        self.calls = 0
+        self.throttled = 0
+
+    def _admit(self):
+        with self.lock:
+            self.calls += 1
+            now = time.monotonic()
+            self.started = [t for t in self.started if now - t < 1]
+            if len(self.started) >= self.tps:
+                self.throttled += 1
+                raise RuntimeError("ThrottlingException: Rate exceeded")
+            self.started.append(now)
+        time.sleep(self.rtt)
+
+    @staticmethod
+    def _score(text: str) -> dict:
+        assert len(text.encode('utf-8')) <= COMPREHEND_MAX_BYTES
+        return {'Sentiment': 'NEUTRAL', 'SentimentScore': {'Positive': 0.1, 'Negative': 0.1, 'Neutral': 0.8, 'Mixed': 0.0}}
+
+    def detect_sentiment(self, Text, LanguageCode):
+        self._admit()
+        return self._score(Text)
+
+    def batch_detect_sentiment(self, TextList, LanguageCode):
+        self._admit()
+        return {'ResultList': [{'Index': i, **self._score(text)} for i, text in enumerate(TextList)], 'ErrorList': []}
+
+
+def burst(count: int, languages: int) -> list:
+    names = list(SAMPLES)[:languages]
+    texts = []
+    for i in range(count):
+        text = f"{SAMPLES[names[i % len(names)]]} #{i}"
+        texts.append(f"{text}. " * 120 if i % 10 == 0 else text)
+    return texts
+
+
+async def run(texts: list, comprehend: ThrottledComprehend) -> dict:
+    transport = httpx.ASGITransport(app=text_service.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+        async def post(text):
+            start = time.perf_counter()
+            response = await client.post('/analyze', json={'text_content': text})
+            return time.perf_counter() - start, response.status_code == 200 and 'error' not in response.json()
+
+        results = await asyncio.gather(*(post(text) for text in texts))
+    return {
+        'calls': comprehend.calls,
+        'throttled': comprehend.throttled,
+        'ok': sum(ok for _, ok in results),
+        'p50_ms': statistics.median(latency for latency, _ in results) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--texts', type=int, default=400)
+    parser.add_argument('--languages', type=int, default=4)
+    parser.add_argument('--tps', type=int, default=20)
+    parser.add_argument('--rtt-ms', type=float, default=80)
+    parser.add_argument('--window-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    texts = burst(args.texts, args.languages)
+    rows = {}
+    for name in ('per text', 'batched'):
+        comprehend = ThrottledComprehend(args.tps, args.rtt_ms)
+        text_service.comprehend = comprehend
+        text_service.sentiment_batcher = SentimentBatcher(
+            comprehend, text_service.aws_executor, window=args.window_ms / 1000, max_pending=args.texts * 10
+        ) if name == 'batched' else None
+        # The burst is meant to reach Comprehend, not be shed by admission control
+        text_service.aws_executor.max_concurrency = args.texts
+        rows[name] = asyncio.run(run(texts, comprehend))
+
+    print(f"{args.texts} texts in {args.languages} languages, {args.tps} calls/s allowed, rtt {args.rtt_ms:g} ms")
+    print(f"{'':>10} {'calls':>7} {'throttled':>10} {'ok':>6} {'p50 ms':>8}")
+    for name, row in rows.items():
+        print(f"{name:>10} {row['calls']:>7} {row['throttled']:>10} {row['ok']:>6} {row['p50_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Benchmark: bytes sent to Rekognition and image-service latency, with and without preprocessing.
+
+Runs image-service's /analyze in-process on synthetic uploads (a 12 MP
+camera JPEG with EXIF, a 4K PNG screenshot, 2 and 3 MP PNG photos and a
+640x480 JPEG), once sending the upload as is and once after downscaling and
+re-encoding (IMAGE_PREPROCESS). Rekognition is replaced by a stand-in
+that takes a round trip plus the payload's upload time at --uplink-mbps
+for each of the two calls, and rejects payloads over 5 MB as the real
+API does. The result cache and near-duplicate index are off. Needs the
+image-service requirements and httpx installed (numpy is one of them).
+Run from ml-microservices-platform/:
+
+    python benchmarks/bench_image_preprocess.py [--requests 20] [--uplink-mbps 100] [--rtt-ms 60]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'services', 'image-service'))
+os.environ.update({
+    'RESULT_CACHE_MAX_ENTRIES': '0',
+    'IMAGE_INDEX_DIR': '',
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+})
+
+import httpx
+import app as image_service
+from preprocessing import REKOGNITION_MAX_BYTES
+
+
+class SlowRekognition:
+    """Rekognition stand-in whose latency is a round trip plus the upload time of the payload"""
+
+    def __init__(self, uplink_mbps: float, rtt_ms: float):
+        self.bytes_per_second = uplink_mbps * 1e6 / 8
+        self.rtt = rtt_ms / 1000
+        self.sent = []
+
+    def _call(self, Image, **kwargs):
+        payload = Image['Bytes']
+        self.sent.append(len(payload))
+        time.sleep(self.rtt + len(payload) / self.bytes_per_second)
+        if len(payload) > REKOGNITION_MAX_BYTES:
+            raise ValueError("InvalidParameterException: image size exceeds 5 MB")
+
+    def detect_labels(self, **kwargs):
+        self._call(**kwargs)
+        return {'Labels': [{'Name': 'Person'}]}
+
+    def detect_moderation_labels(self, **kwargs):
+        self._call(**kwargs)
+        return {'ModerationLabels': []}
+
+
+def photo(width: int, height: int, seed: int) -> Image.Image:
+    """Smooth gradients with sensor-like noise, so encoders see photo-like entropy"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        127 + 100 * np.sin(x / (width / 7) + seed),
+        127 + 100 * np.cos(y / (height / 5) - seed),
+        127 + 100 * np.sin((x + y) / (width / 3)),
+    ], axis=-1)
+    noise = rng.normal(0, 12, size=base.shape)
+    return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), 'RGB')
+
+
+def screenshot(width: int, height: int, seed: int) -> Image.Image:
+    """Flat panels and text-like strokes, as a UI capture would have"""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((height, width, 3), 245, dtype=np.uint8)
+    for _ in range(40):
+        x0, y0 = rng.integers(0, width - 200), rng.integers(0, height - 100)
+        pixels[y0:y0 + rng.integers(20, 100), x0:x0 + rng.integers(50, 200)] = rng.integers(0, 255, 3)
+    strokes = rng.random((height, width)) < 0.08
+    pixels[strokes] = 30
+    return Image.fromarray(pixels, 'RGB')
+
+
+def encode(image: Image.Image, fmt: str, **params) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    return buffer.getvalue()
+
+
+def uploads() -> dict:
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x010f] = 'BenchCam'
+    return {
+        '12MP camera JPEG': encode(photo(4032, 3024, 1), 'JPEG', quality=92, exif=exif.tobytes()),
+        '4K PNG screenshot': encode(screenshot(3840, 2160, 2), 'PNG'),
+        '2MP PNG photo': encode(photo(1920, 1080, 3), 'PNG'),
+        '3MP PNG photo': encode(photo(2048, 1536, 5), 'PNG'),
+        '640x480 JPEG': encode(photo(640, 480, 4), 'JPEG', quality=85),
+    }
+
+
+async def run(uploads: dict, requests: int, rekognition: SlowRekognition) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=image_service.app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+        for name, data in uploads.items():
+            body = {'image_data': base64.b64encode(data).decode()}
+            latencies, failures = [], 0
+            rekognition.sent.clear()
+            for _ in range(requests):
+                start = time.perf_counter()
+                response = await client.post('/analyze', json=body)
+                latencies.append(time.perf_counter() - start)
+                failures += response.status_code != 200 or 'error' in response.json()
+            results[name] = {
+                'uploaded': len(data),
+                'sent': statistics.mean(rekognition.sent) if rekognition.sent else 0,
+                'p50_ms': statistics.median(latencies) * 1000,
+                'failures': failures,
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--uplink-mbps', type=float, default=100)
+    parser.add_argument('--rtt-ms', type=float, default=60)
+    args = parser.parse_args()
+
+    rekognition = SlowRekognition(args.uplink_mbps, args.rtt_ms)
+    image_service.rekognition = rekognition
+    data = uploads()
+
+    image_service.IMAGE_PREPROCESS_ENABLED = False
+    before = asyncio.run(run(data, args.requests, rekognition))
+    image_service.IMAGE_PREPROCESS_ENABLED = True
+    after = asyncio.run(run(data, args.requests, rekognition))
+
+    print(f"uplink {args.uplink_mbps:g} Mbit/s, rtt {args.rtt_ms:g} ms, max dimension "
+          f"{image_service.IMAGE_MAX_DIMENSION}, JPEG quality {image_service.IMAGE_JPEG_QUALITY}")
+    print(f"{'upload':>18} {'uploaded KB':>12} {'sent KB':>8} {'p50 ms':>8} {'prep sent KB':>13} {'prep p50 ms':>12} "
+          f"{'failed':>7}")
+    for name in data:
+        b, a = before[name], after[name]
+        print(f"{name:>18} {b['uploaded'] / 1024:>12.0f} {b['sent'] / 1024:>8.0f} {b['p50_ms']:>8.1f} "
+              f"{a['sent'] / 1024:>13.0f} {a['p50_ms']:>12.1f} {b['failures']:>3}/{a['failures']}")
+
+
+if __name__ == "__main__":
+    main()
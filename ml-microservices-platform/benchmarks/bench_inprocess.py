@@ -0,0 +1,164 @@
+"""Benchmark: context -> risk -> fusion over HTTP vs. in-process.
+
+Starts the three services with uvicorn on local ports, then runs the same
+synthetic analyses through the orchestrator's ServiceClients twice: once
+calling the services over pooled HTTP, once with the stages loaded
+in-process (INPROCESS_STAGES). Reports per-analysis latency for sequential
+calls and throughput with concurrent ones, and checks both modes agree on
+every risk score. Persistence is switched off on both sides. Needs the
+orchestrator, context, risk and fusion requirements installed. Run from
+ml-microservices-platform/:
+
+    python benchmarks/bench_inprocess.py [--requests 2000] [--concurrency 32]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SHARED = os.path.join(ROOT, 'shared')
+SERVICES = os.path.join(ROOT, 'services')
+sys.path.insert(0, SHARED)
+sys.path.insert(0, os.path.join(SERVICES, 'orchestrator'))
+
+# Same settings for the in-process stages and the service subprocesses
+STAGE_ENV = {
+    'RESULT_STORE_URL': 'none',
+    'STATS_SNAPSHOT_PATH': '',
+    'MODEL_REGISTRY_DIR': tempfile.mkdtemp(prefix='bench_registry_'),
+    'DYNAMODB_ENDPOINT_URL': 'http://127.0.0.1:9',
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+    'PERSIST_MAX_QUEUE': '1',
+    'PERSIST_OVERFLOW_POLICY': 'drop_oldest',
+    'PERSIST_MAX_RETRIES': '0',
+    'PERSIST_DRAIN_TIMEOUT': '0',
+}
+os.environ.update(STAGE_ENV)
+
+from http_clients import ServiceClients
+from local_stages import LOCAL_STAGE_DIRS, load_local_stages
+
+TIMEOUTS = {stage: 10.0 for stage in LOCAL_STAGE_DIRS}
+
+IMAGES = [
+    {'categories': ['Person', 'Outdoors'], 'moderation_flagged': False},
+    {'categories': ['Weapon', 'Gun'], 'moderation_flagged': True},
+    {'categories': ['Dog', 'Pet'], 'moderation_flagged': False},
+]
+TEXTS = [
+    {'sentiment': 'POSITIVE', 'unsafe_found': []},
+    {'sentiment': 'NEGATIVE', 'unsafe_found': ['kill']},
+    {'sentiment': 'NEUTRAL', 'unsafe_found': []},
+]
+CONTEXTS = [{}, {'platform': 'twitter', 'user_age': 30}, {'platform': 'instagram', 'location': 'US'}]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_services() -> (dict, list):
+    urls, processes = {}, []
+    env = {**os.environ, **STAGE_ENV, 'PYTHONPATH': SHARED}
+    for stage, directory in LOCAL_STAGE_DIRS.items():
+        port = free_port()
+        processes.append(subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'app:app', '--port', str(port), '--log-level', 'warning'],
+            cwd=os.path.join(SERVICES, directory), env=env, stdout=subprocess.DEVNULL
+        ))
+        urls[stage] = f"http://127.0.0.1:{port}"
+    for stage, url in urls.items():
+        deadline = time.time() + 30
+        while True:
+            try:
+                urllib.request.urlopen(f"{url}/health", timeout=1)
+                break
+            except OSError:
+                if time.time() > deadline:
+                    raise SystemExit(f"❌ {stage} service did not start")
+                time.sleep(0.2)
+    return urls, processes
+
+
+async def analyze(clients: ServiceClients, i: int) -> float:
+    """The orchestrator's context -> risk -> fusion chain for one item; returns the risk score"""
+    image, text = IMAGES[i % len(IMAGES)], TEXTS[i % len(TEXTS)]
+    context = await clients.post_json('context', '/analyze', {'context': CONTEXTS[i % len(CONTEXTS)]})
+    risk = await clients.post_json('risk', '/assess', {
+        'image_analysis': image, 'text_analysis': text, 'context_analysis': context
+    })
+    fused = await clients.post_json('fusion', '/fuse', {
+        'risk_assessment': risk, 'image_analysis': image, 'text_analysis': text
+    })
+    return fused['risk_score']
+
+
+async def run_mode(clients: ServiceClients, requests: int, concurrency: int) -> dict:
+    await clients.start()
+    try:
+        for i in range(50):
+            await analyze(clients, i)
+        latencies, scores = [], []
+        for i in range(requests):
+            start = time.perf_counter()
+            scores.append(await analyze(clients, i))
+            latencies.append(time.perf_counter() - start)
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def limited(i):
+            async with semaphore:
+                return await analyze(clients, i)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(limited(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        await clients.close()
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'throughput': requests / elapsed,
+        'scores': scores,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    urls, processes = start_services()
+    try:
+        http = asyncio.run(run_mode(ServiceClients(urls, TIMEOUTS), args.requests, args.concurrency))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+    local = asyncio.run(run_mode(
+        ServiceClients(urls, TIMEOUTS, local=load_local_stages(list(LOCAL_STAGE_DIRS))),
+        args.requests, args.concurrency
+    ))
+
+    print(f"{'mode':>11} {'p50 ms':>8} {'p95 ms':>8} {f'analyses/s @{args.concurrency}':>18}")
+    for name, result in (('http', http), ('in-process', local)):
+        print(f"{name:>11} {result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f} {result['throughput']:>18.0f}")
+    mismatches = sum(a != b for a, b in zip(http['scores'], local['scores']))
+    if mismatches:
+        raise SystemExit(f"❌ {mismatches} risk scores differ between modes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Benchmark: Comprehend calls, latency and agreement with the local sentiment model in each mode.
+
+Generates --samples synthetic captions whose sentiment is set by the
+opinion words in them (plus label noise), trains the local model on
+80% of them and posts the rest to text-service's /analyze in-process
+in each LOCAL_SENTIMENT_MODE. Comprehend is replaced by a stand-in
+that answers with the caption's label after --rtt-ms, and fails every
+call when --outage is given. The result cache and batching are off.
+Synthetic captions are far easier than real posts, so take the
+agreement figures as a check of the plumbing and retrain on logged
+samples (LOCAL_SENTIMENT_SAMPLES_PATH) for real numbers. Needs the
+text-service requirements and httpx installed. Run from
+ml-microservices-platform/:
+
+    python benchmarks/bench_local_sentiment.py [--samples 20000] [--rtt-ms 80] [--outage]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'services', 'text-service'))
+MODEL_PATH = os.path.join(tempfile.mkdtemp(prefix='bench_sentiment_'), 'sentiment-model.npz')
+os.environ.update({
+    'RESULT_CACHE_MAX_ENTRIES': '0',
+    'COMPREHEND_BATCHING': 'false',
+    'LOCAL_SENTIMENT_MODE': 'shadow',
+    'LOCAL_SENTIMENT_MODEL': MODEL_PATH,
+    'AWS_ACCESS_KEY_ID': 'bench',
+    'AWS_SECRET_ACCESS_KEY': 'bench',
+})
+
+import httpx
+from local_sentiment import SentimentModel
+
+POSITIVE = "love great amazing beautiful happy awesome best wonderful perfect enjoy fun lovely nice excited 😍 🎉".split()
+NEGATIVE = "hate awful terrible ugly sad worst horrible angry disgusting boring annoying broken pathetic 😡 👎".split()
+FILLER = ("the a this my our day photo trip with friends at beach party new car dog today weekend look "
+          "just got back from city morning coffee street view family dinner").split()
+
+
+def caption(rng) -> (str, str):
+    label = rng.choice(['POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED'], p=[0.35, 0.25, 0.35, 0.05])
+    words = list(rng.choice(FILLER, size=rng.integers(3, 10)))
+    opinions = {'POSITIVE': [POSITIVE], 'NEGATIVE': [NEGATIVE], 'NEUTRAL': [], 'MIXED': [POSITIVE, NEGATIVE]}[label]
+    for pool in opinions:
+        words[rng.integers(0, len(words))] += ' ' + ' '.join(rng.choice(pool, size=rng.integers(1, 3)))
+    if rng.random() < 0.05:
+        label = rng.choice(['POSITIVE', 'NEGATIVE', 'NEUTRAL'])
+    return ' '.join(words), str(label)
+
+
+class LabelledComprehend:
+    """Comprehend stand-in answering with each text's known label after ``rtt``, or failing in an outage"""
+
+    def __init__(self, labels: dict, rtt_ms: float, outage: bool):
+        self.labels = labels
+        self.rtt = rtt_ms / 1000
+        self.outage = outage
+        self.calls = 0
+
+    def detect_sentiment(self, Text, LanguageCode):
+        self.calls += 1
+        time.sleep(self.rtt)
+        if self.outage:
+            raise RuntimeError("ThrottlingException: Rate exceeded")
+        label = self.labels[Text]
+        return {'Sentiment': label, 'SentimentScore': {name.capitalize(): float(name == label)
+                                                       for name in ('POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED')}}
+
+
+async def run(text_service, texts: list, labels: dict, concurrency: int = 16) -> dict:
+    transport = httpx.ASGITransport(app=text_service.app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=120) as client:
+        async def post(text):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post('/analyze', json={'text_content': text})
+                return time.perf_counter() - start, response.json() if response.status_code == 200 else {'error': response.text}
+
+        results = await asyncio.gather(*(post(text) for text in texts))
+    answered = [(text, body) for text, (_, body) in zip(texts, results) if 'error' not in body]
+    return {
+        'answered': len(answered),
+        'local': sum(body['sentiment_source'] == 'local' for _, body in answered),
+        'correct': sum(body['sentiment'] == labels[text] for text, body in answered),
+        'p50_ms': statistics.median(latency for latency, _ in results) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--samples', type=int, default=20000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--rtt-ms', type=float, default=80)
+    parser.add_argument('--min-confidence', type=float, default=0.9)
+    parser.add_argument('--outage', action='store_true')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    samples = dict(caption(rng) for _ in range(args.samples))
+    texts = list(samples)
+    split = int(len(texts) * 0.8)
+    start = time.perf_counter()
+    model = SentimentModel.train(texts[:split], [samples[t] for t in texts[:split]], languages=['en'])
+    trained = time.perf_counter() - start
+    model.metrics = model.evaluate(texts[split:], [samples[t] for t in texts[split:]])
+    model.save(MODEL_PATH)
+
+    start = time.perf_counter()
+    for text in texts[split:]:
+        model.predict(text)
+    predict_us = (time.perf_counter() - start) / (len(texts) - split) * 1e6
+
+    # Imported once the model exists, as text-service loads it at import time
+    import app as text_service
+    text_service.LOCAL_SENTIMENT_MIN_CONFIDENCE = args.min_confidence
+    held_out = texts[split:][:args.requests]
+    rows = {}
+    for mode in ('off', 'shadow', 'fallback', 'first_pass'):
+        comprehend = LabelledComprehend(samples, args.rtt_ms, args.outage)
+        text_service.comprehend = comprehend
+        text_service.LOCAL_SENTIMENT_MODE = mode
+        store = text_service.local_sentiment_store
+        text_service.local_sentiment_store = store if mode != 'off' else None
+        rows[mode] = {**asyncio.run(run(text_service, held_out, samples)), 'calls': comprehend.calls}
+        text_service.local_sentiment_store = store
+
+    print(f"trained on {split:,} captions in {trained:.1f}s, {predict_us:.0f} us per prediction, "
+          f"held-out agreement {model.metrics['agreement']:.1%}")
+    for edge, band in model.metrics['by_min_confidence'].items():
+        print(f"  confidence >= {edge:>4}: coverage {band['coverage']:.1%}, agreement {band['agreement'] or 0:.1%}")
+    print(f"{len(held_out)} requests, rtt {args.rtt_ms:g} ms{', Comprehend down' if args.outage else ''}, "
+          f"first_pass min confidence {args.min_confidence:g}")
+    print(f"{'mode':>10} {'calls':>7} {'answered':>9} {'local':>6} {'correct':>8} {'p50 ms':>8}")
+    for mode, row in rows.items():
+        print(f"{mode:>10} {row['calls']:>7} {row['answered']:>9} {row['local']:>6} {row['correct']:>8} {row['p50_ms']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
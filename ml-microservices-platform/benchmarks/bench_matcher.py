@@ -0,0 +1,89 @@
+"""Microbenchmark: compiled TermMatcher vs. the per-word substring loop.
+
+Run from ml-microservices-platform/:
+
+    python benchmarks/bench_matcher.py
+"""
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+from crossmodal.matcher import TermMatcher
+
+
+UNSAFE_WORDS = {
+    'kill', 'murder', 'bomb', 'terrorist', 'weapon', 'gun', 'attack',
+    'racist', 'hate', 'porn', 'violent', 'protest', 'riot', 'assault',
+    'weapons', 'violence', 'harm', 'danger', 'threat', 'death', 'dead',
+    'suicide', 'bombing', 'explosion', 'shoot', 'shooting', 'hostage',
+    'terrorism', 'extremist', 'radical', 'abuse', 'rape',
+    'pedophile', 'child abuse', 'molest', 'blackmail', 'extortion'
+}
+
+
+def legacy_match(words, text):
+    """The loop text-service and the Lambda used before TermMatcher"""
+    text_lower = text.lower()
+    unsafe_found = []
+    for word in words:
+        if f' {word} ' in f' {text_lower} ':
+            unsafe_found.append(word)
+    return unsafe_found
+
+
+def random_word(rng):
+    return ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10)))
+
+
+def synthetic_lexicon(rng, size):
+    terms = set(UNSAFE_WORDS)
+    while len(terms) < size:
+        terms.add(random_word(rng) if rng.random() < 0.8 else f"{random_word(rng)} {random_word(rng)}")
+    return terms
+
+
+def synthetic_post(rng, n_chars, lexicon):
+    vocabulary = [random_word(rng) for _ in range(2000)]
+    hits = sorted(lexicon)[:50]
+    words, length = [], 0
+    while length < n_chars:
+        word = rng.choice(hits) if rng.random() < 0.01 else rng.choice(vocabulary)
+        if rng.random() < 0.1:
+            word += rng.choice(',.!?')
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def time_per_call(func, text, min_seconds=0.3):
+    calls, start = 0, time.perf_counter()
+    while True:
+        func(text)
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls
+
+
+def main():
+    rng = random.Random(42)
+    print(f"{'lexicon':>8} {'post chars':>11} {'compile ms':>11} {'loop us':>12} {'matcher us':>11} {'speedup':>8}")
+    for lexicon_size in (len(UNSAFE_WORDS), 1000, 20000):
+        lexicon = synthetic_lexicon(rng, lexicon_size)
+        start = time.perf_counter()
+        matcher = TermMatcher(lexicon)
+        compile_ms = (time.perf_counter() - start) * 1000
+        for post_chars in (280, 5000, 50000):
+            post = synthetic_post(rng, post_chars, lexicon)
+            loop_s = time_per_call(lambda t: legacy_match(lexicon, t), post)
+            matcher_s = time_per_call(matcher.matched_terms, post)
+            print(f"{lexicon_size:>8} {post_chars:>11} {compile_ms:>11.1f} {loop_s * 1e6:>12.1f} "
+                  f"{matcher_s * 1e6:>11.1f} {loop_s / matcher_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
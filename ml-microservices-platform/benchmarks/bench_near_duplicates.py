@@ -0,0 +1,96 @@
+"""Benchmark: near-duplicate lookups in image-service's multi-index hash table vs. a linear scan.
+
+Fills a NearDuplicateIndex in a temporary directory with random 64-bit
+hashes, then queries it with stored hashes with up to --distance bits
+flipped (should match) and with fresh random hashes (should not).
+Checks every answer's distance against a numpy scan over all hashes,
+and times lookups for both, reopening the index from disk first. Run
+from ml-microservices-platform/:
+
+    python benchmarks/bench_near_duplicates.py [--entries 1000000] [--queries 2000] [--distance 6]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'services', 'image-service'))
+
+from near_duplicates import NearDuplicateIndex, hamming
+
+
+def flip_bits(value: int, count: int, rng) -> int:
+    for bit in rng.choice(64, size=count, replace=False):
+        value ^= 1 << int(bit)
+    return value
+
+
+def timed(function, queries: list) -> (list, float):
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results.append(function(query))
+        latencies.append(time.perf_counter() - start)
+    return results, statistics.median(latencies) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--entries', type=int, default=1000000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--distance', type=int, default=6)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    hashes = rng.integers(0, 2 ** 64, size=args.entries, dtype=np.uint64)
+    directory = tempfile.mkdtemp(prefix='bench_index_')
+
+    index = NearDuplicateIndex(directory)
+    start = time.perf_counter()
+    for i, value in enumerate(hashes.tolist()):
+        index.add(value, {'entry': i})
+    fill = time.perf_counter() - start
+    index.close()
+
+    start = time.perf_counter()
+    index = NearDuplicateIndex(directory)
+    reopen = time.perf_counter() - start
+
+    near = [flip_bits(int(hashes[i]), int(rng.integers(0, args.distance + 1)), rng)
+            for i in rng.integers(0, args.entries, size=args.queries // 2)]
+    far = rng.integers(0, 2 ** 64, size=args.queries - len(near), dtype=np.uint64).tolist()
+    queries = near + far
+
+    def scan(value):
+        distances = hamming(hashes, value)
+        best = int(np.argmin(distances))
+        return best, int(distances[best])
+
+    indexed, index_us = timed(lambda value: index.nearest(value, args.distance), queries)
+    scanned, scan_us = timed(scan, queries)
+
+    mismatches = 0
+    for found, (best, distance) in zip(indexed, scanned):
+        expected = distance if distance <= args.distance else None
+        mismatches += (found[1] if found else None) != expected
+    matches = sum(found is not None for found in indexed)
+
+    print(f"{args.entries:,} entries, filled in {fill:.1f}s ({args.entries / fill:,.0f}/s), reopened in {reopen * 1000:.1f} ms")
+    print(f"{'lookup':>14} {'p50 us':>9}")
+    print(f"{'multi-index':>14} {index_us:>9.1f}")
+    print(f"{'linear scan':>14} {scan_us:>9.1f}")
+    print(f"{matches} of {len(queries)} queries matched within {args.distance} bits ({len(near)} were near copies)")
+    index.close()
+    shutil.rmtree(directory)
+    if mismatches:
+        raise SystemExit(f"❌ {mismatches} lookups differ from the linear scan")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Benchmark: synchronous put_item vs. the background BatchWriter.
+
+Needs a DynamoDB endpoint; by default the local stand-in from
+docker-compose (``docker compose --profile local-dynamodb up dynamodb-local``).
+Writes the same records both ways into a scratch table, reports the time
+a request spends persisting and the total time to durability, and fails
+unless every record of both runs arrived.
+
+With --stub no endpoint is needed: the BatchWriter writes to an in-memory
+stand-in that throttles some calls and leaves part of each batch
+unprocessed, and the run fails unless every record is written exactly
+once, a queue that was never flushed is drained by close, and items
+still unprocessed after max_retries (or rejected outright) are given up
+on without stopping the writer. Run from ml-microservices-platform/:
+
+    python benchmarks/bench_persistence.py [--endpoint http://localhost:8010] [--items 2000]
+    python benchmarks/bench_persistence.py --stub [--items 2000]
+"""
+import argparse
+import decimal
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'shared'))
+
+import boto3
+from botocore.exceptions import ClientError
+from prometheus_client import REGISTRY
+from crossmodal.persistence import MAX_BATCH_ITEMS, BatchWriter, ensure_table
+
+
+def synthetic_record(i):
+    return {
+        'analysis_id': f"bench_{uuid.uuid4().hex}",
+        'timestamp': f"2024-01-01T00:00:{i % 60:02d}",
+        'risk_score': decimal.Decimal(str(round((i % 100) / 100, 2))),
+        'needs_review': i % 3 == 0,
+        'image_categories': ['Person', 'Outdoors'],
+        'text_sentiment': 'POSITIVE',
+        'unsafe_words_found': [],
+        'moderation_flagged': False,
+        'explanation': 'Very low risk: Content appears safe and contextually aligned'
+    }
+
+
+def count_items(table, prefix):
+    count, kwargs = 0, {}
+    while True:
+        page = table.scan(Select='COUNT', FilterExpression='begins_with(analysis_id, :p)',
+                          ExpressionAttributeValues={':p': prefix}, **kwargs)
+        count += page['Count']
+        if 'LastEvaluatedKey' not in page:
+            return count
+        kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+
+
+class StubDynamoDB:
+    """batch_write_item stand-in: every ``throttle_every``-th call is throttled, and the last ``unprocessed``
+    share of each other batch is handed back unprocessed; ``reject`` ids fail validation"""
+
+    def __init__(self, table_name: str, unprocessed: float = 0.3, throttle_every: int = 4, reject=()):
+        self.table_name = table_name
+        self.unprocessed = unprocessed
+        self.throttle_every = throttle_every
+        self.reject = set(reject)
+        self.writes = {}
+        self.calls = 0
+        self.throttled = 0
+        self.handed_back = 0
+
+    def batch_write_item(self, RequestItems):
+        self.calls += 1
+        requests = RequestItems[self.table_name]
+        if len(requests) > MAX_BATCH_ITEMS:
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Too many items'}}, 'BatchWriteItem')
+        if any(request['PutRequest']['Item']['analysis_id'] in self.reject for request in requests):
+            raise ClientError({'Error': {'Code': 'ValidationException', 'Message': 'Bad item'}}, 'BatchWriteItem')
+        if self.throttle_every and self.calls % self.throttle_every == 0:
+            self.throttled += 1
+            raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'Slow down'}},
+                              'BatchWriteItem')
+        kept = len(requests) - int(len(requests) * self.unprocessed)
+        for request in requests[:kept]:
+            item_id = request['PutRequest']['Item']['analysis_id']
+            self.writes[item_id] = self.writes.get(item_id, 0) + 1
+        self.handed_back += len(requests) - kept
+        return {'UnprocessedItems': {self.table_name: requests[kept:]} if kept < len(requests) else {}}
+
+
+def items_counted(table_name: str, outcome: str) -> float:
+    return REGISTRY.get_sample_value('persist_items_total', {'table': table_name, 'outcome': outcome}) or 0
+
+
+def check(condition: bool, message: str):
+    if not condition:
+        raise SystemExit(f"❌ {message}")
+
+
+def run_stub(items: int):
+    """The BatchWriter against StubDynamoDB; exits non-zero if any check fails"""
+    records = [synthetic_record(i) for i in range(items)]
+    stub = StubDynamoDB('stub-retries')
+    writer = BatchWriter(stub, 'stub-retries', max_queue=items, max_retries=20, backoff_base=0.001)
+    start = time.perf_counter()
+    for record in records:
+        writer.put(record)
+    drained = writer.close(timeout=60)
+    elapsed = time.perf_counter() - start
+    check(drained, "writer still running after close")
+    check(stub.throttled > 0 and stub.handed_back > 0, "the stub never throttled or handed items back")
+    check(len(stub.writes) == items, f"{items - len(stub.writes)} of {items} records never written")
+    check(all(count == 1 for count in stub.writes.values()), "some records were written more than once")
+    print(f"✅ {items} records written exactly once in {stub.calls} calls "
+          f"({stub.throttled} throttled, {stub.handed_back} items handed back as unprocessed) in {elapsed:.2f}s")
+
+    # Nothing is written until close: no full batch and a flush interval longer than the run
+    stub = StubDynamoDB('stub-drain', unprocessed=0, throttle_every=0)
+    writer = BatchWriter(stub, 'stub-drain', flush_interval=3600)
+    for record in records[:MAX_BATCH_ITEMS - 1]:
+        writer.put(record)
+    time.sleep(0.1)
+    check(not stub.writes, "records written before the flush interval or a full batch")
+    check(writer.close(timeout=10), "close did not drain the queue")
+    check(len(stub.writes) == MAX_BATCH_ITEMS - 1, "close left records unwritten")
+    check(not writer.put(records[0]), "put accepted a record after close")
+    print(f"✅ close drained {MAX_BATCH_ITEMS - 1} queued records and rejected later puts")
+
+    # Items never processed are given up on after max_retries; a rejected batch is lost; the writer goes on
+    stub = StubDynamoDB('stub-give-up', unprocessed=1.0, throttle_every=0, reject={records[1]['analysis_id']})
+    writer = BatchWriter(stub, 'stub-give-up', max_batch=1, max_retries=3, backoff_base=0.001)
+    for record in records[:3]:
+        writer.put(record)
+    check(writer.close(timeout=10), "writer stuck retrying")
+    check(stub.calls == 2 * (3 + 1) + 1, f"expected 9 calls (two items tried 4 times, one rejected), got {stub.calls}")
+    check(items_counted('stub-give-up', 'failed') == 3, "given-up and rejected items not counted as failed")
+    print("✅ unprocessed items given up on after max_retries, rejected batch dropped, writer kept going")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--endpoint', default=os.getenv('DYNAMODB_ENDPOINT_URL', 'http://localhost:8010'))
+    parser.add_argument('--table', default='ContentModerationResultsBench')
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--stub', action='store_true', help="Check the BatchWriter against an in-memory stand-in")
+    args = parser.parse_args()
+    if args.stub:
+        return run_stub(args.items)
+
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url=args.endpoint,
+                              aws_access_key_id='local', aws_secret_access_key='local')
+    ensure_table(dynamodb, args.table)
+    table = dynamodb.Table(args.table)
+
+    sync_records = [synthetic_record(i) for i in range(args.items)]
+    for record in sync_records:
+        record['analysis_id'] = 'sync_' + record['analysis_id']
+    start = time.perf_counter()
+    for record in sync_records:
+        table.put_item(Item=record)
+    sync_s = time.perf_counter() - start
+
+    writer = BatchWriter(dynamodb, args.table, max_queue=args.items)
+    async_records = [synthetic_record(i) for i in range(args.items)]
+    for record in async_records:
+        record['analysis_id'] = 'async_' + record['analysis_id']
+    start = time.perf_counter()
+    for record in async_records:
+        writer.put(record)
+    enqueue_s = time.perf_counter() - start
+    writer.close()
+    drained_s = time.perf_counter() - start
+
+    sync_count = count_items(table, 'sync_')
+    async_count = count_items(table, 'async_')
+    print(f"{'mode':>14} {'request us/item':>16} {'total s':>8} {'items stored':>13}")
+    print(f"{'put_item':>14} {sync_s / args.items * 1e6:>16.1f} {sync_s:>8.2f} {sync_count:>13}")
+    print(f"{'BatchWriter':>14} {enqueue_s / args.items * 1e6:>16.1f} {drained_s:>8.2f} {async_count:>13}")
+    check(sync_count >= args.items, f"{args.items - sync_count} put_item records missing")
+    check(async_count >= args.items, f"{args.items - async_count} records missing after drain")
+
+
+if __name__ == "__main__":
+    main()
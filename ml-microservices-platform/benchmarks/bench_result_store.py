@@ -0,0 +1,104 @@
+"""Benchmark: analytics queries on the fusion-service SQLite result store.
+
+Fills a scratch database with synthetic results spread over 30 days,
+checks the rollup-backed aggregates against a plain scan of the results
+table, and times each analytics query. Run from ml-microservices-platform/:
+
+    python benchmarks/bench_result_store.py [--rows 1000000] [--db /tmp/bench_results.db]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'services', 'fusion-service'))
+
+from result_store import SENTIMENTS, SQLiteResultStore
+
+DAY = 86400
+
+
+def synthetic_entries(rng, n, end):
+    # Results arrive in time order
+    timestamps = sorted(end - rng.random() * 30 * DAY for _ in range(n))
+    for i, timestamp in enumerate(timestamps):
+        score = round(min(1.0, max(0.0, rng.betavariate(1.5, 4))), 2)
+        record = {
+            'analysis_id': f"mod_{i:08x}",
+            'risk_score': score,
+            'needs_review': score > 0.6,
+            'text_sentiment': rng.choice(SENTIMENTS),
+            'moderation_flagged': rng.random() < 0.1,
+            'image_categories': ['Person'],
+            'explanation': '-'
+        }
+        yield record, timestamp, rng.lognormvariate(6.5, 0.5)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--db', default='/tmp/bench_results.db')
+    args = parser.parse_args()
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(args.db + suffix):
+            os.remove(args.db + suffix)
+    store = SQLiteResultStore(args.db)
+    rng = random.Random(42)
+    end = time.time()
+
+    start = time.perf_counter()
+    entries = []
+    for entry in synthetic_entries(rng, args.rows, end):
+        entries.append(entry)
+        if len(entries) == 10000:
+            store.write(entries)
+            entries = []
+    if entries:
+        store.write(entries)
+    print(f"inserted {args.rows:,} rows in {time.perf_counter() - start:.1f}s")
+
+    # Rollup + edge scans must agree with a full scan of the same window
+    connection = store._reader()
+    window_start = end - 7 * DAY - 1234.5
+    total, flagged = connection.execute(
+        "SELECT COUNT(*), SUM(needs_review) FROM results WHERE ts >= ? AND ts < ?", (window_start, end)
+    ).fetchone()
+    summary = store.summary(window_start, end)
+    if (summary['total'], summary['needs_review']) != (total, flagged):
+        raise SystemExit(f"❌ summary {summary['total']}/{summary['needs_review']} != scan {total}/{flagged}")
+
+    hour_end = (end // 3600 + 1) * 3600
+    queries = [
+        ('summary 1h', lambda: store.summary(end - 3600, end)),
+        ('summary 24h', lambda: store.summary(end - DAY, end)),
+        ('summary 30d', lambda: store.summary(end - 30 * DAY, end)),
+        ('histogram 7d', lambda: store.risk_histogram(end - 7 * DAY, end)),
+        ('timeseries 24h/5m', lambda: store.timeseries(end - DAY, end, 300)),
+        ('timeseries 7d/1h', lambda: store.timeseries(hour_end - 7 * DAY, hour_end, 3600)),
+        ('timeseries 30d/1d', lambda: store.timeseries(hour_end - 30 * DAY, hour_end, DAY)),
+        ('recent review', lambda: store.recent(50, needs_review=True)),
+        ('recent negative', lambda: store.recent(50, sentiment='NEGATIVE')),
+        ('recent risk>=0.8', lambda: store.recent(50, min_risk=0.8)),
+    ]
+    print(f"{'query':>18} {'ms':>8}")
+    for name, query in queries:
+        seconds, _ = best_of(3, query)
+        print(f"{name:>18} {seconds * 1000:>8.1f}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
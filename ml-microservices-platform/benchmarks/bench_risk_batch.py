@@ -0,0 +1,100 @@
+"""Microbenchmark: vectorised batch risk scoring vs. the compiled scalar rules.
+
+Checks that every score, fired rule and explanation is identical, then
+reports items per second for both. Run from ml-microservices-platform/:
+
+    python benchmarks/bench_risk_batch.py
+"""
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(ROOT, 'services', 'risk-service'))
+
+from crossmodal.lexicon import Lexicon, DEFAULT_LEXICON_PATH
+from crossmodal.rules import RuleSet, DEFAULT_RULES_PATH
+from batch_scoring import DEFAULT_EXPLANATION, EXPLANATIONS, score_batch
+
+
+OTHER_CATEGORIES = ['Furniture', 'Building', 'Tree', 'Sky', 'Car', 'Dog', 'Food', 'Text']
+SENTIMENTS = ['POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED']
+
+
+# The shipped rules plus rules on the other fields and operators, so the
+# equality check covers every vectorised code path
+EXTRA_RULES = [
+    {"id": "risky_context", "when": [{"field": "context.context_score", "gt": 0.7}], "weight": 0.15},
+    {"id": "trusted_context", "when": [{"field": "context.context_score", "lte": 0.2},
+                                       {"field": "text.sentiment", "in": ["NEUTRAL", "MIXED"]}],
+     "weight": -0.1, "floor": 0.05},
+    {"id": "explicit_label", "when": [{"field": "image.moderation_labels", "any_in": ["Explicit Nudity", "Violence"]}],
+     "weight": 0.25, "ceiling": 0.9},
+]
+
+
+def synthetic_items(rng, lexicon, n):
+    categories = sorted(lexicon.safe_image_categories) + sorted(lexicon.unsafe_image_categories) + OTHER_CATEGORIES
+    words = sorted(lexicon.unsafe_words)
+    items = []
+    for _ in range(n):
+        image = {
+            'categories': rng.sample(categories, rng.randint(0, 6)),
+            'moderation_flagged': rng.random() < 0.2,
+            'moderation_labels': rng.sample(['Explicit Nudity', 'Violence', 'Drugs'], rng.randint(0, 2))
+        }
+        text = {
+            'sentiment': rng.choice(SENTIMENTS),
+            'unsafe_found': rng.sample(words, rng.choice([0, 0, 0, 1, 2]))
+        }
+        context = {'context_score': rng.random()} if rng.random() < 0.5 else None
+        items.append((image, text, context))
+    return items
+
+
+def explain(score):
+    return next((text for bound, text in EXPLANATIONS if score > bound), DEFAULT_EXPLANATION)
+
+
+def scalar_scores(items, rules):
+    results = [rules.evaluate(image, text, context) for image, text, context in items]
+    return results, [explain(result.score) for result in results]
+
+
+def best_of(repeat, func):
+    """Fastest of ``repeat`` runs, and the result of the last"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    rng = random.Random(42)
+    lexicon = Lexicon.load(DEFAULT_LEXICON_PATH)
+    shipped = RuleSet.load(DEFAULT_RULES_PATH)
+    extended = RuleSet(shipped.version, shipped.rules + RuleSet.from_dict({'version': '-', 'rules': EXTRA_RULES}).rules)
+    print(f"{'rules':>8} {'items':>8} {'scalar items/s':>15} {'batch items/s':>14} {'speedup':>8}")
+    for (name, rule_set), n in [(r, n) for r in (('shipped', shipped), ('extended', extended)) for n in (1000, 10000, 100000)]:
+        rules = rule_set.compile(lexicon)
+        items = synthetic_items(rng, lexicon, n)
+
+        scalar_s, (expected, expected_explanations) = best_of(3, lambda: scalar_scores(items, rules))
+        batch_s, batch = best_of(3, lambda: score_batch(items, rules))
+
+        scores = batch.scores.tolist()
+        mismatches = sum(1 for a, b in zip(expected, scores) if a.score != b)
+        mismatches += sum(1 for a, b in zip(expected, batch.rules_fired(rules.rule_ids)) if a.fired != b)
+        mismatches += sum(1 for a, b in zip(expected_explanations, batch.explanations) if a != b)
+        if mismatches:
+            raise SystemExit(f"❌ {mismatches} results differ from the scalar path at n={n}")
+
+        print(f"{name:>8} {n:>8} {n / scalar_s:>15,.0f} {n / batch_s:>14,.0f} {scalar_s / batch_s:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Microbenchmark: compiled rule engine vs. the hand-written if-chain.
+
+The chain is the assess_risk the Lambda and risk-service used before the
+rule engine, timed with its per-rule prints (sent to a discarded buffer)
+and with the prints removed. Checks that every score is identical. Run
+from ml-microservices-platform/:
+
+    python benchmarks/bench_rules.py
+"""
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(__file__), '..')
+sys.path.insert(0, os.path.join(ROOT, 'shared'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from crossmodal.lexicon import Lexicon, DEFAULT_LEXICON_PATH
+from crossmodal.rules import RuleSet, DEFAULT_RULES_PATH
+from bench_risk_batch import best_of, synthetic_items
+
+
+def legacy_assess_risk(image, text, lexicon):
+    """The if-chain from before the rule engine, prints included"""
+    risk = 0.0
+    image_safe = any(cat in lexicon.safe_image_categories for cat in image['categories'])
+    image_unsafe = any(cat in lexicon.unsafe_image_categories for cat in image['categories'])
+    has_unsafe_words = len(text['unsafe_found']) > 0
+    if image_safe and has_unsafe_words:
+        risk += 0.6
+        print(f"🚨 CONTEXTUAL MISMATCH: Safe image with unsafe words: {text['unsafe_found']}")
+    if image_unsafe and text['sentiment'] == 'POSITIVE':
+        risk += 0.5
+        print(f"🚨 CONTEXTUAL MISMATCH: Unsafe image with positive text")
+    if has_unsafe_words:
+        risk += 0.3
+        print(f"⚠️ UNSAFE WORDS DETECTED: {text['unsafe_found']}")
+    if image['moderation_flagged']:
+        risk += 0.4
+        print(f"⚠️ IMAGE MODERATION FLAGGED: {image.get('moderation_labels', [])}")
+    if text['sentiment'] == 'NEGATIVE':
+        risk += 0.2
+        print(f"📝 NEGATIVE SENTIMENT DETECTED")
+    if image_safe and text['sentiment'] == 'POSITIVE' and not has_unsafe_words:
+        risk -= 0.3
+        risk = max(risk, 0.0)
+        print(f"✅ CONTEXTUALLY ALIGNED: Safe image with positive text")
+    final_risk = min(max(risk, 0.0), 1.0)
+    print(f"🎯 FINAL RISK SCORE: {final_risk}")
+    return final_risk
+
+
+def legacy_assess_risk_quiet(image, text, lexicon):
+    """The same chain without the prints"""
+    risk = 0.0
+    image_safe = any(cat in lexicon.safe_image_categories for cat in image['categories'])
+    image_unsafe = any(cat in lexicon.unsafe_image_categories for cat in image['categories'])
+    has_unsafe_words = len(text['unsafe_found']) > 0
+    if image_safe and has_unsafe_words:
+        risk += 0.6
+    if image_unsafe and text['sentiment'] == 'POSITIVE':
+        risk += 0.5
+    if has_unsafe_words:
+        risk += 0.3
+    if image['moderation_flagged']:
+        risk += 0.4
+    if text['sentiment'] == 'NEGATIVE':
+        risk += 0.2
+    if image_safe and text['sentiment'] == 'POSITIVE' and not has_unsafe_words:
+        risk -= 0.3
+        risk = max(risk, 0.0)
+    return min(max(risk, 0.0), 1.0)
+
+
+def per_item_us(func, items):
+    seconds, results = best_of(3, lambda: [func(image, text, context) for image, text, context in items])
+    return seconds / len(items) * 1e6, results
+
+
+def main():
+    rng = random.Random(7)
+    lexicon = Lexicon.load(DEFAULT_LEXICON_PATH)
+    start = time.perf_counter()
+    rules = RuleSet.load(DEFAULT_RULES_PATH).compile(lexicon)
+    compile_ms = (time.perf_counter() - start) * 1000
+    items = synthetic_items(rng, lexicon, 100000)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        chain_us, expected = per_item_us(lambda i, t, c: legacy_assess_risk(i, t, lexicon), items)
+    quiet_us, _ = per_item_us(lambda i, t, c: legacy_assess_risk_quiet(i, t, lexicon), items)
+    # The if-chain never saw context, so neither do the rules here
+    engine_us, results = per_item_us(lambda i, t, c: rules.evaluate(i, t), items)
+
+    mismatches = sum(1 for a, b in zip(expected, results) if a != b.score)
+    if mismatches:
+        raise SystemExit(f"❌ {mismatches} scores differ from the if-chain")
+
+    print(f"compile: {compile_ms:.2f} ms")
+    print(f"{'evaluator':>24} {'us/item':>8}")
+    print(f"{'if-chain with prints':>24} {chain_us:>8.2f}")
+    print(f"{'if-chain without prints':>24} {quiet_us:>8.2f}")
+    print(f"{'compiled rules':>24} {engine_us:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
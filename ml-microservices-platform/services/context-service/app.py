@@ -1,5 +1,6 @@
 from fastapi import FastAPI
 from pydantic import BaseModel
+from typing import List
 import time
 from prometheus_client import Counter, Histogram, generate_latest
 
@@ -12,6 +13,9 @@ CONTEXT_PROCESSING_TIME = Histogram('context_processing_seconds', 'Context proce
 class ContextRequest(BaseModel):
     context: dict
 
+class ContextBatchRequest(BaseModel):
+    contexts: List[dict]
+
 class ContextResponse(BaseModel):
     context_score: float
     platform_risk: str
@@ -89,6 +93,16 @@ def calculate_overall_context_score(platform_risk: str, temporal_factors: dict,
     score += user_risk
     return min(score, 1.0)
 
+def context_response(context_data: dict, start_time: float) -> ContextResponse:
+    context_result = analyze_context_enhanced(context_data)
+    return ContextResponse(
+        context_score=context_result['context_score'],
+        platform_risk=context_result['platform_risk'],
+        temporal_factors=context_result['temporal_factors'],
+        geographic_risk=context_result['geographic_risk'],
+        processing_time=time.time() - start_time
+    )
+
 @app.post("/analyze")
 async def analyze_context(request: ContextRequest):
     start_time = time.time()
@@ -96,19 +110,26 @@ async def analyze_context(request: ContextRequest):
     
     try:
         with CONTEXT_PROCESSING_TIME.time():
-            context_result = analyze_context_enhanced(request.context)
-            processing_time = time.time() - start_time
-            
-            return ContextResponse(
-                context_score=context_result['context_score'],
-                platform_risk=context_result['platform_risk'],
-                temporal_factors=context_result['temporal_factors'],
-                geographic_risk=context_result['geographic_risk'],
-                processing_time=processing_time
-            )
+            return context_response(request.context, start_time)
     except Exception as e:
         return {"error": f"Context analysis failed: {str(e)}"}
 
+@app.post("/analyze/batch")
+async def analyze_context_batch(request: ContextBatchRequest):
+    """Score many contexts in one call; a failing item gets its own error entry"""
+    start_time = time.time()
+    results = []
+    
+    with CONTEXT_PROCESSING_TIME.time():
+        for context_data in request.contexts:
+            CONTEXT_REQUEST_COUNT.inc()
+            try:
+                results.append(context_response(context_data, start_time))
+            except Exception as e:
+                results.append({"error": f"Context analysis failed: {str(e)}"})
+    
+    return {"results": results, "processing_time": time.time() - start_time}
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "context-analysis"}
@@ -1,13 +1,59 @@
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
-import boto3
-import json
+import os
 from datetime import datetime
 import asyncio
 import time
 from prometheus_client import Counter, Histogram, generate_latest
-
-app = FastAPI(title="Feedback Loop & Retraining Service")
+from feedback_store import FeedbackStore, WindowUploader, open_backend
+from retraining import RetrainingRunner
+from crossmodal.registry import RuleRegistry
+from crossmodal.rules import DEFAULT_RULES_PATH
+
+
+FEEDBACK_DATA_DIR = os.getenv("FEEDBACK_DATA_DIR", "data/feedback")
+# Where feedback windows are archived: s3://bucket/prefix, file:///path or none
+FEEDBACK_ARCHIVE_URL = os.getenv("FEEDBACK_ARCHIVE_URL", "s3://crossmodal-feedback-data")
+FEEDBACK_UPLOAD_INTERVAL = float(os.getenv("FEEDBACK_UPLOAD_INTERVAL", "300"))
+# Stored predictions that feedback is joined with
+FUSION_SERVICE_URL = os.getenv("FUSION_SERVICE_URL", "http://localhost:8005")
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "data/registry")
+registry = RuleRegistry(MODEL_REGISTRY_DIR)
+RULES_PATH = os.getenv("RULES_PATH", DEFAULT_RULES_PATH)
+# 'current' serves retrained weights at once; 'candidate' shadow-tests them in risk-service first
+RETRAINING_PUBLISH_STAGE = os.getenv("RETRAINING_PUBLISH_STAGE", "current")
+
+feedback_store = None
+uploader = None
+retraining = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global feedback_store, uploader, retraining
+    loop = asyncio.get_running_loop()
+    # Rebuilding the indexes reads the whole log once
+    feedback_store = await loop.run_in_executor(None, FeedbackStore, FEEDBACK_DATA_DIR)
+    print(f"✅ Feedback store loaded: {feedback_store.count} records")
+    try:
+        backend = open_backend(FEEDBACK_ARCHIVE_URL)
+        if backend is not None:
+            uploader = WindowUploader(feedback_store, backend, FEEDBACK_UPLOAD_INTERVAL)
+    except Exception as e:
+        print(f"❌ Feedback archive {FEEDBACK_ARCHIVE_URL} unavailable: {e}")
+    retraining = RetrainingRunner(
+        feedback_store, registry, FUSION_SERVICE_URL, RULES_PATH,
+        performance_threshold=RetrainingConfig.performance_threshold,
+        min_samples=RetrainingConfig.min_feedback_samples,
+        publish_stage=RETRAINING_PUBLISH_STAGE
+    )
+    yield
+    retraining.close()
+    if uploader is not None:
+        await loop.run_in_executor(None, uploader.close)
+    feedback_store.close()
+
+app = FastAPI(title="Feedback Loop & Retraining Service", lifespan=lifespan)
 
 
 FEEDBACK_REQUEST_COUNT = Counter('feedback_requests_total', 'Total feedback requests')
@@ -26,7 +72,7 @@ class RetrainingConfig:
     performance_threshold = 0.85
 
 @app.post("/feedback")
-async def submit_feedback(feedback: FeedbackRequest, background_tasks: BackgroundTasks):
+async def submit_feedback(feedback: FeedbackRequest):
     """Store feedback and trigger retraining if conditions met"""
     FEEDBACK_REQUEST_COUNT.inc()
     
@@ -38,100 +84,93 @@ async def submit_feedback(feedback: FeedbackRequest, background_tasks: Backgroun
     
     if should_retrain:
         RETRAINING_TRIGGER_COUNT.inc()
-        background_tasks.add_task(retrain_models)
+        # Runs as its own job; this request doesn't wait for it
+        job = retraining.submit("feedback_threshold")
         return {
             "status": "feedback_stored_retraining_triggered",
-            "message": "Feedback stored and model retraining started!"
+            "message": "Feedback stored and model retraining started!",
+            "job_id": job.id
         }
     
     return {
         "status": "feedback_stored",
         "message": "Thank you for your feedback!",
-        "feedback_count": await get_feedback_count()
+        "feedback_count": get_feedback_count()
     }
 
 @app.post("/retrain")
 async def manual_retrain():
-    """Manual retraining endpoint for admin use"""
+    """Manual retraining endpoint for admin use; returns at once with the job to poll"""
+    if retraining.active is not None and not retraining.active.done:
+        return {"status": "retraining_in_progress", "message": "A retraining job is already running",
+                "job": retraining.active.to_dict()}
     RETRAINING_TRIGGER_COUNT.inc()
-    await retrain_models()
-    return {"status": "retraining_started", "message": "Manual retraining initiated"}
+    job = retraining.submit("manual")
+    return {"status": "retraining_started", "message": "Manual retraining initiated", "job": job.to_dict()}
+
+@app.get("/retrain/jobs")
+async def list_retraining_jobs():
+    """Recent retraining jobs, newest first"""
+    return {"jobs": [job.to_dict() for job in reversed(retraining.jobs.values())]}
+
+@app.get("/retrain/jobs/{job_id}")
+async def get_retraining_job(job_id: str):
+    job = retraining.jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown retraining job: {job_id}"}
+    return job.to_dict()
 
 @app.get("/feedback-stats")
 async def get_feedback_stats():
     """Get feedback statistics"""
+    loop = asyncio.get_running_loop()
+    current_rules, candidate_rules = await asyncio.gather(
+        loop.run_in_executor(None, registry.current, 'current'),
+        loop.run_in_executor(None, registry.current, 'candidate')
+    )
     return {
-        "total_feedback_samples": await get_feedback_count(),
-        "last_retraining": "2024-01-01",  # TODO: Track this
+        "total_feedback_samples": get_feedback_count(),
+        "feedback_by_day": feedback_store.count_by_day(),
+        "last_retraining": retraining.last_finished.isoformat() if retraining.last_finished else None,
+        "current_rules": current_rules,
+        "candidate_rules": candidate_rules,
         "retraining_threshold": RetrainingConfig.min_feedback_samples
     }
 
+@app.get("/feedback/{prediction_id}")
+async def get_feedback(prediction_id: str):
+    """All feedback recorded for one prediction"""
+    return {"prediction_id": prediction_id, "feedback": feedback_store.get(prediction_id)}
+
 async def store_feedback(feedback: FeedbackRequest):
-    """Store feedback in S3 for later retraining"""
+    """Append feedback to the local log; the uploader archives it to S3 in windows"""
     try:
-        s3 = boto3.client('s3')
-        
         feedback_data = {
             **feedback.dict(),
             "timestamp": datetime.utcnow().isoformat(),
             "service_version": "1.0.0"
         }
         
-        
-        s3.put_object(
-            Bucket="crossmodal-feedback-data",
-            Key=f"feedback/{datetime.utcnow().strftime('%Y/%m/%d')}/{feedback.prediction_id}.json",
-            Body=json.dumps(feedback_data),
-            ContentType='application/json'
-        )
+        await asyncio.get_running_loop().run_in_executor(None, feedback_store.append, feedback_data)
         print(f"✅ Feedback stored for prediction: {feedback.prediction_id}")
         
     except Exception as e:
         print(f"❌ Failed to store feedback: {e}")
 
 async def check_retraining_conditions():
-    """Check if we have enough data and performance dropped"""
-    feedback_count = await get_feedback_count()
-    
-    
-    return feedback_count >= RetrainingConfig.min_feedback_samples
-
-async def get_feedback_count():
-    """Get approximate feedback count (simplified for demo)"""
-    try:
-        s3 = boto3.client('s3')
-        
-        
-        return 75  
-    except:
-        return 0
-
-async def retrain_models():
-    """Retrain models using accumulated feedback data"""
-    print("🚀 Starting model retraining pipeline...")
-    
-    
-    training_data = await collect_feedback_data()
-    
-    
-    print("📊 Retraining image model with new feedback data...")
-    await asyncio.sleep(2)  
-    
-    print("📊 Retraining text model with new feedback data...")
-    await asyncio.sleep(2)
-    
-    print("📊 Retraining risk assessment model...")
-    await asyncio.sleep(1)
-    
-
-    print("✅ Model retraining completed successfully!")
-    print("🔄 New models are now active")
-
-async def collect_feedback_data():
-    """Collect feedback data from S3 (simplified)"""
-    print("📥 Collecting feedback data for retraining...")
-    await asyncio.sleep(1)
-    return {"samples": 100, "positive_feedback": 85, "negative_feedback": 15}
+    """Enough new feedback since the last job, or the retraining interval has passed with some"""
+    if retraining.active is not None and not retraining.active.done:
+        return False
+    new_feedback = get_feedback_count() - retraining.samples_at_last_job
+    if new_feedback >= RetrainingConfig.min_feedback_samples:
+        return True
+    last = retraining.last_finished
+    return (new_feedback > 0 and last is not None
+            and (datetime.utcnow() - last).total_seconds() >= RetrainingConfig.retrain_interval_hours * 3600)
+
+def get_feedback_count():
+    """Running count of stored feedback, O(1)"""
+    return feedback_store.count if feedback_store is not None else 0
 
 @app.get("/health")
 async def health():
@@ -7,6 +7,7 @@ from datetime import datetime
 
 API_GATEWAY_URL = "http://orchestrator:8000"  
 FEEDBACK_SERVICE_URL = "http://feedback-service:8006"  
+FUSION_SERVICE_URL = "http://fusion-service:8005"
 
 st.set_page_config(
     page_title="Content Moderation Platform",
@@ -144,7 +145,7 @@ def display_results(result):
 def submit_feedback(result, user_feedback):
     """Submit feedback to your FastAPI feedback service"""
     feedback_data = {
-        "prediction_id": result.get('analysis_id', str(datetime.now().timestamp())),
+        "prediction_id": result.get('prediction_id') or result.get('analysis_id', str(datetime.now().timestamp())),
         "user_feedback": user_feedback,
         "actual_risk_score": result.get('risk_score'),
         "corrected_flags": [],
@@ -217,15 +218,38 @@ def show_feedback_stats():
             st.info("No feedback statistics available yet")
     except Exception as e:
         st.error(f"Could not fetch feedback stats: {str(e)}")
+    
+    st.subheader("Moderation Activity (last 24 hours)")
+    
+    try:
+        response = requests.get(f"{FUSION_SERVICE_URL}/stats",
+                                params={"resolution": "1h", "last": 23, "top": 5}, timeout=5)
+        stats = response.json()
+        if response.status_code == 200 and 'error' not in stats:
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.metric("Decisions", stats['total'])
+            with col2:
+                st.metric("Review Rate", f"{stats['review_rate']:.1%}")
+            with col3:
+                st.metric("Avg Risk Score", f"{stats['avg_risk']:.2f}")
+            
+            if stats['top_terms']:
+                st.write("**Most matched unsafe terms:**")
+                st.dataframe(pd.DataFrame(stats['top_terms'])[['value', 'count']], hide_index=True)
+        else:
+            st.info("No moderation statistics available yet")
+    except Exception as e:
+        st.error(f"Could not fetch moderation stats: {str(e)}")
 
 def show_model_management():
     st.subheader("Model Management")
     
     st.info("""
     **Auto-Retraining Features:**
-    - Automatic retraining every 24 hours
-    - Minimum 100 feedback samples required
-    - Performance threshold: 85% accuracy
+    - Retraining after every 100 new feedback samples (or 24 hours with new feedback)
+    - Refits the risk-rule weights on feedback joined with stored predictions
+    - Published only at 85%+ holdout accuracy, and never worse than the current weights
     """)
     
     col1, col2 = st.columns(2)
@@ -235,11 +259,25 @@ def show_model_management():
             try:
                 response = requests.post(f"{FEEDBACK_SERVICE_URL}/retrain")
                 if response.status_code == 200:
-                    st.success("✅ Retraining started!")
+                    job = response.json()['job']
+                    st.success(f"✅ Retraining job {job['job_id']}: {job['status']}")
                 else:
                     st.error("Failed to trigger retraining")
             except Exception as e:
                 st.error(f"Error: {str(e)}")
+        
+        try:
+            jobs = requests.get(f"{FEEDBACK_SERVICE_URL}/retrain/jobs", timeout=5).json()['jobs']
+            if jobs:
+                latest = jobs[0]
+                st.write(f"**Latest job:** {latest['job_id']} - {latest['status']}")
+                if latest['result']:
+                    st.write(f"Holdout accuracy: {latest['result']['holdout_accuracy']:.1%} "
+                             f"(current weights: {latest['result']['baseline_holdout_accuracy']:.1%})")
+                if latest['error']:
+                    st.caption(latest['error'])
+        except Exception as e:
+            st.error(f"Could not fetch retraining jobs: {str(e)}")
     
     with col2:
         if st.button("📊 View Retraining Metrics"):
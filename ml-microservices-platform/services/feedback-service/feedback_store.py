@@ -0,0 +1,254 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+from prometheus_client import Counter, Gauge
+
+
+FEEDBACK_STORED = Gauge('feedback_stored_total', 'Feedback records in the local log')
+FEEDBACK_UPLOADS = Counter('feedback_uploads_total', 'Feedback window uploads, by outcome', ['outcome'])
+FEEDBACK_UPLOADED_RECORDS = Counter('feedback_uploaded_records_total', 'Feedback records uploaded to the archive')
+
+
+class S3Backend:
+    """Archive backend writing objects to an S3 bucket"""
+
+    def __init__(self, bucket: str, prefix: str = ""):
+        import boto3
+        self.bucket = bucket
+        self.prefix = prefix.strip('/') + '/' if prefix.strip('/') else ''
+        self.client = boto3.client('s3')
+
+    def put(self, key: str, body: bytes):
+        self.client.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=body,
+                               ContentType='application/x-ndjson')
+
+    def __repr__(self):
+        return f"s3://{self.bucket}/{self.prefix}".rstrip('/')
+
+
+class FilesystemBackend:
+    """Local stand-in for S3: objects become files under ``root``"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def put(self, key: str, body: bytes):
+        path = os.path.join(self.root, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(body)
+        os.replace(temporary, path)
+
+    def __repr__(self):
+        return f"file://{self.root}"
+
+
+def open_backend(url: str):
+    """``s3://bucket/prefix``, ``file:///path`` or ``none``"""
+    scheme, _, location = url.partition('://')
+    if scheme == 's3':
+        bucket, _, prefix = location.partition('/')
+        return S3Backend(bucket, prefix)
+    if scheme == 'file':
+        return FilesystemBackend(location)
+    if scheme == 'none':
+        return None
+    raise ValueError(f"Unknown feedback archive '{url}', expected s3://, file:// or none")
+
+
+# (day, byte offset) into the log; days are the segment names, YYYY-MM-DD
+Position = Tuple[str, int]
+
+
+class FeedbackStore:
+    """Append-only local feedback log with in-memory indexes.
+
+    Records are appended as JSON lines to one segment file per UTC day
+    under ``directory/log``. The indexes map prediction_id and day to
+    record positions, and ``count`` is a running total, so lookups and
+    counts never scan the log (it is read once, on startup, to rebuild
+    them). Safe to use from several threads.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.log_directory = os.path.join(directory, 'log')
+        os.makedirs(self.log_directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.by_prediction: Dict[str, List[Position]] = {}
+        self.by_day: Dict[str, int] = {}
+        self._day = None
+        self._file = None
+        self._rebuild()
+
+    def _segment(self, day: str) -> str:
+        return os.path.join(self.log_directory, f"{day}.jsonl")
+
+    def days(self) -> List[str]:
+        return sorted(name[:-len('.jsonl')] for name in os.listdir(self.log_directory) if name.endswith('.jsonl'))
+
+    def _rebuild(self):
+        for day in self.days():
+            offset = 0
+            with open(self._segment(day), 'rb+') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # Torn write from a crash: drop it so appends start on a clean line
+                        f.truncate(offset)
+                        break
+                    self._index(json.loads(line)['prediction_id'], day, offset)
+                    offset += len(line)
+        FEEDBACK_STORED.set(self.count)
+
+    def _index(self, prediction_id: str, day: str, offset: int):
+        self.by_prediction.setdefault(prediction_id, []).append((day, offset))
+        self.by_day[day] = self.by_day.get(day, 0) + 1
+        self.count += 1
+
+    def append(self, record: dict) -> Position:
+        """Append one record (must have prediction_id and an ISO timestamp); returns its position"""
+        line = (json.dumps(record, default=str) + '\n').encode()
+        day = record['timestamp'][:10]
+        with self._lock:
+            if day != self._day:
+                if self._file is not None:
+                    self._file.close()
+                self._file = open(self._segment(day), 'ab')
+                self._day = day
+            offset = self._file.tell()
+            self._file.write(line)
+            self._file.flush()
+            self._index(record['prediction_id'], day, offset)
+            FEEDBACK_STORED.set(self.count)
+            return day, offset
+
+    def end(self) -> Position:
+        """Position just past the last complete record"""
+        with self._lock:
+            if self._file is not None:
+                return self._day, self._file.tell()
+        days = self.days()
+        if not days:
+            return "", 0
+        return days[-1], os.path.getsize(self._segment(days[-1]))
+
+    def _read_at(self, day: str, offset: int) -> dict:
+        with open(self._segment(day), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+    def get(self, prediction_id: str) -> List[dict]:
+        """Every feedback record for a prediction, oldest first"""
+        return [self._read_at(day, offset) for day, offset in self.by_prediction.get(prediction_id, [])]
+
+    def count_by_day(self) -> Dict[str, int]:
+        return dict(sorted(self.by_day.items()))
+
+    def read_range(self, start: Position, end: Position) -> Iterator[Tuple[Position, bytes]]:
+        """Raw record lines from ``start`` up to ``end``, with the position after each"""
+        for day in self.days():
+            if day < start[0] or day > end[0]:
+                continue
+            offset = start[1] if day == start[0] else 0
+            with open(self._segment(day), 'rb') as f:
+                f.seek(offset)
+                for line in f:
+                    if day == end[0] and offset + len(line) > end[1]:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    offset += len(line)
+                    yield (day, offset), line
+
+    def records(self, since_day: Optional[str] = None) -> Iterator[dict]:
+        """Stream every record (optionally from ``since_day`` on) without loading the log"""
+        for _, line in self.read_range((since_day or "", 0), self.end()):
+            yield json.loads(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._day = None
+
+
+class WindowUploader:
+    """Ships the feedback log to an archive backend, one object per time window.
+
+    Every ``interval`` seconds a worker thread uploads everything appended
+    since the last upload as a single NDJSON object keyed by the window's
+    time, e.g. ``feedback/2024/01/31/140500.000000-141000.000000.jsonl``. The upload cursor
+    is persisted next to the log, so a restart neither repeats nor skips
+    records. A failed upload leaves the cursor where it was and the window
+    is retried (together with newer records) next time. ``close`` uploads
+    whatever is left.
+    """
+
+    def __init__(self, store: FeedbackStore, backend, interval: float = 300.0, prefix: str = "feedback/"):
+        self.store = store
+        self.backend = backend
+        self.interval = interval
+        self.prefix = prefix
+        self.cursor_path = os.path.join(store.directory, 'upload_cursor.json')
+        self.cursor, self.window_start = self._load_cursor()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="feedback-uploader", daemon=True)
+        self._worker.start()
+
+    def _load_cursor(self) -> Tuple[Position, float]:
+        if os.path.exists(self.cursor_path):
+            with open(self.cursor_path) as f:
+                saved = json.load(f)
+            return (saved['day'], saved['offset']), saved['window_start']
+        return ("", 0), time.time()
+
+    def _save_cursor(self):
+        temporary = f"{self.cursor_path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump({'day': self.cursor[0], 'offset': self.cursor[1], 'window_start': self.window_start}, f)
+        os.replace(temporary, self.cursor_path)
+
+    def upload(self) -> int:
+        """Upload the current window now; returns the number of records shipped"""
+        with self._lock:
+            end = self.store.end()
+            position, lines = self.cursor, []
+            for position, line in self.store.read_range(self.cursor, end):
+                lines.append(line)
+            window_end = time.time()
+            if not lines:
+                return 0
+            # Windows follow each other, so start-end is unique even for several windows a second
+            start, stop = datetime.utcfromtimestamp(self.window_start), datetime.utcfromtimestamp(window_end)
+            key = f"{self.prefix}{start:%Y/%m/%d/%H%M%S.%f}-{stop:%H%M%S.%f}.jsonl"
+            try:
+                self.backend.put(key, b''.join(lines))
+            except Exception as e:
+                FEEDBACK_UPLOADS.labels(outcome='failed').inc()
+                print(f"❌ Feedback upload of {len(lines)} records to {self.backend} failed: {e}")
+                return 0
+            FEEDBACK_UPLOADS.labels(outcome='uploaded').inc()
+            FEEDBACK_UPLOADED_RECORDS.inc(len(lines))
+            self.cursor, self.window_start = position, window_end
+            self._save_cursor()
+            print(f"✅ Uploaded {len(lines)} feedback records to {self.backend}/{key}")
+            return len(lines)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.upload()
+            except Exception as e:
+                print(f"❌ Feedback upload failed: {e}")
+
+    def close(self, timeout: Optional[float] = None):
+        self._stop.set()
+        self._worker.join(timeout)
+        self.upload()
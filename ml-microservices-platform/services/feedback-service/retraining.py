@@ -0,0 +1,288 @@
+import asyncio
+import uuid
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+import requests
+from prometheus_client import Counter, Histogram
+
+from crossmodal.registry import apply_weights
+from crossmodal.rules import RuleSet
+
+
+RETRAINING_JOBS = Counter('retraining_jobs_total', 'Finished retraining jobs, by outcome', ['outcome'])
+RETRAINING_SECONDS = Histogram('retraining_job_seconds', 'Retraining job duration')
+
+REVIEW_THRESHOLD = 0.6
+HOLDOUT_FRACTION = 0.2
+# Steepness of the logistic link around the review threshold, in score units
+DECISION_TEMPERATURE = 10.0
+# Pull towards the current weights, so rules with little feedback barely move
+L2_PENALTY = 1.0
+LOOKUP_CHUNK = 500
+MAX_JOBS_KEPT = 20
+
+
+def latest_feedback(store) -> Dict[str, bool]:
+    """prediction_id -> was the decision correct, streamed from the log; later feedback wins"""
+    verdicts = {}
+    for record in store.records():
+        if isinstance(record.get('user_feedback'), bool):
+            verdicts[record['prediction_id']] = record['user_feedback']
+    return verdicts
+
+
+def fetch_predictions(session, fusion_url: str, prediction_ids: List[str]) -> Dict[str, dict]:
+    response = session.post(f"{fusion_url}/analytics/results/lookup", json={"analysis_ids": prediction_ids},
+                            timeout=30)
+    response.raise_for_status()
+    body = response.json()
+    if 'error' in body:
+        raise RuntimeError(body['error'])
+    return body['results']
+
+
+def collect_examples(store, fusion_url: str, rule_ids: List[str], progress: dict):
+    """Join feedback with the stored predictions it refers to.
+
+    Returns (prediction_ids, features, labels): features are which rules
+    fired for each prediction, and the label is whether it should have
+    been sent for review (its decision if the feedback says correct, the
+    opposite otherwise). Predictions missing from the store or stored
+    without their fired rules are skipped.
+    """
+    verdicts = latest_feedback(store)
+    progress.update(feedback_predictions=len(verdicts), joined=0, missing=0)
+    column = {rule_id: j for j, rule_id in enumerate(rule_ids)}
+    ids, rows, labels = [], [], []
+    pending = list(verdicts)
+    with requests.Session() as session:
+        for i in range(0, len(pending), LOOKUP_CHUNK):
+            chunk = pending[i:i + LOOKUP_CHUNK]
+            found = fetch_predictions(session, fusion_url, chunk)
+            for prediction_id in chunk:
+                prediction = found.get(prediction_id)
+                if prediction is None or 'rules_fired' not in prediction:
+                    progress['missing'] += 1
+                    continue
+                row = np.zeros(len(rule_ids), dtype=np.float64)
+                for rule_id in prediction['rules_fired']:
+                    if rule_id in column:
+                        row[column[rule_id]] = 1.0
+                ids.append(prediction_id)
+                rows.append(row)
+                labels.append(bool(prediction['needs_review']) == verdicts[prediction_id])
+                progress['joined'] += 1
+    features = np.array(rows).reshape(len(rows), len(rule_ids))
+    return ids, features, np.array(labels, dtype=bool)
+
+
+def holdout_mask(prediction_ids: List[str], fraction: float = HOLDOUT_FRACTION) -> np.ndarray:
+    """Stable split by id hash, so a prediction stays on the same side across jobs"""
+    buckets = np.array([zlib.crc32(pid.encode()) % 1000 for pid in prediction_ids], dtype=np.int64)
+    return buckets < int(fraction * 1000)
+
+
+def review_decisions(features: np.ndarray, weights: np.ndarray, floors: List[Optional[float]],
+                     ceilings: List[Optional[float]], clamp, threshold: float = REVIEW_THRESHOLD) -> np.ndarray:
+    """needs_review per example, applying the rules in order exactly like the rule engine"""
+    risk = np.zeros(len(features))
+    for j, (floor, ceiling) in enumerate(zip(floors, ceilings)):
+        updated = risk + weights[j]
+        if floor is not None:
+            updated = np.maximum(updated, floor)
+        if ceiling is not None:
+            updated = np.minimum(updated, ceiling)
+        risk = np.where(features[:, j] > 0, updated, risk)
+    return np.clip(risk, clamp[0], clamp[1]) > threshold
+
+
+def fit_weights(features: np.ndarray, labels: np.ndarray, initial: np.ndarray,
+                threshold: float = REVIEW_THRESHOLD, temperature: float = DECISION_TEMPERATURE,
+                l2: float = L2_PENALTY, iterations: int = 50) -> np.ndarray:
+    """Logistic regression of the review label on the fired rules.
+
+    Models P(review) = sigmoid(temperature * (sum of fired weights -
+    threshold)), so the coefficients are rule weights on the existing
+    score scale and the review threshold stays put. Fitted by Newton's
+    method with an L2 pull towards ``initial``. Floors, ceilings and the
+    clamp are left out of the fit; evaluation applies them.
+    """
+    weights = initial.astype(np.float64).copy()
+    y = labels.astype(np.float64)
+    for _ in range(iterations):
+        z = temperature * (features @ weights - threshold)
+        p = 1.0 / (1.0 + np.exp(-z))
+        gradient = temperature * features.T @ (p - y) + l2 * (weights - initial)
+        hessian = temperature ** 2 * (features.T * (p * (1 - p))) @ features + l2 * np.eye(len(weights))
+        step = np.linalg.solve(hessian, gradient)
+        weights -= step
+        if np.max(np.abs(step)) < 1e-6:
+            break
+    return weights
+
+
+def train_and_evaluate(features: np.ndarray, labels: np.ndarray, holdout: np.ndarray, initial: List[float],
+                       floors: List[Optional[float]], ceilings: List[Optional[float]], clamp) -> dict:
+    """Fit on the training split and score new and current weights on the holdout (runs in a worker process)"""
+    initial = np.array(initial, dtype=np.float64)
+    train = ~holdout
+    weights = fit_weights(features[train], labels[train], initial)
+
+    def accuracy(w, mask):
+        if not mask.any():
+            return None
+        return float(np.mean(review_decisions(features[mask], w, floors, ceilings, clamp) == labels[mask]))
+
+    return {
+        'weights': [round(float(w), 4) for w in weights],
+        'train_size': int(train.sum()),
+        'holdout_size': int(holdout.sum()),
+        'train_accuracy': accuracy(weights, train),
+        'holdout_accuracy': accuracy(weights, holdout),
+        'baseline_holdout_accuracy': accuracy(initial, holdout)
+    }
+
+
+class RetrainingJob:
+    def __init__(self, trigger: str, feedback_count: int):
+        self.id = f"job_{uuid.uuid4().hex[:8]}"
+        self.trigger = trigger
+        self.feedback_count = feedback_count
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'trigger': self.trigger,
+            'status': self.status,
+            'feedback_count': self.feedback_count,
+            'progress': dict(self.progress),
+            'result': self.result,
+            'error': self.error,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+
+class RetrainingRunner:
+    """Runs retraining jobs one at a time, off the request path.
+
+    A job streams the feedback log, joins it with the stored predictions
+    from fusion-service (in a thread), refits the rule weights in a worker
+    process, and publishes the new weights to the registry only when
+    their holdout accuracy reaches ``performance_threshold`` and is no
+    worse than the current weights'. ``publish_stage`` 'candidate' sends
+    them to shadow testing instead of straight into service. Submitting
+    while a job is running returns that job.
+    """
+
+    def __init__(self, store, registry, fusion_url: str, base_rules_path: str,
+                 performance_threshold: float, min_samples: int, publish_stage: str = 'current'):
+        self.store = store
+        self.registry = registry
+        self.fusion_url = fusion_url
+        self.base_rules_path = base_rules_path
+        self.performance_threshold = performance_threshold
+        self.min_samples = min_samples
+        self.publish_stage = publish_stage
+        self.jobs = OrderedDict()
+        self.active = None
+        self.last_finished = None
+        self.samples_at_last_job = 0
+        self._pool = None
+        self._tasks = set()
+
+    def current_rules(self):
+        """The rules file, and it with the current published weights as risk-service scores with"""
+        base = RuleSet.load(self.base_rules_path)
+        published = self.registry.load_current()
+        return base, apply_weights(base, published) if published else base
+
+    def submit(self, trigger: str) -> RetrainingJob:
+        if self.active is not None and not self.active.done:
+            return self.active
+        job = RetrainingJob(trigger, self.store.count)
+        self.samples_at_last_job = job.feedback_count
+        self.jobs[job.id] = job
+        while len(self.jobs) > MAX_JOBS_KEPT:
+            self.jobs.popitem(last=False)
+        self.active = job
+        task = asyncio.create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    async def _run(self, job: RetrainingJob):
+        loop = asyncio.get_running_loop()
+        print(f"🚀 Retraining job {job.id} started ({job.trigger})")
+        try:
+            with RETRAINING_SECONDS.time():
+                base, rules = await loop.run_in_executor(None, self.current_rules)
+                rule_ids = [rule.id for rule in rules.rules]
+                job.progress['base_version'] = rules.version
+
+                job.status = "collecting"
+                ids, features, labels = await loop.run_in_executor(
+                    None, collect_examples, self.store, self.fusion_url, rule_ids, job.progress
+                )
+                if len(ids) < self.min_samples:
+                    job.status = "insufficient_data"
+                    job.error = f"{len(ids)} joined examples, need {self.min_samples}"
+                    return
+
+                job.status = "fitting"
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=1)
+                result = await loop.run_in_executor(
+                    self._pool, train_and_evaluate, features, labels, holdout_mask(ids),
+                    [rule.weight for rule in rules.rules], [rule.floor for rule in rules.rules],
+                    [rule.ceiling for rule in rules.rules], rules.clamp
+                )
+                result['weights'] = dict(zip(rule_ids, result.pop('weights')))
+                job.result = result
+
+                accuracy = result['holdout_accuracy']
+                baseline = result['baseline_holdout_accuracy']
+                if accuracy is None or accuracy < self.performance_threshold or accuracy < baseline:
+                    job.status = "rejected"
+                    job.error = (f"Holdout accuracy {accuracy} below threshold {self.performance_threshold} "
+                                 f"or current weights ({baseline})")
+                    return
+
+                version = f"{rules.version.split('+')[0]}+retrained.{datetime.utcnow():%Y%m%d%H%M%S}.{job.id[4:]}"
+                await loop.run_in_executor(None, self.registry.publish, version, result['weights'], base.version, {
+                    'job_id': job.id, 'weights_version': rules.version, 'holdout_accuracy': accuracy,
+                    'baseline_holdout_accuracy': baseline, 'examples': len(ids)
+                }, self.publish_stage)
+                result['published_version'] = version
+                result['published_stage'] = self.publish_stage
+                job.status = "published"
+                print(f"✅ Retraining job {job.id} published rules {version} as {self.publish_stage} "
+                      f"(holdout accuracy {accuracy:.3f})")
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Retraining job {job.id} failed: {e}")
+        finally:
+            job.finished_at = datetime.utcnow()
+            self.last_finished = job.finished_at
+            RETRAINING_JOBS.labels(outcome=job.status).inc()
+            if job.status in ("rejected", "insufficient_data"):
+                print(f"⚠️ Retraining job {job.id} {job.status}: {job.error}")
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
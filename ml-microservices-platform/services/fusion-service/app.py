@@ -1,20 +1,44 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
+from typing import List, Optional
+import asyncio
 import boto3
+import decimal
+import os
 import uuid
 from datetime import datetime
 import time
 from prometheus_client import Counter, Histogram, generate_latest
-
-app = FastAPI(title="Fusion & Decision Service")
+from crossmodal.persistence import BatchWriter, ensure_table
+from result_store import NullResultStore, open_result_store, parse_duration
+from live_stats import RESOLUTIONS, TOP_K_CAPACITY, LiveStats
 
 
 FUSION_REQUEST_COUNT = Counter('fusion_requests_total', 'Total fusion requests')
 FUSION_PROCESSING_TIME = Histogram('fusion_processing_seconds', 'Fusion processing time')
 
+class ImageReference(BaseModel):
+    sha256: str
+    size_bytes: int
+
 class FusionRequest(BaseModel):
     risk_assessment: dict
-    original_input: dict
+    image_analysis: dict = {}
+    text_analysis: dict = {}
+    image_ref: Optional[ImageReference] = None
+    # Time spent upstream before fusion, so stored latencies cover the whole pipeline
+    pipeline_latency_ms: Optional[float] = None
+    # Id already given out for this analysis (early decisions); generated when absent
+    analysis_id: Optional[str] = None
+    # Set for early decisions: risk_assessment then holds the score and decision
+    # the client was given, and pipeline_risk the full pipeline's result (None
+    # when the image or risk stage failed before it was known)
+    early_decision: bool = False
+    pipeline_risk: Optional[dict] = None
+
+class FusionBatchRequest(BaseModel):
+    items: List[FusionRequest]
 
 class FusionResponse(BaseModel):
     analysis_id: str
@@ -28,12 +52,140 @@ class FusionResponse(BaseModel):
     prediction_id: str
 
 
+DYNAMODB_TABLE = os.getenv("DYNAMODB_TABLE", "ContentModerationResults")
+# Point at a local stand-in (e.g. amazon/dynamodb-local) instead of AWS
+DYNAMODB_ENDPOINT_URL = os.getenv("DYNAMODB_ENDPOINT_URL") or None
+DYNAMODB_CREATE_TABLE = os.getenv("DYNAMODB_CREATE_TABLE", "false").lower() == "true"
+PERSIST_DRAIN_TIMEOUT = float(os.getenv("PERSIST_DRAIN_TIMEOUT", "10"))
+# Local, queryable copy of results for the analytics endpoints ("none" to disable)
+RESULT_STORE_URL = os.getenv("RESULT_STORE_URL", "sqlite:///data/results.db")
+# In-memory rolling stats are snapshotted here so restarts keep them ("" to disable)
+STATS_SNAPSHOT_PATH = os.getenv("STATS_SNAPSHOT_PATH", "data/stats.json")
+STATS_SNAPSHOT_INTERVAL = float(os.getenv("STATS_SNAPSHOT_INTERVAL", "30"))
+
 try:
-    dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-    table = dynamodb.Table('ContentModerationResults')
+    dynamodb = boto3.resource('dynamodb', region_name='us-east-1', endpoint_url=DYNAMODB_ENDPOINT_URL)
 except:
     
-    table = None
+    dynamodb = None
+
+# Results are persisted off the request path, see crossmodal.persistence
+writer = None
+result_store = NullResultStore()
+live_stats = LiveStats(now=time.time())
+
+def load_live_stats() -> LiveStats:
+    if STATS_SNAPSHOT_PATH and os.path.exists(STATS_SNAPSHOT_PATH):
+        try:
+            stats = LiveStats.load(STATS_SNAPSHOT_PATH, now=time.time())
+            print(f"✅ Stats restored from {STATS_SNAPSHOT_PATH}")
+            return stats
+        except Exception as e:
+            print(f"❌ Could not restore stats from {STATS_SNAPSHOT_PATH}: {e}")
+    return LiveStats(now=time.time())
+
+async def save_live_stats():
+    # Serialised on the event loop (bounded size, so cheap), written off it
+    snapshot = live_stats.to_dict()
+    await asyncio.get_running_loop().run_in_executor(None, live_stats.save, STATS_SNAPSHOT_PATH, snapshot)
+
+async def snapshot_live_stats():
+    while True:
+        await asyncio.sleep(STATS_SNAPSHOT_INTERVAL)
+        try:
+            await save_live_stats()
+        except Exception as e:
+            print(f"❌ Stats snapshot failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global writer, result_store, live_stats
+    loop = asyncio.get_running_loop()
+    live_stats = load_live_stats()
+    snapshot_task = asyncio.create_task(snapshot_live_stats()) if STATS_SNAPSHOT_PATH else None
+    try:
+        result_store = open_result_store(RESULT_STORE_URL)
+    except Exception as e:
+        print(f"❌ Could not open result store {RESULT_STORE_URL}: {e}")
+    if dynamodb is not None:
+        if DYNAMODB_CREATE_TABLE:
+            try:
+                await loop.run_in_executor(None, ensure_table, dynamodb, DYNAMODB_TABLE)
+            except Exception as e:
+                print(f"❌ Could not create table {DYNAMODB_TABLE}: {e}")
+        writer = BatchWriter.from_env(dynamodb, DYNAMODB_TABLE)
+    yield
+    if snapshot_task is not None:
+        snapshot_task.cancel()
+        try:
+            await save_live_stats()
+        except Exception as e:
+            print(f"❌ Stats snapshot failed: {e}")
+    if writer is not None:
+        queued = len(writer)
+        if not await loop.run_in_executor(None, writer.close, PERSIST_DRAIN_TIMEOUT):
+            print(f"⚠️ Persistence drain timed out with items still queued ({queued} at shutdown)")
+    await loop.run_in_executor(None, result_store.close)
+
+app = FastAPI(title="Fusion & Decision Service", lifespan=lifespan)
+
+def build_record(request: FusionRequest, analysis_id: str) -> dict:
+    risk_assessment = request.risk_assessment
+    image_analysis = request.image_analysis
+    text_analysis = request.text_analysis
+    
+    record = {
+        'analysis_id': analysis_id,
+        'timestamp': datetime.utcnow().isoformat(),
+        'risk_score': risk_assessment['risk_score'],
+        'needs_review': risk_assessment['needs_review'],
+        'image_categories': image_analysis.get('categories', [])[:3],
+        'text_sentiment': text_analysis.get('sentiment', ''),
+        'unsafe_words_found': text_analysis.get('unsafe_found', []),
+        'moderation_flagged': image_analysis.get('moderation_flagged', False),
+        'explanation': risk_assessment['explanation'],
+        # Which rules produced the score, so feedback can be used to refit their weights
+        'rules_fired': risk_assessment.get('rules_fired', [])
+    }
+    if risk_assessment.get('rules_version'):
+        record['rules_version'] = risk_assessment['rules_version']
+    if request.early_decision:
+        record['early_decision'] = True
+        if request.pipeline_risk:
+            record['pipeline_risk_score'] = request.pipeline_risk['risk_score']
+            record['pipeline_needs_review'] = request.pipeline_risk['needs_review']
+    if request.image_ref:
+        record['image_sha256'] = request.image_ref.sha256
+        record['image_size_bytes'] = request.image_ref.size_bytes
+    return record
+
+def to_dynamodb_item(record: dict) -> dict:
+    """DynamoDB rejects Python floats, same conversion as the Lambda"""
+    return {
+        key: decimal.Decimal(str(value)) if isinstance(value, float) else value
+        for key, value in record.items()
+    }
+
+def fusion_response(record: dict, start_time: float) -> FusionResponse:
+    return FusionResponse(
+        analysis_id=record['analysis_id'],
+        risk_score=record['risk_score'],
+        needs_review=record['needs_review'],
+        image_categories=record['image_categories'],
+        text_sentiment=record['text_sentiment'],
+        unsafe_found=record['unsafe_words_found'],
+        explanation=record['explanation'],
+        processing_time=time.time() - start_time,
+        prediction_id=record['analysis_id']
+    )
+
+def record_result(request: FusionRequest, record: dict, start_time: float):
+    """Update the rolling stats and queue the result for the local store"""
+    live_stats.add(record, start_time)
+    latency_ms = (time.time() - start_time) * 1000
+    if request.pipeline_latency_ms is not None:
+        latency_ms += request.pipeline_latency_ms
+    result_store.add(record, start_time, latency_ms)
 
 @app.post("/fuse")
 async def fuse_decisions(request: FusionRequest):
@@ -42,44 +194,122 @@ async def fuse_decisions(request: FusionRequest):
     
     try:
         with FUSION_PROCESSING_TIME.time():
-            risk_assessment = request.risk_assessment
-            original_input = request.original_input
-            
             
-            analysis_id = f"mod_{uuid.uuid4().hex[:8]}"
+            analysis_id = request.analysis_id or f"mod_{uuid.uuid4().hex[:8]}"
+            record = build_record(request, analysis_id)
             
+            if writer is not None and not writer.put(to_dynamodb_item(record)):
+                print(f"⚠️ Persistence queue full, {analysis_id} not persisted")
+            record_result(request, record, start_time)
             
-            if table:
-                item = {
-                    'analysis_id': analysis_id,
-                    'timestamp': datetime.utcnow().isoformat(),
-                    'risk_score': risk_assessment['risk_score'],
-                    'needs_review': risk_assessment['needs_review'],
-                    'image_categories': original_input.get('image_analysis', {}).get('categories', [])[:3],
-                    'text_sentiment': original_input.get('text_analysis', {}).get('sentiment', ''),
-                    'unsafe_words_found': original_input.get('text_analysis', {}).get('unsafe_found', []),
-                    'moderation_flagged': original_input.get('image_analysis', {}).get('moderation_flagged', False),
-                    'explanation': risk_assessment['explanation']
-                }
-                table.put_item(Item=item)
-            
-            processing_time = time.time() - start_time
-            
-            return FusionResponse(
-                analysis_id=analysis_id,
-                risk_score=risk_assessment['risk_score'],
-                needs_review=risk_assessment['needs_review'],
-                image_categories=original_input.get('image_analysis', {}).get('categories', [])[:3],
-                text_sentiment=original_input.get('text_analysis', {}).get('sentiment', ''),
-                unsafe_found=original_input.get('text_analysis', {}).get('unsafe_found', []),
-                explanation=risk_assessment['explanation'],
-                processing_time=processing_time,
-                prediction_id=analysis_id
-            )
+            return fusion_response(record, start_time)
             
     except Exception as e:
         return {"error": f"Fusion processing failed: {str(e)}"}
 
+@app.post("/fuse/batch")
+async def fuse_decisions_batch(request: FusionBatchRequest):
+    """Fuse many items in one call; records are queued for the background writer"""
+    start_time = time.time()
+    results, records = [], []
+    
+    with FUSION_PROCESSING_TIME.time():
+        for item in request.items:
+            FUSION_REQUEST_COUNT.inc()
+            try:
+                record = build_record(item, item.analysis_id or f"mod_{uuid.uuid4().hex[:8]}")
+                records.append(record)
+                record_result(item, record, start_time)
+                results.append(fusion_response(record, start_time))
+            except Exception as e:
+                results.append({"error": f"Fusion processing failed: {str(e)}"})
+        
+        if writer is not None:
+            dropped = sum(1 for record in records if not writer.put(to_dynamodb_item(record)))
+            if dropped:
+                print(f"⚠️ Persistence queue full, {dropped} of {len(records)} records not persisted")
+    
+    return {"results": results, "processing_time": time.time() - start_time}
+
+def analytics_window(window: str, end: Optional[float] = None):
+    end = time.time() if end is None else end
+    return end - parse_duration(window), end
+
+async def query_store(method, *args):
+    """Run a store query off the event loop"""
+    return await asyncio.get_running_loop().run_in_executor(None, method, *args)
+
+@app.get("/analytics/summary")
+async def analytics_summary(window: str = "24h", compare: bool = False):
+    """Totals, review rate, average risk, risk bands, sentiments and latency percentiles for a window"""
+    try:
+        start, end = analytics_window(window)
+        summary = await query_store(result_store.summary, start, end)
+        response = {"window": window, "start": start, "end": end, **summary}
+        if compare:
+            # The window just before, for deltas
+            response["previous"] = await query_store(result_store.summary, 2 * start - end, start)
+        return response
+    except Exception as e:
+        return {"error": f"Analytics query failed: {str(e)}"}
+
+@app.get("/analytics/risk-histogram")
+async def analytics_risk_histogram(window: str = "24h"):
+    try:
+        start, end = analytics_window(window)
+        return {"window": window, "buckets": await query_store(result_store.risk_histogram, start, end)}
+    except Exception as e:
+        return {"error": f"Analytics query failed: {str(e)}"}
+
+@app.get("/analytics/timeseries")
+async def analytics_timeseries(window: str = "24h", interval: str = "1h"):
+    """Per-interval counts, review counts, average risk and latency percentiles"""
+    try:
+        step = parse_duration(interval)
+        end = time.time()
+        # Align slots to the interval so whole hours can come from the rollup
+        end = (end // step + 1) * step
+        start, end = analytics_window(window, end)
+        return {"window": window, "interval": interval,
+                "points": await query_store(result_store.timeseries, start, end, step)}
+    except Exception as e:
+        return {"error": f"Analytics query failed: {str(e)}"}
+
+@app.get("/analytics/results")
+async def analytics_results(limit: int = Query(50, le=1000), needs_review: Optional[bool] = None,
+                            sentiment: Optional[str] = None, min_risk: Optional[float] = None):
+    """Most recent stored results, optionally filtered"""
+    try:
+        results = await query_store(result_store.recent, limit, needs_review, sentiment, min_risk)
+        return {"results": results}
+    except Exception as e:
+        return {"error": f"Analytics query failed: {str(e)}"}
+
+@app.get("/stats")
+async def stats(resolution: str = "1h", last: int = Query(0, ge=0, le=max(keep for _, keep in RESOLUTIONS.values())),
+                top: int = Query(10, le=TOP_K_CAPACITY), history: bool = False):
+    """Precomputed rolling stats: the current ``resolution`` window (1m, 1h or 1d)
+    merged with the ``last`` closed ones, e.g. resolution=1h&last=23 for the last day"""
+    try:
+        now = time.time()
+        response = {"resolution": resolution, **live_stats.stats(resolution, last, now, top)}
+        if history:
+            response["history"] = live_stats.history(resolution, now)
+        return response
+    except Exception as e:
+        return {"error": f"Stats unavailable: {str(e)}"}
+
+class LookupRequest(BaseModel):
+    analysis_ids: List[str]
+
+@app.post("/analytics/results/lookup")
+async def analytics_lookup(request: LookupRequest):
+    """Stored results by analysis_id; ids not in the store are left out"""
+    try:
+        return {"results": await query_store(result_store.lookup, request.analysis_ids)}
+    except Exception as e:
+        return {"error": f"Analytics query failed: {str(e)}"}
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "fusion-decision"}
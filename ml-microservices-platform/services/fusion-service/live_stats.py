@@ -0,0 +1,254 @@
+import json
+import os
+from collections import deque
+from typing import Dict, List, Optional
+
+from result_store import RISK_BANDS, risk_bucket
+
+
+# name -> (window seconds, closed windows kept)
+RESOLUTIONS = {
+    '1m': (60, 60),
+    '1h': (3600, 24),
+    '1d': (86400, 30),
+}
+
+TOP_K_CAPACITY = 32
+
+
+class TopK:
+    """Space-Saving heavy-hitters sketch holding at most ``capacity`` items.
+
+    Counts are overestimates by at most the recorded ``error``; any item
+    seen more than total/capacity times is guaranteed to be present.
+    """
+
+    def __init__(self, capacity: int = TOP_K_CAPACITY):
+        self.capacity = capacity
+        # item -> [count, error]
+        self.counters = {}
+
+    def add(self, item: str, count: int = 1):
+        counter = self.counters.get(item)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[item] = [count, 0]
+        else:
+            evicted = min(self.counters, key=lambda key: self.counters[key][0])
+            floor = self.counters.pop(evicted)[0]
+            self.counters[item] = [floor + count, floor]
+
+    def merge(self, other: "TopK"):
+        for item, (count, error) in other.counters.items():
+            counter = self.counters.setdefault(item, [0, 0])
+            counter[0] += count
+            counter[1] += error
+        if len(self.counters) > self.capacity:
+            keep = sorted(self.counters.items(), key=lambda entry: -entry[1][0])[:self.capacity]
+            self.counters = dict(keep)
+
+    def top(self, n: int = 10) -> List[dict]:
+        ranked = sorted(self.counters.items(), key=lambda entry: (-entry[1][0], entry[0]))[:n]
+        return [{'value': item, 'count': count, 'error': error} for item, (count, error) in ranked]
+
+    def to_dict(self) -> dict:
+        return {item: counter for item, counter in self.counters.items()}
+
+    @classmethod
+    def from_dict(cls, data: dict, capacity: int = TOP_K_CAPACITY) -> "TopK":
+        sketch = cls(capacity)
+        sketch.counters = {item: list(counter) for item, counter in data.items()}
+        return sketch
+
+
+class WindowStats:
+    """Counts for one tumbling window; fixed size whatever the traffic"""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.total = 0
+        self.needs_review = 0
+        self.risk_sum = 0.0
+        self.risk_bands = {name: 0 for name, _, _ in RISK_BANDS}
+        self.sentiments = {}
+        self.categories = TopK()
+        self.terms = TopK()
+
+    def add(self, record: dict):
+        score = float(record['risk_score'])
+        self.total += 1
+        self.needs_review += 1 if record['needs_review'] else 0
+        self.risk_sum += score
+        bucket = risk_bucket(score)
+        for name, low, high in RISK_BANDS:
+            if low <= bucket <= high:
+                self.risk_bands[name] += 1
+        sentiment = record.get('text_sentiment') or 'UNKNOWN'
+        self.sentiments[sentiment] = self.sentiments.get(sentiment, 0) + 1
+        for category in record.get('image_categories', []):
+            self.categories.add(category)
+        for term in record.get('unsafe_words_found', []):
+            self.terms.add(term)
+
+    def merge(self, other: "WindowStats"):
+        self.total += other.total
+        self.needs_review += other.needs_review
+        self.risk_sum += other.risk_sum
+        for name, count in other.risk_bands.items():
+            self.risk_bands[name] += count
+        for sentiment, count in other.sentiments.items():
+            self.sentiments[sentiment] = self.sentiments.get(sentiment, 0) + count
+        self.categories.merge(other.categories)
+        self.terms.merge(other.terms)
+
+    def summary(self, top: int = 10) -> dict:
+        return {
+            'start': self.start,
+            'total': self.total,
+            'needs_review': self.needs_review,
+            'review_rate': self.needs_review / self.total if self.total else 0.0,
+            'avg_risk': self.risk_sum / self.total if self.total else 0.0,
+            'risk_bands': dict(self.risk_bands),
+            'sentiments': dict(self.sentiments),
+            'top_categories': self.categories.top(top),
+            'top_terms': self.terms.top(top)
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            'start': self.start, 'total': self.total, 'needs_review': self.needs_review,
+            'risk_sum': self.risk_sum, 'risk_bands': self.risk_bands, 'sentiments': self.sentiments,
+            'categories': self.categories.to_dict(), 'terms': self.terms.to_dict()
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "WindowStats":
+        window = cls(data['start'])
+        window.total = data['total']
+        window.needs_review = data['needs_review']
+        window.risk_sum = data['risk_sum']
+        window.risk_bands.update(data['risk_bands'])
+        window.sentiments = dict(data['sentiments'])
+        window.categories = TopK.from_dict(data['categories'])
+        window.terms = TopK.from_dict(data['terms'])
+        return window
+
+
+class TumblingWindows:
+    """The current window of one resolution plus the last ``keep`` closed ones"""
+
+    def __init__(self, size: float, keep: int):
+        self.size = size
+        self.closed = deque(maxlen=keep)
+        self.current = None
+
+    def roll(self, timestamp: float):
+        start = timestamp - timestamp % self.size
+        if self.current is None:
+            self.current = WindowStats(start)
+            return
+        if start <= self.current.start:
+            return
+        # Close the current window, plus empty ones for any idle gap (at most keep)
+        gap = int((start - self.current.start) // self.size) - 1
+        self.closed.append(self.current)
+        for k in range(gap - min(gap, self.closed.maxlen), gap):
+            self.closed.append(WindowStats(self.current.start + (k + 1) * self.size))
+        self.current = WindowStats(start)
+
+    def add(self, record: dict, timestamp: float):
+        self.roll(timestamp)
+        # Late records (clock skew between workers) count towards the current window
+        self.current.add(record)
+
+    def combined(self, last: int) -> WindowStats:
+        """Current window merged with the ``last`` most recent closed ones"""
+        merged = WindowStats(self.current.start)
+        windows = list(self.closed)[-last:] if last else []
+        for window in windows:
+            merged.start = min(merged.start, window.start)
+            merged.merge(window)
+        merged.merge(self.current)
+        return merged
+
+
+class LiveStats:
+    """Rolling moderation statistics updated as each decision is made.
+
+    Every record updates the current tumbling window of each resolution
+    (1m, 1h, 1d), so reads cost the same however much history there is.
+    Memory is bounded: each resolution keeps a fixed number of closed
+    windows, and categories and matched terms go into fixed-size top-k
+    sketches.
+    """
+
+    def __init__(self, resolutions: Dict[str, tuple] = RESOLUTIONS, now: Optional[float] = None):
+        self.resolutions = {name: TumblingWindows(size, keep) for name, (size, keep) in resolutions.items()}
+        self.roll(now)
+
+    def roll(self, now: Optional[float]):
+        if now is None:
+            return
+        for windows in self.resolutions.values():
+            windows.roll(now)
+
+    def add(self, record: dict, timestamp: float):
+        for windows in self.resolutions.values():
+            windows.add(record, timestamp)
+
+    def stats(self, resolution: str, last: int = 0, now: Optional[float] = None, top: int = 10) -> dict:
+        """The current window of ``resolution``, merged with ``last`` closed windows"""
+        if resolution not in self.resolutions:
+            raise ValueError(f"Unknown resolution '{resolution}', expected one of: {', '.join(self.resolutions)}")
+        self.roll(now)
+        windows = self.resolutions[resolution]
+        if windows.current is None:
+            return WindowStats(0.0).summary(top)
+        summary = windows.combined(min(last, windows.closed.maxlen)).summary(top)
+        summary['end'] = windows.current.start + windows.size
+        return summary
+
+    def history(self, resolution: str, now: Optional[float] = None) -> List[dict]:
+        """Per-window totals for every window kept at ``resolution``, oldest first"""
+        self.roll(now)
+        windows = self.resolutions[resolution]
+        return [
+            {'start': window.start, 'total': window.total, 'needs_review': window.needs_review,
+             'avg_risk': window.risk_sum / window.total if window.total else 0.0}
+            for window in list(windows.closed) + ([windows.current] if windows.current else [])
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            name: {
+                'current': windows.current.to_dict() if windows.current else None,
+                'closed': [window.to_dict() for window in windows.closed]
+            }
+            for name, windows in self.resolutions.items()
+        }
+
+    def save(self, path: str, snapshot: Optional[dict] = None):
+        """Atomically write a snapshot (``to_dict()`` unless given) to ``path``"""
+        snapshot = self.to_dict() if snapshot is None else snapshot
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str, resolutions: Dict[str, tuple] = RESOLUTIONS, now: Optional[float] = None) -> "LiveStats":
+        """Restore from a snapshot; windows that have since closed are rolled forward"""
+        stats = cls(resolutions)
+        with open(path) as f:
+            snapshot = json.load(f)
+        for name, windows in stats.resolutions.items():
+            saved = snapshot.get(name)
+            if not saved:
+                continue
+            windows.closed.extend(WindowStats.from_dict(window) for window in saved['closed'])
+            if saved['current']:
+                windows.current = WindowStats.from_dict(saved['current'])
+        stats.roll(now)
+        return stats
@@ -0,0 +1,440 @@
+import bisect
+import json
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+
+# Right-closed risk buckets: bucket k holds scores in (k/10, (k+1)/10], bucket
+# 0 also holds 0. Counting thresholds with the same literals the risk
+# explanation uses keeps bucket edges consistent with its bands.
+RISK_THRESHOLDS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+RISK_BANDS = (('very_low', 0, 0), ('low', 1, 3), ('medium', 4, 6), ('high', 7, 9))
+
+# Latency is kept as log-scale buckets, four per doubling (about 19% wide),
+# so percentiles come from bucket counts instead of sorting raw values
+LATENCY_BUCKETS_PER_DOUBLING = 4
+
+SENTIMENTS = ('POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED')
+
+
+def risk_bucket(score: float) -> int:
+    return bisect.bisect_left(RISK_THRESHOLDS, score)
+
+
+def latency_bucket(latency_ms: Optional[float]) -> Optional[int]:
+    if latency_ms is None:
+        return None
+    return int(math.floor(math.log2(max(latency_ms, 1.0)) * LATENCY_BUCKETS_PER_DOUBLING))
+
+
+def latency_bucket_upper_ms(bucket: int) -> float:
+    return 2 ** ((bucket + 1) / LATENCY_BUCKETS_PER_DOUBLING)
+
+
+def parse_duration(value: str) -> float:
+    """'90s', '15m', '24h', '7d' -> seconds"""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    text = value.strip().lower()
+    try:
+        if text and text[-1] in units:
+            seconds = float(text[:-1]) * units[text[-1]]
+        else:
+            seconds = float(text)
+    except ValueError:
+        raise ValueError(f"Invalid duration '{value}', expected e.g. 15m, 24h or 7d")
+    if seconds <= 0:
+        raise ValueError(f"Duration must be positive, got '{value}'")
+    return seconds
+
+
+class ResultStore(ABC):
+    """Local, queryable copy of moderation results for analytics.
+
+    ``add`` must not block the caller. Queries aggregate results with
+    ``start <= timestamp < end`` (epoch seconds) and are synchronous; the
+    service runs them off the event loop.
+    """
+
+    @abstractmethod
+    def add(self, record: dict, timestamp: float, latency_ms: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def summary(self, start: float, end: float) -> dict:
+        ...
+
+    @abstractmethod
+    def risk_histogram(self, start: float, end: float) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def timeseries(self, start: float, end: float, interval: float) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def recent(self, limit: int = 50, needs_review: Optional[bool] = None, sentiment: Optional[str] = None,
+               min_risk: Optional[float] = None) -> List[dict]:
+        ...
+
+    @abstractmethod
+    def lookup(self, analysis_ids: List[str]) -> Dict[str, dict]:
+        ...
+
+    def close(self):
+        pass
+
+
+class NullResultStore(ResultStore):
+    """Keeps nothing; every query is empty"""
+
+    def add(self, record, timestamp, latency_ms=None):
+        pass
+
+    def summary(self, start, end):
+        return summarize([], [])
+
+    def risk_histogram(self, start, end):
+        return histogram([])
+
+    def timeseries(self, start, end, interval):
+        return []
+
+    def recent(self, limit=50, needs_review=None, sentiment=None, min_risk=None):
+        return []
+
+    def lookup(self, analysis_ids):
+        return {}
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    analysis_id TEXT PRIMARY KEY,
+    ts REAL NOT NULL,
+    risk_score REAL NOT NULL,
+    risk_bucket INTEGER NOT NULL,
+    needs_review INTEGER NOT NULL,
+    sentiment TEXT NOT NULL,
+    moderation_flagged INTEGER NOT NULL,
+    latency_ms REAL,
+    latency_bucket INTEGER,
+    record TEXT NOT NULL
+);
+-- Covers the aggregate queries, so window scans never touch the table
+CREATE INDEX IF NOT EXISTS idx_results_ts
+    ON results (ts, needs_review, risk_bucket, sentiment, latency_bucket, risk_score);
+CREATE INDEX IF NOT EXISTS idx_results_review_ts ON results (needs_review, ts);
+CREATE INDEX IF NOT EXISTS idx_results_bucket_ts ON results (risk_bucket, ts);
+CREATE INDEX IF NOT EXISTS idx_results_sentiment_ts ON results (sentiment, ts);
+
+-- Per-hour rollups maintained on insert; windows read whole hours from
+-- here and only their partial edge hours from results. Latency is rolled
+-- up separately so neither table multiplies the other's groups.
+CREATE TABLE IF NOT EXISTS hourly (
+    hour INTEGER NOT NULL,
+    needs_review INTEGER NOT NULL,
+    risk_bucket INTEGER NOT NULL,
+    sentiment TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    risk_sum REAL NOT NULL,
+    PRIMARY KEY (hour, needs_review, risk_bucket, sentiment)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS hourly_latency (
+    hour INTEGER NOT NULL,
+    latency_bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, latency_bucket)
+) WITHOUT ROWID;
+"""
+
+GROUP_SQL = ("SELECT {slot}, needs_review, risk_bucket, sentiment, {count}, {risk_sum} FROM {table} "
+             "WHERE {time} >= ? AND {time} < ? GROUP BY 1, 2, 3, 4")
+LATENCY_SQL = ("SELECT {slot}, latency_bucket, {count} FROM {table} "
+               "WHERE {time} >= ? AND {time} < ? AND latency_bucket IS NOT NULL GROUP BY 1, 2")
+RAW = {'table': 'results', 'time': 'ts', 'count': 'COUNT(*)', 'risk_sum': 'SUM(risk_score)'}
+
+
+class SQLiteResultStore(ResultStore):
+    """ResultStore on an embedded SQLite database in WAL mode.
+
+    Inserts go through a queue to one writer thread that commits them in
+    batches (and updates the hourly rollup in the same transaction), so
+    ``add`` never waits on disk. Readers use their own per-thread
+    connections and, thanks to WAL, never block on the writer.
+    """
+
+    def __init__(self, path: str, batch_size: int = 500, flush_interval: float = 0.2):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+
+        connection = self._connect()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.executescript(SCHEMA)
+        connection.commit()
+
+        self._queue = queue.SimpleQueue()
+        self._writer = threading.Thread(target=self._run, name="result-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = self._local.connection = self._connect()
+        return connection
+
+    # Writes
+
+    def add(self, record, timestamp, latency_ms=None):
+        self._queue.put((record, timestamp, latency_ms))
+
+    def write(self, entries: list):
+        """Insert (record, timestamp, latency_ms) entries in one transaction on the calling thread"""
+        connection = self._reader()
+        with connection:
+            self._insert(connection, entries)
+
+    def _insert(self, connection: sqlite3.Connection, entries: list):
+        groups, latencies = {}, {}
+        for record, timestamp, latency_ms in entries:
+            row = self._row(record, timestamp, latency_ms)
+            # Duplicates (a retried analysis_id) are ignored and not counted twice
+            if not connection.execute("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                      row).rowcount:
+                continue
+            _, ts, score, bucket, review, sentiment, _, _, lat_bucket, _ = row
+            hour = int(ts // 3600)
+            group = groups.setdefault((hour, review, bucket, sentiment), [0, 0.0])
+            group[0] += 1
+            group[1] += score
+            if lat_bucket is not None:
+                latencies[hour, lat_bucket] = latencies.get((hour, lat_bucket), 0) + 1
+        connection.executemany(
+            "INSERT INTO hourly VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (hour, needs_review, risk_bucket, sentiment) "
+            "DO UPDATE SET count = count + excluded.count, risk_sum = risk_sum + excluded.risk_sum",
+            [key + tuple(value) for key, value in groups.items()]
+        )
+        connection.executemany(
+            "INSERT INTO hourly_latency VALUES (?, ?, ?) ON CONFLICT (hour, latency_bucket) "
+            "DO UPDATE SET count = count + excluded.count",
+            [key + (count,) for key, count in latencies.items()]
+        )
+
+    @staticmethod
+    def _row(record: dict, timestamp: float, latency_ms: Optional[float]) -> tuple:
+        score = float(record['risk_score'])
+        return (
+            record['analysis_id'], timestamp, score, risk_bucket(score), int(bool(record['needs_review'])),
+            record.get('text_sentiment') or 'UNKNOWN', int(bool(record.get('moderation_flagged'))),
+            latency_ms, latency_bucket(latency_ms), json.dumps(record, default=str)
+        )
+
+    def _run(self):
+        connection = self._connect()
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                return
+            entries = [entry]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(entries) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    stop = True
+                    break
+                entries.append(entry)
+            try:
+                with connection:
+                    self._insert(connection, entries)
+            except Exception as e:
+                print(f"❌ Result store: failed to write {len(entries)} results: {e}")
+            if stop:
+                return
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join()
+
+    # Queries
+
+    def _aggregate(self, start: float, end: float, interval: Optional[float] = None, latency: bool = True):
+        """Grouped counts for a window, as (groups, latencies).
+
+        ``groups`` rows are (slot, needs_review, risk_bucket, sentiment,
+        count, risk_sum) and ``latencies`` rows are (slot, latency_bucket,
+        count), where ``slot`` is the index of the ``interval``-long bucket
+        since ``start`` (always 0 without an interval). Whole hours come
+        from the rollups when they map onto whole slots; the rest is read
+        from the covering timestamp index.
+        """
+        connection = self._reader()
+
+        def slot(column):
+            if interval is None:
+                return "0"
+            return f"CAST(({column} - {float(start)!r}) / {float(interval)!r} AS INTEGER)"
+
+        def query(sql, params, **names):
+            return connection.execute(sql.format(**names), params).fetchall()
+
+        first_hour = math.ceil(start / 3600)
+        last_hour = math.floor(end / 3600)
+        use_rollup = last_hour > first_hour and (
+            interval is None or (interval % 3600 == 0 and (first_hour * 3600 - start) % interval == 0)
+        )
+        ranges = [(start, first_hour * 3600), (last_hour * 3600, end)] if use_rollup else [(start, end)]
+
+        groups, latencies = [], []
+        for low, high in ranges:
+            groups += query(GROUP_SQL, (low, high), slot=slot("ts"), **RAW)
+            if latency:
+                latencies += query(LATENCY_SQL, (low, high), slot=slot("ts"), **RAW)
+        if use_rollup:
+            hours = (first_hour, last_hour)
+            groups += query(GROUP_SQL, hours, slot=slot("hour * 3600"), table="hourly", time="hour",
+                            count="SUM(count)", risk_sum="SUM(risk_sum)")
+            if latency:
+                latencies += query(LATENCY_SQL, hours, slot=slot("hour * 3600"), table="hourly_latency",
+                                   time="hour", count="SUM(count)")
+        return groups, latencies
+
+    def summary(self, start, end):
+        return summarize(*self._aggregate(start, end))
+
+    def risk_histogram(self, start, end):
+        return histogram(self._aggregate(start, end, latency=False)[0])
+
+    def timeseries(self, start, end, interval):
+        groups, latencies = self._aggregate(start, end, interval)
+        slots = {}
+        for row in groups:
+            slots.setdefault(row[0], ([], []))[0].append(row)
+        for row in latencies:
+            slots.setdefault(row[0], ([], []))[1].append(row)
+        return [
+            {'start': start + slot * interval, **summarize(*rows, detail=False)}
+            for slot, rows in sorted(slots.items())
+        ]
+
+    def recent(self, limit=50, needs_review=None, sentiment=None, min_risk=None):
+        clauses, params = [], []
+        if needs_review is not None:
+            clauses.append("needs_review = ?")
+            params.append(int(needs_review))
+        if sentiment is not None:
+            clauses.append("sentiment = ?")
+            params.append(sentiment)
+        if min_risk is not None:
+            clauses.append("risk_score >= ?")
+            params.append(min_risk)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        rows = self._reader().execute(
+            f"SELECT ts, latency_ms, record FROM results {where}ORDER BY ts DESC LIMIT ?", params + [limit]
+        ).fetchall()
+        return [{**json.loads(record), 'stored_at': ts, 'latency_ms': latency} for ts, latency, record in rows]
+
+    def lookup(self, analysis_ids):
+        connection = self._reader()
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for i in range(0, len(analysis_ids), 500):
+            chunk = analysis_ids[i:i + 500]
+            rows = connection.execute(
+                f"SELECT ts, latency_ms, record FROM results WHERE analysis_id IN ({', '.join('?' * len(chunk))})",
+                chunk
+            )
+            for ts, latency, record in rows:
+                record = json.loads(record)
+                found[record['analysis_id']] = {**record, 'stored_at': ts, 'latency_ms': latency}
+        return found
+
+
+def percentile(latency_counts: dict, fraction: float) -> Optional[float]:
+    total = sum(latency_counts.values())
+    if not total:
+        return None
+    rank = fraction * total
+    seen = 0
+    for bucket in sorted(latency_counts):
+        seen += latency_counts[bucket]
+        if seen >= rank:
+            return round(latency_bucket_upper_ms(bucket), 1)
+
+
+def summarize(groups: list, latencies: list, detail: bool = True) -> dict:
+    """Totals, review rate, average risk and latency percentiles from _aggregate rows"""
+    total = flagged = 0
+    risk_sum = 0.0
+    sentiments = {}
+    bands = {name: 0 for name, _, _ in RISK_BANDS}
+    for _, review, bucket, sentiment, count, bucket_risk in groups:
+        total += count
+        flagged += count if review else 0
+        risk_sum += bucket_risk
+        sentiments[sentiment] = sentiments.get(sentiment, 0) + count
+        for name, low, high in RISK_BANDS:
+            if low <= bucket <= high:
+                bands[name] += count
+    latency = {}
+    for _, lat_bucket, count in latencies:
+        latency[lat_bucket] = latency.get(lat_bucket, 0) + count
+
+    result = {
+        'total': total,
+        'needs_review': flagged,
+        'review_rate': flagged / total if total else 0.0,
+        'avg_risk': risk_sum / total if total else 0.0,
+        'latency_ms': {'p50': percentile(latency, 0.5), 'p95': percentile(latency, 0.95),
+                       'p99': percentile(latency, 0.99)}
+    }
+    if detail:
+        result['risk_bands'] = bands
+        result['sentiments'] = sentiments
+    return result
+
+
+def histogram(groups: list) -> List[dict]:
+    counts = [0] * (len(RISK_THRESHOLDS) + 1)
+    for _, _, bucket, _, count, _ in groups:
+        counts[bucket] += count
+    return [
+        {'bucket': k, 'min': 0.0 if k == 0 else RISK_THRESHOLDS[k - 1],
+         'max': RISK_THRESHOLDS[k] if k < len(RISK_THRESHOLDS) else 1.0, 'count': count}
+        for k, count in enumerate(counts)
+    ]
+
+
+STORES = {
+    'sqlite': SQLiteResultStore,
+    'none': NullResultStore,
+}
+
+
+def open_result_store(url: str) -> ResultStore:
+    """``sqlite:///relative/path.db``, ``sqlite:////absolute/path.db`` or ``none``"""
+    scheme, _, location = url.partition('://')
+    if scheme not in STORES:
+        raise ValueError(f"Unknown result store '{scheme}', expected one of: {', '.join(STORES)}")
+    if scheme == 'sqlite':
+        return SQLiteResultStore(location[1:] if location.startswith('/') else location)
+    return STORES[scheme]()
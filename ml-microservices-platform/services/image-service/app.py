@@ -1,17 +1,31 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
+from typing import Optional
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+import asyncio
 import base64
-from io import BytesIO
-from PIL import Image
+import hashlib
+import os
 import time
+from concurrent.futures import ThreadPoolExecutor
 from prometheus_client import Counter, Histogram, generate_latest
-
-app = FastAPI(title="Image Analysis Service")
+from crossmodal.concurrency import BoundedExecutor, Overloaded
+from crossmodal.cache import ResultCache
+from crossmodal.uploads import UPLOAD_MAX_BYTES, BodyTooLarge, read_limited
+from preprocessing import REKOGNITION_MAX_BYTES, normalize_image, perceptual_hash
+from near_duplicates import NearDuplicateIndex
 
 
 IMAGE_REQUEST_COUNT = Counter('image_requests_total', 'Total image analysis requests')
 IMAGE_PROCESSING_TIME = Histogram('image_processing_seconds', 'Image processing time')
+IMAGE_THROTTLED_COUNT = Counter('image_throttled_total', 'Image requests rejected because the AWS concurrency limit was reached')
+IMAGE_PREPROCESS_TIME = Histogram('image_preprocess_seconds', 'Time to downscale and re-encode an upload')
+IMAGE_BYTES = Histogram('image_bytes', 'Image sizes as uploaded and as sent to Rekognition', ['stage'],
+                        buckets=(16e3, 64e3, 256e3, 512e3, 1e6, 2e6, 5e6, 10e6, 25e6))
+NEAR_DUPLICATE_LOOKUPS = Counter('image_near_duplicate_lookups_total', 'Exact-cache misses checked against the perceptual hash index, by outcome', ['outcome'])
 
 class ImageRequest(BaseModel):
     image_data: str  
@@ -20,15 +34,88 @@ class ImageResponse(BaseModel):
     categories: list
     moderation_flagged: bool
     moderation_labels: list
+    image_ref: dict
     processing_time: float
+    # Set when the labels were reused from a perceptually similar earlier image
+    near_duplicate_distance: Optional[int] = None
+
+
+AWS_MAX_CONCURRENCY = int(os.getenv("AWS_MAX_CONCURRENCY", "16"))
+AWS_RETRY_AFTER_SECONDS = int(os.getenv("AWS_RETRY_AFTER_SECONDS", "1"))
+
+# detect_labels and detect_moderation_labels run side by side for each request
+aws_executor = BoundedExecutor(AWS_MAX_CONCURRENCY, calls_per_request=2, retry_after=AWS_RETRY_AFTER_SECONDS, name="rekognition")
+
+rekognition = boto3.client(
+    'rekognition',
+    region_name='us-east-1',
+    config=Config(max_pool_connections=aws_executor.max_workers)
+)
+
+# Rekognition errors about the image itself; anything else it raises means
+# Rekognition failed, which is answered with a 502 so callers can tell an
+# outage from a bad upload
+REKOGNITION_INPUT_ERRORS = {'InvalidImageFormatException', 'ImageTooLargeException', 'InvalidParameterException'}
+
+class RekognitionFailed(Exception):
+    """Rekognition failed, rather than rejecting the image"""
+
+# Uploads are downscaled to IMAGE_MAX_DIMENSION pixels on the long side and
+# re-encoded as JPEG before they go to Rekognition, see preprocessing.py.
+# Pillow releases the GIL while decoding, resizing and encoding, so a
+# thread pool keeps that work off the event loop and runs it in parallel
+IMAGE_PREPROCESS_ENABLED = os.getenv("IMAGE_PREPROCESS", "true").lower() == "true"
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1280"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_PREPROCESS_WORKERS = int(os.getenv("IMAGE_PREPROCESS_WORKERS", str(os.cpu_count() or 1)))
 
+preprocess_executor = ThreadPoolExecutor(max_workers=IMAGE_PREPROCESS_WORKERS, thread_name_prefix="preprocess")
 
-rekognition = boto3.client('rekognition', region_name='us-east-1')
+# Results keyed by the SHA-256 of the decoded upload, so a cache hit skips preprocessing too
+result_cache = ResultCache.from_env("image")
 
-def analyze_image(image_bytes):
-    """EXACT COPY FROM MY LAMBDA - Image analysis logic"""
-    labels = rekognition.detect_labels(Image={'Bytes': image_bytes}, MaxLabels=10, MinConfidence=60)
-    moderation = rekognition.detect_moderation_labels(Image={'Bytes': image_bytes}, MinConfidence=50)
+# Re-encoded, resized or captioned reposts miss the exact cache; their
+# results are found by the dhash of the image instead, within
+# IMAGE_NEAR_DUPLICATE_DISTANCE bits, see near_duplicates.py. The index is
+# memory-mapped from IMAGE_INDEX_DIR, opened at startup; an empty value turns it off
+IMAGE_INDEX_DIR = os.getenv("IMAGE_INDEX_DIR", "data/image-index")
+IMAGE_NEAR_DUPLICATE_DISTANCE = int(os.getenv("IMAGE_NEAR_DUPLICATE_DISTANCE", "6"))
+near_duplicates = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global near_duplicates
+    if IMAGE_INDEX_DIR:
+        try:
+            # Opening may rebuild the lookup tables, so it runs off the event loop
+            near_duplicates = await asyncio.get_running_loop().run_in_executor(None, NearDuplicateIndex, IMAGE_INDEX_DIR)
+            print(f"✅ Near-duplicate index loaded: {len(near_duplicates)} images")
+        except Exception as e:
+            print(f"❌ Near-duplicate index {IMAGE_INDEX_DIR} unavailable, lookups disabled: {e}")
+    yield
+    aws_executor.shutdown()
+    preprocess_executor.shutdown(wait=True)
+    await result_cache.close()
+    if near_duplicates is not None:
+        near_duplicates.close()
+        near_duplicates = None
+
+app = FastAPI(title="Image Analysis Service", lifespan=lifespan)
+
+async def analyze_image(image_bytes):
+    """Image analysis logic from my Lambda, with both Rekognition calls run concurrently off the event loop"""
+    with aws_executor.admit():
+        try:
+            labels, moderation = await asyncio.gather(
+                aws_executor.run(rekognition.detect_labels, Image={'Bytes': image_bytes}, MaxLabels=10, MinConfidence=60),
+                aws_executor.run(rekognition.detect_moderation_labels, Image={'Bytes': image_bytes}, MinConfidence=50)
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in REKOGNITION_INPUT_ERRORS:
+                raise
+            raise RekognitionFailed(str(e)) from e
+        except Exception as e:
+            raise RekognitionFailed(str(e)) from e
     
     return {
         'categories': [label['Name'] for label in labels['Labels']],
@@ -36,6 +123,13 @@ def analyze_image(image_bytes):
         'moderation_labels': [label['Name'] for label in moderation['ModerationLabels']]
     }
 
+def image_reference(image_bytes: bytes) -> dict:
+    """Compact stand-in for the image that later pipeline stages carry instead of the bytes"""
+    return {
+        'sha256': hashlib.sha256(image_bytes).hexdigest(),
+        'size_bytes': len(image_bytes)
+    }
+
 def preprocess_image(image_data: str):
     """EXACT COPY FROM MY LAMBDA - Image preprocessing"""
     missing_padding = len(image_data) % 4
@@ -45,16 +139,61 @@ def preprocess_image(image_data: str):
     image_bytes = base64.b64decode(image_data)
     return image_bytes
 
-@app.post("/analyze")
-async def analyze_image_endpoint(request: ImageRequest):
+def decode_upload(image_data: str):
+    """The upload's bytes and reference; hashing several MB is worth keeping off the event loop too"""
+    image_bytes = preprocess_image(image_data)
+    return image_bytes, image_reference(image_bytes)
+
+def rekognition_bytes(image_bytes: bytes):
+    """What is sent to Rekognition (the normalized JPEG, or the upload as is with preprocessing off) and the image's dhash"""
+    IMAGE_BYTES.labels(stage='uploaded').observe(len(image_bytes))
+    image_hash = None
+    if IMAGE_PREPROCESS_ENABLED:
+        with IMAGE_PREPROCESS_TIME.time():
+            image_bytes, info = normalize_image(image_bytes, IMAGE_MAX_DIMENSION, IMAGE_JPEG_QUALITY)
+        image_hash = info['dhash']
+    elif near_duplicates is not None:
+        image_hash = perceptual_hash(image_bytes)
+    if len(image_bytes) > REKOGNITION_MAX_BYTES:
+        raise ValueError(f"Image of {len(image_bytes)} bytes exceeds Rekognition's {REKOGNITION_MAX_BYTES} byte limit")
+    IMAGE_BYTES.labels(stage='sent').observe(len(image_bytes))
+    return image_bytes, image_hash
+
+async def analyze_new_image(image_bytes: bytes):
+    """Labels for an image not in the exact cache: from a near-duplicate if there is one, else from Rekognition.
+
+    Returns the result and the near-duplicate's distance (None when Rekognition was called).
+    """
+    loop = asyncio.get_running_loop()
+    sent_bytes, image_hash = await loop.run_in_executor(preprocess_executor, rekognition_bytes, image_bytes)
+    if near_duplicates is None:
+        return await analyze_image(sent_bytes), None
+    
+    match = await loop.run_in_executor(preprocess_executor, near_duplicates.nearest, image_hash, IMAGE_NEAR_DUPLICATE_DISTANCE)
+    if match is not None:
+        NEAR_DUPLICATE_LOOKUPS.labels(outcome='reused').inc()
+        return match
+    
+    NEAR_DUPLICATE_LOOKUPS.labels(outcome='new').inc()
+    image_result = await analyze_image(sent_bytes)
+    await loop.run_in_executor(preprocess_executor, near_duplicates.add, image_hash, image_result)
+    return image_result, None
+
+async def analyze_upload(load_image):
+    """Analyse one upload; ``load_image`` is awaited for the image bytes and their reference"""
     start_time = time.time()
     IMAGE_REQUEST_COUNT.inc()
     
     try:
         with IMAGE_PROCESSING_TIME.time():
             
-            image_bytes = preprocess_image(request.image_data)
-            image_result = analyze_image(image_bytes)
+            image_bytes, image_ref = await load_image()
+            
+            image_result = await result_cache.get(image_ref['sha256'])
+            distance = None
+            if image_result is None:
+                image_result, distance = await analyze_new_image(image_bytes)
+                await result_cache.set(image_ref['sha256'], image_result)
             
             processing_time = time.time() - start_time
             
@@ -62,15 +201,44 @@ async def analyze_image_endpoint(request: ImageRequest):
                 categories=image_result['categories'],
                 moderation_flagged=image_result['moderation_flagged'],
                 moderation_labels=image_result['moderation_labels'],
-                processing_time=processing_time
+                image_ref=image_ref,
+                processing_time=processing_time,
+                near_duplicate_distance=distance
             )
             
+    except BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Overloaded as e:
+        IMAGE_THROTTLED_COUNT.inc()
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except RekognitionFailed as e:
+        raise HTTPException(status_code=502, detail=f"Image processing failed: {str(e)}")
     except Exception as e:
         return {"error": f"Image processing failed: {str(e)}"}
 
+@app.post("/analyze")
+async def analyze_image_endpoint(request: ImageRequest):
+    loop = asyncio.get_running_loop()
+    return await analyze_upload(lambda: loop.run_in_executor(preprocess_executor, decode_upload, request.image_data))
+
+@app.post("/analyze/raw")
+async def analyze_raw_image_endpoint(request: Request):
+    """The image as the request body (application/octet-stream): no base64 to inflate, encode or decode"""
+    loop = asyncio.get_running_loop()
+    
+    async def load_image():
+        image_bytes = await read_limited(request.stream(), UPLOAD_MAX_BYTES)
+        return image_bytes, await loop.run_in_executor(preprocess_executor, image_reference, image_bytes)
+    
+    return await analyze_upload(load_image)
+
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "image-analysis"}
+    return {
+        "status": "healthy",
+        "service": "image-analysis",
+        "near_duplicate_index": near_duplicates.stats() if near_duplicates is not None else None
+    }
 
 @app.get("/metrics")
 async def metrics():
@@ -0,0 +1,194 @@
+import json
+import os
+import threading
+from functools import lru_cache
+from itertools import combinations
+from typing import Optional, Tuple
+import numpy as np
+
+
+# Multi-index hashing: each 64-bit hash is split into CHUNKS 16-bit
+# substrings. Two hashes within distance r differ by at most r // CHUNKS
+# bits in at least one substring, so only the buckets that close to the
+# query's substrings need their entries checked
+CHUNKS = 4
+CHUNK_BITS = 64 // CHUNKS
+
+MAGIC = b'CMPHIX01'
+HEADER = np.dtype([('magic', 'S8'), ('count', '<u8')])
+ENTRY = np.dtype([('hash', '<u8'), ('offset', '<u8'), ('length', '<u4'), ('reserved', '<u4')])
+INITIAL_CAPACITY = 4096
+
+
+
+def hamming(hashes: np.ndarray, value: int) -> np.ndarray:
+    """Bits differing from ``value`` for each hash (SWAR popcount; numpy < 2 has no bitwise_count)"""
+    x = hashes ^ np.uint64(value)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0f0f0f0f0f0f0f0f)
+    return (x * np.uint64(0x0101010101010101)) >> np.uint64(56)
+
+
+def chunk_keys(hashes: np.ndarray) -> np.ndarray:
+    """(CHUNKS, n) uint16 substrings of each hash, lowest bits first"""
+    mask = np.uint64((1 << CHUNK_BITS) - 1)
+    return np.stack([(hashes >> np.uint64(CHUNK_BITS * j)) & mask for j in range(CHUNKS)]).astype(np.uint16)
+
+
+@lru_cache(maxsize=None)
+def flip_masks(radius: int) -> np.ndarray:
+    """XOR masks taking a substring to every value within ``radius`` bits of it"""
+    masks = [sum(1 << bit for bit in bits)
+             for flips in range(radius + 1) for bits in combinations(range(CHUNK_BITS), flips)]
+    return np.array(masks, dtype=np.uint16)
+
+
+class NearDuplicateIndex:
+    """Perceptual hashes of analysed images and their results, searchable by Hamming distance.
+
+    Everything lives in ``directory`` as memory-mapped files, so a restart
+    opens the index instead of rebuilding it:
+
+    - ``entries.bin``: a count header and fixed-size (hash, result offset,
+      result length) records, appended in place
+    - ``results.bin``: the result JSON each record points at
+    - ``mih_keys.npy`` / ``mih_ids.npy``: per substring, the entries
+      sorted by that substring, for binary-searched bucket lookups
+
+    Entries added since the sorted tables were last built (the tail) are
+    scanned directly; once the tail outgrows ``max(min_tail, sorted / 8)``
+    the tables are rebuilt and atomically replaced. A record only counts
+    once its result is written, so a crash mid-add loses that add and
+    nothing else. One process writes the index.
+    """
+
+    def __init__(self, directory: str, min_tail: int = 4096):
+        self.directory = directory
+        self.min_tail = min_tail
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._entries_path = os.path.join(directory, 'entries.bin')
+        self._results_path = os.path.join(directory, 'results.bin')
+        self._keys_path = os.path.join(directory, 'mih_keys.npy')
+        self._ids_path = os.path.join(directory, 'mih_ids.npy')
+        if not os.path.exists(self._entries_path):
+            with open(self._entries_path, 'wb') as f:
+                f.write(np.array([(MAGIC, 0)], dtype=HEADER).tobytes())
+                f.truncate(HEADER.itemsize + INITIAL_CAPACITY * ENTRY.itemsize)
+        self._map_entries()
+        if self.header['magic'][0] != MAGIC:
+            raise ValueError(f"{self._entries_path} is not a near-duplicate index")
+        self._results = open(self._results_path, 'a+b')
+        # Bytes past the last counted record belong to an add that never finished
+        self._results_size = self._results_end()
+        self._results.truncate(self._results_size)
+        self._load_tables()
+
+    def __len__(self):
+        return int(self.header['count'][0])
+
+    def _map_entries(self):
+        capacity = (os.path.getsize(self._entries_path) - HEADER.itemsize) // ENTRY.itemsize
+        self.header = np.memmap(self._entries_path, dtype=HEADER, mode='r+', shape=(1,))
+        self.entries = np.memmap(self._entries_path, dtype=ENTRY, mode='r+', offset=HEADER.itemsize, shape=(capacity,))
+        # Plain ndarray views of the maps: slicing a memmap subclass costs more than the lookup itself
+        self.hashes = np.asarray(self.entries['hash'])
+
+    def _results_end(self) -> int:
+        if not len(self):
+            return 0
+        last = self.entries[len(self) - 1]
+        return int(last['offset']) + int(last['length'])
+
+    def _load_tables(self):
+        try:
+            keys = np.load(self._keys_path, mmap_mode='r')
+            ids = np.load(self._ids_path, mmap_mode='r')
+            if keys.shape != ids.shape or keys.shape[0] != CHUNKS or keys.shape[1] > len(self):
+                raise ValueError("tables don't match the entries")
+            self.keys, self.ids = np.asarray(keys), np.asarray(ids)
+        except (FileNotFoundError, ValueError) as e:
+            if len(self):
+                print(f"⚠️ Rebuilding near-duplicate tables: {e}")
+            self._build_tables()
+
+    def _build_tables(self):
+        hashes = np.array(self.hashes[:len(self)])
+        keys = chunk_keys(hashes)
+        order = np.argsort(keys, axis=1, kind='stable')
+        for path, array in ((self._keys_path, np.take_along_axis(keys, order, axis=1)),
+                            (self._ids_path, order.astype(np.uint32))):
+            temporary = f"{path}.tmp"
+            with open(temporary, 'wb') as f:
+                np.save(f, array)
+            os.replace(temporary, path)
+        self.keys = np.asarray(np.load(self._keys_path, mmap_mode='r'))
+        self.ids = np.asarray(np.load(self._ids_path, mmap_mode='r'))
+
+    @property
+    def sorted_count(self) -> int:
+        return self.keys.shape[1]
+
+    def nearest(self, value: int, max_distance: int) -> Optional[Tuple[dict, int]]:
+        """The stored result closest to ``value`` and its distance, if any is within ``max_distance``"""
+        with self._lock:
+            count = len(self)
+            if not count:
+                return None
+            radius = max_distance // CHUNKS
+            # An entry may turn up in several buckets; checking it twice is cheaper than deduplicating
+            candidates = [np.arange(self.sorted_count, count)]
+            for j, key in enumerate(chunk_keys(np.array([value], dtype=np.uint64))[:, 0]):
+                values = flip_masks(radius) ^ key
+                starts = np.searchsorted(self.keys[j], values, side='left')
+                ends = np.searchsorted(self.keys[j], values, side='right')
+                candidates.extend(self.ids[j, start:end] for start, end in zip(starts, ends) if end > start)
+            ids = np.concatenate(candidates)
+            if not len(ids):
+                return None
+            distances = hamming(self.hashes[ids], value)
+            best = int(np.argmin(distances))
+            if distances[best] > max_distance:
+                return None
+            entry = self.entries[ids[best]]
+            raw = os.pread(self._results.fileno(), int(entry['length']), int(entry['offset']))
+        return json.loads(raw), int(distances[best])
+
+    def add(self, value: int, result: dict):
+        raw = json.dumps(result, separators=(',', ':')).encode('utf-8')
+        with self._lock:
+            count = len(self)
+            if count == len(self.entries):
+                self._grow()
+            # Opened for appending, and trimmed to the counted records on open
+            self._results.write(raw)
+            self._results.flush()
+            self.entries[count] = (value, self._results_size, len(raw), 0)
+            self._results_size += len(raw)
+            self.header['count'] = count + 1
+            if count + 1 - self.sorted_count > max(self.min_tail, self.sorted_count // 8):
+                self._build_tables()
+
+    def _grow(self):
+        self.entries.flush()
+        capacity = len(self.entries) * 2
+        del self.entries, self.header
+        with open(self._entries_path, 'r+b') as f:
+            f.truncate(HEADER.itemsize + capacity * ENTRY.itemsize)
+        self._map_entries()
+
+    def flush(self):
+        with self._lock:
+            self.entries.flush()
+            self.header.flush()
+
+    def close(self):
+        """Flush and unmap everything; the index can't be used afterwards"""
+        self.flush()
+        self._results.close()
+        # The maps are released once nothing references them, views included
+        del self.header, self.entries, self.hashes, self.keys, self.ids
+
+    def stats(self) -> dict:
+        return {"entries": len(self), "sorted": self.sorted_count, "results_bytes": self._results_size}
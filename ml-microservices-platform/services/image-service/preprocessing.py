@@ -0,0 +1,103 @@
+from io import BytesIO
+from typing import Optional, Tuple
+from PIL import Image, ImageOps
+
+
+# Formats Pillow may open, by leading bytes: (format, prefix, (offset, marker) or None)
+SIGNATURES = (
+    ('JPEG', b'\xff\xd8\xff', None),
+    ('PNG', b'\x89PNG\r\n\x1a\n', None),
+    ('GIF', b'GIF87a', None),
+    ('GIF', b'GIF89a', None),
+    ('WEBP', b'RIFF', (8, b'WEBP')),
+    ('BMP', b'BM', None),
+    ('TIFF', b'II*\x00', None),
+    ('TIFF', b'MM\x00*', None),
+)
+
+# Rekognition rejects Image.Bytes payloads larger than this
+REKOGNITION_MAX_BYTES = 5 * 1024 * 1024
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """The image format named by the leading bytes, or None; nothing is decoded"""
+    for name, prefix, marker in SIGNATURES:
+        if data.startswith(prefix) and (marker is None or data[marker[0]:marker[0] + len(marker[1])] == marker[1]):
+            return name
+    return None
+
+
+def flatten(image: Image.Image) -> Image.Image:
+    """RGB or greyscale, with any transparency composited onto white"""
+    if image.mode in ('RGB', 'L'):
+        return image
+    if image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info:
+        rgba = image.convert('RGBA')
+        background = Image.new('RGB', rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def dhash(image: Image.Image) -> int:
+    """64-bit difference hash: whether each pixel of a 9x8 greyscale thumbnail is brighter than its right neighbour.
+
+    Survives re-encoding, resizing and small crops or overlays with only a
+    few bits changed, so near-duplicates are a short Hamming distance apart.
+    """
+    pixels = list(image.convert('L').resize((9, 8), Image.Resampling.BOX).getdata())
+    value = 0
+    for row in range(8):
+        for column in range(8):
+            value = (value << 1) | (pixels[row * 9 + column] > pixels[row * 9 + column + 1])
+    return value
+
+
+def perceptual_hash(data: bytes) -> int:
+    """dhash of an upload, decoded at the smallest scale the format allows"""
+    source_format = sniff_format(data)
+    if source_format is None:
+        raise ValueError("Unsupported image format")
+    with Image.open(BytesIO(data), formats=[source_format]) as image:
+        if source_format == 'JPEG':
+            image.draft('RGB', (64, 64))
+        image.thumbnail((256, 256), Image.Resampling.BICUBIC, reducing_gap=1.0)
+        return dhash(flatten(ImageOps.exif_transpose(image)))
+
+
+def normalize_image(data: bytes, max_dimension: int = 1280, quality: int = 85) -> Tuple[bytes, dict]:
+    """Downscale an upload and re-encode it as a metadata-free JPEG for Rekognition.
+
+    The format is sniffed first and Pillow only tries that decoder. JPEGs
+    are decoded at a reduced DCT scale (``draft``) so a 12 MP photo never
+    materialises at full size; other formats are shrunk with ``reduce``
+    (box averaging by an integer factor) before the final resample.
+    EXIF orientation is applied to the pixels, then EXIF, ICC and comments
+    are left behind. Returns the JPEG bytes and what was done, including
+    the downscaled image's dhash.
+    """
+    source_format = sniff_format(data)
+    if source_format is None:
+        raise ValueError("Unsupported image format")
+    with Image.open(BytesIO(data), formats=[source_format]) as image:
+        original_size = image.size
+        if source_format == 'JPEG':
+            image.draft('RGB', (max_dimension, max_dimension))
+        # thumbnail() keeps the aspect ratio; reducing_gap=1.0 has it reduce()
+        # by the whole integer factor first, leaving bicubic a < 2x resample.
+        # Softer than Lanczos from the full image, but labels don't notice
+        # and a 4K screenshot shrinks in a tenth of the time
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.BICUBIC, reducing_gap=1.0)
+        image = flatten(ImageOps.exif_transpose(image))
+        output = BytesIO()
+        image.save(output, 'JPEG', quality=quality)
+        image_hash = dhash(image)
+    normalized = output.getvalue()
+    return normalized, {
+        'source_format': source_format,
+        'original_size': list(original_size),
+        'sent_size': list(image.size),
+        'original_bytes': len(data),
+        'sent_bytes': len(normalized),
+        'dhash': image_hash
+    }
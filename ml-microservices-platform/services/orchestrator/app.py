@@ -1,24 +1,60 @@
-from fastapi import FastAPI, HTTPException
-import aiohttp
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from starlette.datastructures import MutableHeaders, UploadFile
+from starlette.formparsers import FormParser, MultiPartException, MultiPartParser
+from contextlib import asynccontextmanager
 import asyncio
-from pydantic import BaseModel
+import json
+import os
+from pydantic import BaseModel, ValidationError
+from typing import List, NamedTuple, Optional, Union
 import time
 import uuid
 from prometheus_client import Counter, Histogram, generate_latest, REGISTRY
-
-app = FastAPI(title="Cross-Modal Orchestrator")
+from crossmodal.uploads import UPLOAD_MAX_BYTES, BodyTooLarge, limited, read_limited
+from http_clients import CircuitOpen, DownstreamError, ServiceClients, StageTimeout
+from local_stages import load_local_stages
+from streaming import DuplexStreamingResponse, analyze_stream, iter_lines, to_ndjson
 
 
 REQUEST_COUNT = Counter('requests_total', 'Total requests', ['method', 'endpoint', 'status'])
 REQUEST_DURATION = Histogram('request_duration_seconds', 'Request duration')
 PREDICTION_LATENCY = Histogram('prediction_latency_seconds', 'Prediction latency')
 MODEL_INFERENCE_TIME = Histogram('model_inference_seconds', 'Model inference time', ['model_type'])
+BATCH_SIZE = Histogram('batch_items', 'Items per batch analysis request', buckets=(1, 10, 50, 100, 250, 500, 1000))
+BATCH_ITEM_ERRORS = Counter('batch_item_errors_total', 'Batch items that failed', ['stage'])
+EARLY_DECISIONS = Counter('early_decisions_total', 'Analyses answered before the image result, by decision', ['decision'])
+STAGES_SKIPPED = Counter('stages_skipped_total', 'Analyses answered without a stage, by stage', ['stage'])
+EARLY_COMPLETIONS = Counter('early_completions_total', 'Background completions of early decisions, by outcome', ['outcome'])
 
 class AnalysisRequest(BaseModel):
     image_data: str
     text_content: str
     context: dict = {}
 
+class Upload(NamedTuple):
+    """One /analyze item as received: the image is base64 from JSON, raw bytes from a form or octet-stream body, or None"""
+    image: Union[str, bytes, None]
+    text_content: str
+    context: dict
+
+# /analyze reads its own body, so its accepted forms are declared here for the docs
+ANALYZE_REQUEST_BODY = {
+    "required": True,
+    "content": {
+        "application/json": {"schema": AnalysisRequest.model_json_schema()},
+        "multipart/form-data": {"schema": {"type": "object", "required": ["text"], "properties": {
+            "text": {"type": "string", "description": "Also accepted as text_content"},
+            "image": {"type": "string", "format": "binary"},
+            "context": {"type": "string", "description": "JSON object"}
+        }}},
+        "application/octet-stream": {
+            "schema": {"type": "string", "format": "binary"},
+            "description": "The image; text (or text_content) and context go in the query string"
+        }
+    }
+}
+
 class AnalysisResponse(BaseModel):
     prediction_id: str
     risk_score: float
@@ -26,89 +62,535 @@ class AnalysisResponse(BaseModel):
     flags: list
     components_used: list
     processing_time: float
-    model_version: str = "1.0.0"
+    # Version of the risk rules that scored this item, as reported by risk-service
+    model_version: str = "unknown"
     feedback_endpoint: str = "/v1/feedback"
+    needs_review: Optional[bool] = None
+    # Decided from text and context before the image result; risk_score is
+    # then the bound on the decided side (the lowest possible score when
+    # sent for review, the highest when not). The result stored under the
+    # same prediction_id keeps that score, with the full pipeline's next to
+    # it once the image arrives
+    early_decision: bool = False
+
+class BatchAnalysisRequest(BaseModel):
+    items: List[AnalysisRequest]
+
+class BatchItemResult(BaseModel):
+    index: int
+    result: Optional[AnalysisResponse] = None
+    error: Optional[str] = None
+
+class BatchAnalysisResponse(BaseModel):
+    results: List[BatchItemResult]
+    processing_time: float
 
 
 SERVICES = {
-    "image": "http://image-service:8001",
-    "text": "http://text-service:8002",
-    "context": "http://context-service:8003",
-    "risk": "http://risk-service:8004",
-    "fusion": "http://fusion-service:8005",
-    "feedback": "http://feedback-service:8006"
+    "image": os.getenv("IMAGE_SERVICE_URL", "http://image-service:8001"),
+    "text": os.getenv("TEXT_SERVICE_URL", "http://text-service:8002"),
+    "context": os.getenv("CONTEXT_SERVICE_URL", "http://context-service:8003"),
+    "risk": os.getenv("RISK_SERVICE_URL", "http://risk-service:8004"),
+    "fusion": os.getenv("FUSION_SERVICE_URL", "http://fusion-service:8005"),
+    "feedback": os.getenv("FEEDBACK_SERVICE_URL", "http://feedback-service:8006")
 }
 
-@app.middleware("http")
-async def monitor_requests(request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    duration = time.time() - start_time
-    
-    REQUEST_DURATION.observe(duration)
-    REQUEST_COUNT.labels(
-        method=request.method,
-        endpoint=request.url.path,
-        status=response.status_code
-    ).inc()
+# Total per-call budget (seconds) for each pipeline stage, hedge included
+STAGE_TIMEOUTS = {
+    "image": float(os.getenv("IMAGE_SERVICE_TIMEOUT", "5")),
+    "text": float(os.getenv("TEXT_SERVICE_TIMEOUT", "3")),
+    "context": float(os.getenv("CONTEXT_SERVICE_TIMEOUT", "2")),
+    "risk": float(os.getenv("RISK_SERVICE_TIMEOUT", "2")),
+    "fusion": float(os.getenv("FUSION_SERVICE_TIMEOUT", "5")),
+    "feedback": float(os.getenv("FEEDBACK_SERVICE_TIMEOUT", "5"))
+}
+
+# Image/text calls in flight at once per batch request, and the largest batch accepted
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "16"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+
+COMPONENTS = ["image", "text", "context", "risk", "fusion"]
+
+# Stand-ins for an analysis stage that didn't answer: it adds no evidence
+# either way. Risk takes no context analysis at all, so none is needed there
+MISSING_ANALYSIS = {
+    "image": {"categories": [], "moderation_flagged": False, "moderation_labels": []},
+    "text": {"sentiment": "NEUTRAL", "unsafe_found": []}
+}
+# Share of the confidence each analysis stage carries; stages that were
+# called but skipped take theirs away, ones never called (context when the
+# request has none) don't
+BASE_CONFIDENCE = 0.8
+STAGE_CONFIDENCE = {"image": 0.4, "text": 0.4, "context": 0.2}
+
+# Stages to run inside this process instead of calling their services, e.g.
+# "context,risk,fusion"; they need their service code and requirements here
+INPROCESS_STAGES = [stage.strip() for stage in os.getenv("INPROCESS_STAGES", "").split(",") if stage.strip()]
+
+service_clients = ServiceClients(SERVICES, STAGE_TIMEOUTS, local=load_local_stages(INPROCESS_STAGES))
+
+# Answer /analyze without waiting for the image when text and context
+# already settle the review decision. At the defaults (the review
+# threshold) early decisions always match the full pipeline's; a lower
+# review / higher clear threshold decides more items early, at the cost
+# of sometimes disagreeing with it
+EARLY_DECISIONS_ENABLED = os.getenv("EARLY_DECISIONS", "true").lower() == "true"
+EARLY_REVIEW_THRESHOLD = float(os.getenv("EARLY_REVIEW_THRESHOLD", "0.6"))
+EARLY_CLEAR_THRESHOLD = float(os.getenv("EARLY_CLEAR_THRESHOLD", "0.6"))
+EARLY_COMPLETION_DRAIN_TIMEOUT = float(os.getenv("EARLY_COMPLETION_DRAIN_TIMEOUT", "20"))
+
+# Background completions of early decisions, awaited on shutdown
+pending_completions = set()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await service_clients.start()
+    try:
+        yield
+    finally:
+        if pending_completions:
+            await asyncio.wait(pending_completions, timeout=EARLY_COMPLETION_DRAIN_TIMEOUT)
+        await service_clients.close()
+
+app = FastAPI(title="Cross-Modal Orchestrator", lifespan=lifespan)
+
+class RequestMonitor:
+    """Request count/duration metrics and the X-Processing-Time header.
+
+    Written as plain ASGI middleware rather than @app.middleware("http"):
+    the latter cuts off the request body once the response has started,
+    which breaks /analyze/stream reading its input while writing results.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        
+        start_time = time.time()
+        status = 500
+        
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message).append("X-Processing-Time", str(time.time() - start_time))
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            REQUEST_DURATION.observe(time.time() - start_time)
+            REQUEST_COUNT.labels(
+                method=scope["method"],
+                endpoint=scope["path"],
+                status=status
+            ).inc()
+
+app.add_middleware(RequestMonitor)
+
+def build_fusion_payload(risk_result: dict, image_result: dict, text_result: dict, start_time: float) -> dict:
+    # The image itself never goes past the image service; later
+    # stages only see its analysis and a hash/size reference.
+    return {
+        "risk_assessment": risk_result,
+        "image_analysis": image_result,
+        "text_analysis": text_result,
+        "image_ref": image_result.get("image_ref"),
+        "pipeline_latency_ms": (time.time() - start_time) * 1000
+    }
+
+def requested_components(image, context: dict) -> list:
+    """The stages an item goes through: all of them, less image or context when the request has none"""
+    return [stage for stage in COMPONENTS if (stage != "image" or image) and (stage != "context" or context)]
+
+def confidence_for(components: list, requested: list = COMPONENTS, confidence: float = BASE_CONFIDENCE) -> float:
+    lost = sum(share for stage, share in STAGE_CONFIDENCE.items() if stage in requested and stage not in components)
+    return round(confidence * (1 - lost), 4)
+
+def build_response(prediction_id: str, final_result: Optional[dict], risk_result: dict, start_time: float,
+                   components: list = COMPONENTS, requested: list = COMPONENTS) -> AnalysisResponse:
+    """Response from fusion's result, or from risk's alone when fusion was skipped (then nothing is stored)"""
+    final_result = final_result or risk_result
+    return AnalysisResponse(
+        # Fusion's id is the key the result is stored under, so feedback on it can be joined back
+        prediction_id=final_result.get("prediction_id") or prediction_id,
+        risk_score=final_result.get("risk_score", 0.5),
+        confidence=confidence_for(components, requested, final_result.get("confidence", BASE_CONFIDENCE)),
+        flags=final_result.get("flags", []),
+        components_used=components,
+        processing_time=time.time() - start_time,
+        model_version=risk_result.get("rules_version") or "unknown",
+        needs_review=final_result.get("needs_review")
+    )
+
+async def optional_stage(service: str, path: str, payload: Union[dict, bytes]) -> Optional[dict]:
+    """A stage's result, or None when it failed, ran out of budget or its circuit is open; bytes are posted raw"""
+    try:
+        if isinstance(payload, bytes):
+            return await service_clients.post_bytes(service, path, payload)
+        return await service_clients.post_json(service, path, payload)
+    except Exception as e:
+        STAGES_SKIPPED.labels(stage=service).inc()
+        print(f"⚠️ Skipping {service} stage: {e}")
+        return None
+
+async def image_stage(image: Union[str, bytes, None]) -> Optional[dict]:
+    """Image analysis, raw bytes without a base64 round trip; None without a call when there is no image"""
+    if not image:
+        return None
+    if isinstance(image, bytes):
+        return await optional_stage("image", "/analyze/raw", image)
+    return await optional_stage("image", "/analyze", {"image_data": image})
+
+async def context_stage(context: dict) -> Optional[dict]:
+    """Context analysis, or None without a call when the request has no context to analyse"""
+    if not context:
+        return None
+    return await optional_stage("context", "/analyze", {"context": context})
+
+def risk_inputs(image_result: Optional[dict], text_result: Optional[dict], context_result: Optional[dict]) -> dict:
+    return {
+        "image_analysis": MISSING_ANALYSIS["image"] if image_result is None else image_result,
+        "text_analysis": MISSING_ANALYSIS["text"] if text_result is None else text_result,
+        "context_analysis": context_result
+    }
+
+def components_present(requested: list, image_result, text_result, context_result) -> list:
+    present = {"image": image_result, "text": text_result, "context": context_result}
+    return [stage for stage in requested if present.get(stage, True) is not None]
+
+def downstream_status(error: DownstreamError) -> int:
+    if isinstance(error, (CircuitOpen, StageTimeout)):
+        return error.status
+    return 502
+
+async def early_decision(text_result: dict, context_result: Optional[dict]) -> Optional[dict]:
+    """Risk bounds from text and context alone; returned when no image result could change the decision"""
+    try:
+        bounds = await service_clients.post_json("risk", "/assess/bounds", {
+            "text_analysis": text_result,
+            "context_analysis": context_result
+        })
+    except Exception as e:
+        print(f"⚠️ Early risk bounds unavailable, waiting for the image: {e}")
+        return None
+    if bounds["min_score"] > EARLY_REVIEW_THRESHOLD:
+        return {**bounds, "needs_review": True, "risk_score": bounds["min_score"]}
+    if bounds["max_score"] <= EARLY_CLEAR_THRESHOLD:
+        return {**bounds, "needs_review": False, "risk_score": bounds["max_score"]}
+    return None
+
+def early_assessment(decision: dict, risk_result: Optional[dict]) -> dict:
+    """The risk assessment stored for an early decision: the score and decision the client was given,
+    with the full pipeline's explanation and rules when it got that far"""
+    assessment = {
+        "explanation": f"Decided from text and context before the image result "
+                       f"(risk between {decision['min_score']:.2f} and {decision['max_score']:.2f} for any image)",
+        "rules_fired": [],
+        "rules_version": decision.get("rules_version"),
+        **(risk_result or {})
+    }
+    return {**assessment, "risk_score": decision["risk_score"], "needs_review": decision["needs_review"]}
+
+async def complete_early_analysis(prediction_id: str, decision: dict, image_call, text_result: dict,
+                                  context_result: Optional[dict], start_time: float):
+    """Finish an early-decided analysis once the image arrives and store it under the id already returned.
+
+    The stored record keeps the score and decision the client was given,
+    plus the full pipeline's (as pipeline_risk). If the image or /assess
+    fails, the early decision is stored on its own, so the id can still be
+    looked up and given feedback.
+    """
+    image_result = risk_result = None
+    try:
+        image_result = await image_call
+        risk_result = await service_clients.post_json("risk", "/assess", risk_inputs(image_result, text_result, context_result))
+        agrees = risk_result["needs_review"] == decision["needs_review"]
+        EARLY_COMPLETIONS.labels(outcome="agreed" if agrees else "disagreed").inc()
+        if not agrees:
+            print(f"⚠️ Early decision for {prediction_id} (needs_review={decision['needs_review']}) "
+                  f"differs from the full pipeline (risk score {risk_result['risk_score']})")
+    except Exception as e:
+        EARLY_COMPLETIONS.labels(outcome="failed").inc()
+        print(f"❌ Completing early decision {prediction_id} failed, storing the early decision alone: {e}")
     
-    response.headers["X-Processing-Time"] = str(duration)
-    return response
+    fusion_payload = build_fusion_payload(early_assessment(decision, risk_result), image_result or {}, text_result, start_time)
+    fusion_payload.update(analysis_id=prediction_id, early_decision=True, pipeline_risk=risk_result)
+    try:
+        await service_clients.post_json("fusion", "/fuse", fusion_payload)
+    except Exception as e:
+        EARLY_COMPLETIONS.labels(outcome="unstored").inc()
+        print(f"❌ Storing early decision {prediction_id} failed: {e}")
+
+def early_response(prediction_id: str, decision: dict, components: list, requested: list,
+                   start_time: float) -> AnalysisResponse:
+    return AnalysisResponse(
+        prediction_id=prediction_id,
+        risk_score=decision["risk_score"],
+        # The decision holds whatever the image shows, so its share of the confidence stays
+        confidence=confidence_for(components + ["image"], requested),
+        flags=[],
+        components_used=components,
+        processing_time=time.time() - start_time,
+        model_version=decision.get("rules_version") or "unknown",
+        needs_review=decision["needs_review"],
+        early_decision=True
+    )
+
+def form_upload(fields, image: Union[str, bytes, None]) -> Upload:
+    text_content = fields.get("text_content", fields.get("text"))
+    if text_content is None:
+        raise HTTPException(status_code=422, detail="Field 'text' (or 'text_content') is required")
+    try:
+        context = json.loads(fields.get("context") or "{}")
+    except ValueError:
+        context = None
+    if not isinstance(context, dict):
+        raise HTTPException(status_code=422, detail="Field 'context' must be a JSON object")
+    return Upload(image, text_content, context)
+
+async def read_upload(request: Request) -> Upload:
+    """The item in an /analyze body, read in chunks and cut off past UPLOAD_MAX_BYTES.
+
+    Multipart forms carry text (or text_content), an optional image file
+    and context as a JSON string; the dashboard posts these. An
+    octet-stream body is the image itself, with the other fields in the
+    query string. Anything else is read as a JSON AnalysisRequest.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    body = limited(request.stream(), UPLOAD_MAX_BYTES)
+    if content_type == "multipart/form-data":
+        try:
+            form = await MultiPartParser(request.headers, body).parse()
+        except MultiPartException as e:
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {e.message}")
+        try:
+            image = form.get("image")
+            image = await image.read() if isinstance(image, UploadFile) else form.get("image_data")
+            return form_upload(form, image)
+        finally:
+            await form.close()
+    if content_type == "application/x-www-form-urlencoded":
+        form = await FormParser(request.headers, body).parse()
+        return form_upload(form, form.get("image_data"))
+    if content_type == "application/octet-stream":
+        return form_upload(request.query_params, await read_limited(body))
+    try:
+        item = AnalysisRequest.model_validate_json(await read_limited(body))
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+    return Upload(item.image_data, item.text_content, item.context)
+
+@app.post("/analyze", response_model=AnalysisResponse, openapi_extra={"requestBody": ANALYZE_REQUEST_BODY})
+async def analyze_content(request: Request):
+    """Analyse one item sent as JSON, a multipart form or raw image bytes, see read_upload.
+
+    Raw and multipart images go to image-service as bytes; the JSON form's
+    base64 is passed through as before. A body over UPLOAD_MAX_BYTES is
+    rejected with 413 as soon as it is read past the limit.
+    """
+    try:
+        upload = await read_upload(request)
+    except BodyTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    return await analyze_item(upload)
+
+async def analyze_item(request: Upload) -> AnalysisResponse:
+    """Analyse one item within the stage budgets.
 
-@app.post("/analyze", response_model=AnalysisResponse)
-async def analyze_content(request: AnalysisRequest):
+    Image and context are only analysed when the request has them. Image,
+    text and context are optional: a stage that fails, runs out of budget
+    or has an open circuit is skipped, risk is computed from the others and
+    the response lists what was used, with lower confidence.
+    Without both image and text, or without risk, the request fails with
+    the downstream status (502/503/504). Without fusion the result is
+    returned but not stored.
+    """
     start_time = time.time()
     prediction_id = str(uuid.uuid4())
+    requested = requested_components(request.image, request.context)
     
     try:
         with PREDICTION_LATENCY.time():
-            async with aiohttp.ClientSession() as session:
-                
-                with MODEL_INFERENCE_TIME.labels('image_text_context').time():
-                    image_task = session.post(f"{SERVICES['image']}/analyze", json={"image_data": request.image_data})
-                    text_task = session.post(f"{SERVICES['text']}/analyze", json={"text_content": request.text_content})
-                    context_task = session.post(f"{SERVICES['context']}/analyze", json={"context": request.context})
-                    
-                    image_response, text_response, context_response = await asyncio.gather(image_task, text_task, context_task)
-                
-                
-                with MODEL_INFERENCE_TIME.labels('risk').time():
-                    risk_payload = {
-                        "image_analysis": await image_response.json(),
-                        "text_analysis": await text_response.json(),
-                        "context_analysis": await context_response.json()
-                    }
-                    
-                    risk_response = await session.post(f"{SERVICES['risk']}/assess", json=risk_payload)
-                
+            
+            with MODEL_INFERENCE_TIME.labels('image_text_context').time():
+                # The image (Rekognition) is usually last; text and context are awaited first
+                image_call = asyncio.ensure_future(image_stage(request.image))
+                text_result, context_result = await asyncio.gather(
+                    optional_stage("text", "/analyze", {"text_content": request.text_content}),
+                    context_stage(request.context)
+                )
                 
-                with MODEL_INFERENCE_TIME.labels('fusion').time():
-                    fusion_payload = {
-                        "risk_assessment": await risk_response.json(),
-                        "original_input": request.dict()
-                    }
-                    
-                    fusion_response = await session.post(f"{SERVICES['fusion']}/fuse", json=fusion_payload)
-                    final_result = await fusion_response.json()
+                decision = None
+                if EARLY_DECISIONS_ENABLED and text_result is not None and not image_call.done():
+                    decision = await early_decision(text_result, context_result)
+                if decision is not None:
+                    EARLY_DECISIONS.labels(decision="review" if decision["needs_review"] else "clear").inc()
+                    prediction_id = f"mod_{uuid.uuid4().hex[:8]}"
+                    task = asyncio.create_task(complete_early_analysis(
+                        prediction_id, decision, image_call, text_result, context_result, start_time
+                    ))
+                    pending_completions.add(task)
+                    task.add_done_callback(pending_completions.discard)
+                    components = [stage for stage in components_present(requested, None, text_result, context_result)
+                                  if stage != "fusion"]
+                    return early_response(prediction_id, decision, components, requested, start_time)
                 
-                processing_time = time.time() - start_time
+                image_result = await image_call
+            
+            if image_result is None and text_result is None:
+                raise HTTPException(status_code=503, detail="Image and text analysis both unavailable")
+            components = components_present(requested, image_result, text_result, context_result)
+            
+            with MODEL_INFERENCE_TIME.labels('risk').time():
+                risk_payload = risk_inputs(image_result, text_result, context_result)
                 
-                return AnalysisResponse(
-                    prediction_id=prediction_id,
-                    risk_score=final_result.get("risk_score", 0.5),
-                    confidence=final_result.get("confidence", 0.8),
-                    flags=final_result.get("flags", []),
-                    components_used=["image", "text", "context", "risk", "fusion"],
-                    processing_time=processing_time
-                )
+                risk_result = await service_clients.post_json("risk", "/assess", risk_payload)
+            
+            
+            with MODEL_INFERENCE_TIME.labels('fusion').time():
+                fusion_payload = build_fusion_payload(risk_result, image_result or {}, text_result or {}, start_time)
                 
+                final_result = await optional_stage("fusion", "/fuse", fusion_payload)
+            if final_result is None:
+                components.remove("fusion")
+            
+            return build_response(prediction_id, final_result, risk_result, start_time, components, requested)
+    
+    except HTTPException:
+        raise
+    except DownstreamError as e:
+        raise HTTPException(status_code=downstream_status(e), detail=f"Orchestration failed: {str(e)}")
     except Exception as e:
         REQUEST_COUNT.labels(method='POST', endpoint='/analyze', status=500).inc()
         raise HTTPException(status_code=500, detail=f"Orchestration failed: {str(e)}")
 
+async def analyze_batch_items(items: List[AnalysisRequest]) -> List[BatchItemResult]:
+    """Run a batch through the pipeline; one failing item never fails the rest.
+
+    Image and text calls are made per item with at most BATCH_CONCURRENCY in
+    flight. Context, risk and fusion are called once for the whole batch,
+    context with only the items that have some.
+    Skipped image, text, context or fusion results degrade items the same
+    way as /analyze; an item fails only without both image and text, or
+    without risk.
+    """
+    start_time = time.time()
+    errors = {}
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def analyze_modalities(item: AnalysisRequest):
+        async with semaphore:
+            return await asyncio.gather(
+                image_stage(item.image_data),
+                optional_stage("text", "/analyze", {"text_content": item.text_content})
+            )
+    
+    async def batch_call(service: str, path: str, payload: dict, count: int) -> list:
+        try:
+            return (await service_clients.post_json(service, path, payload))["results"]
+        except Exception as e:
+            return [{"error": str(e)}] * count
+    
+    def record_errors(stage: str, indices: List[int], results: list) -> List[int]:
+        ok = []
+        for index, result in zip(indices, results):
+            if isinstance(result, Exception) or "error" in result:
+                errors[index] = f"{stage}: {result if isinstance(result, Exception) else result['error']}"
+                BATCH_ITEM_ERRORS.labels(stage).inc()
+            else:
+                ok.append(index)
+        return ok
+    
+    def skip_failed(stage: str, results: list) -> list:
+        skipped = [None if "error" in result else result for result in results]
+        if any(result is None for result in skipped):
+            STAGES_SKIPPED.labels(stage=stage).inc(sum(result is None for result in skipped))
+            print(f"⚠️ Skipping {stage} stage for {sum(result is None for result in skipped)} batch items")
+        return skipped
+    
+    requested = [requested_components(item.image_data, item.context) for item in items]
+    with_context = [i for i, item in enumerate(items) if item.context]
+    with MODEL_INFERENCE_TIME.labels('image_text_context').time():
+        modality_results, context_analyses = await asyncio.gather(
+            asyncio.gather(*[analyze_modalities(item) for item in items]),
+            batch_call("context", "/analyze/batch", {"contexts": [items[i].context for i in with_context]},
+                       len(with_context)) if with_context else asyncio.sleep(0, [])
+        )
+    context_results = [None] * len(items)
+    for i, result in zip(with_context, skip_failed("context", context_analyses)):
+        context_results[i] = result
+    
+    ready = record_errors("image/text", list(range(len(items))), [
+        {"error": "image and text analysis both unavailable"} if image is None and text is None else {}
+        for image, text in modality_results
+    ])
+    components = {i: components_present(requested[i], *modality_results[i], context_results[i]) for i in ready}
+    
+    with MODEL_INFERENCE_TIME.labels('risk').time():
+        risk_results = await batch_call("risk", "/assess/batch", {"items": [
+            risk_inputs(*modality_results[i], context_results[i]) for i in ready
+        ]}, len(ready)) if ready else []
+    risk_by_index = dict(zip(ready, risk_results))
+    ready = record_errors("risk", ready, risk_results)
+    
+    with MODEL_INFERENCE_TIME.labels('fusion').time():
+        fusion_results = await batch_call("fusion", "/fuse/batch", {"items": [
+            build_fusion_payload(risk_by_index[i], modality_results[i][0] or {}, modality_results[i][1] or {}, start_time)
+            for i in ready
+        ]}, len(ready)) if ready else []
+    fusion_by_index = dict(zip(ready, skip_failed("fusion", fusion_results)))
+    for i in ready:
+        if fusion_by_index[i] is None:
+            components[i].remove("fusion")
+    
+    return [
+        BatchItemResult(index=i, result=build_response(
+            str(uuid.uuid4()), fusion_by_index[i], risk_by_index[i], start_time, components[i], requested[i]
+        ))
+        if i not in errors else BatchItemResult(index=i, error=errors[i])
+        for i in range(len(items))
+    ]
+
+@app.post("/analyze/batch", response_model=BatchAnalysisResponse)
+async def analyze_batch(request: BatchAnalysisRequest):
+    start_time = time.time()
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(request.items)} items exceeds the limit of {BATCH_MAX_ITEMS}")
+    BATCH_SIZE.observe(len(request.items))
+    
+    try:
+        with PREDICTION_LATENCY.time():
+            results = await analyze_batch_items(request.items)
+        return BatchAnalysisResponse(results=results, processing_time=time.time() - start_time)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch orchestration failed: {str(e)}")
+
+@app.post("/analyze/stream")
+async def analyze_ndjson_stream(request: Request, ordered: bool = False):
+    """Backfill endpoint: NDJSON AnalysisRequest lines in, NDJSON results out as they finish.
+
+    Each output line is {"index", "result", "error"}; pass ordered=true to
+    get results in input order.
+    """
+    async def results():
+        async for result in analyze_stream(iter_lines(request.stream()), analyze_batch_items, AnalysisRequest, ordered=ordered):
+            yield to_ndjson(result)
+    
+    return DuplexStreamingResponse(results(), media_type="application/x-ndjson")
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "orchestrator"}
+    return {
+        "status": "healthy",
+        "service": "orchestrator",
+        "stages": {stage: service_clients.mode(stage) for stage in COMPONENTS},
+        "circuits": service_clients.circuits()
+    }
 
 @app.get("/metrics")
 async def metrics():
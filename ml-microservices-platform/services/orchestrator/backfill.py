@@ -0,0 +1,53 @@
+"""Run a moderation backfill from the command line without going through HTTP.
+
+Reads NDJSON AnalysisRequest lines from a file (or stdin with '-') and writes
+NDJSON results to stdout as they finish, using the same pooled clients and
+batch pipeline as POST /analyze/stream:
+
+    python backfill.py posts.ndjson --ordered > results.ndjson
+"""
+import argparse
+import asyncio
+import sys
+
+from app import AnalysisRequest, analyze_batch_items, service_clients
+from streaming import STREAM_CHUNK_SIZE, STREAM_WINDOW, analyze_stream, to_ndjson
+
+
+async def read_lines(stream):
+    """Read lines off the event loop so a slow pipe doesn't stall in-flight chunks"""
+    loop = asyncio.get_running_loop()
+    while True:
+        line = await loop.run_in_executor(None, stream.readline)
+        if not line:
+            return
+        if line.strip():
+            yield line
+
+
+async def run(args):
+    stream = sys.stdin.buffer if args.input == '-' else open(args.input, 'rb')
+    out = sys.stdout.buffer
+    await service_clients.start()
+    try:
+        async for result in analyze_stream(read_lines(stream), analyze_batch_items, AnalysisRequest,
+                                           chunk_size=args.chunk_size, window=args.window, ordered=args.ordered):
+            out.write(to_ndjson(result))
+        out.flush()
+    finally:
+        await service_clients.close()
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream NDJSON moderation requests through the pipeline")
+    parser.add_argument('input', help="NDJSON file of AnalysisRequest objects, or '-' for stdin")
+    parser.add_argument('--ordered', action='store_true', help="emit results in input order")
+    parser.add_argument('--chunk-size', type=int, default=STREAM_CHUNK_SIZE)
+    parser.add_argument('--window', type=int, default=STREAM_WINDOW)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+import asyncio
+import os
+import time
+import aiohttp
+from resilience import CircuitBreaker, LatencyTracker, hedged
+
+
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "100"))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "2"))
+# Services whose slow calls get a second, hedge request after their recent p95
+HEDGED_SERVICES = [name.strip() for name in os.getenv("HEDGED_SERVICES", "image,text").split(",") if name.strip()]
+
+
+class DownstreamError(Exception):
+    """A downstream service answered with an HTTP error or an {"error": ...} body"""
+
+    def __init__(self, service: str, message: str, status: int = None):
+        super().__init__(f"{service} service failed: {message}")
+        self.service = service
+        self.status = status
+
+    @property
+    def is_failure(self) -> bool:
+        """Whether this counts against the service's circuit: unreachable, timed out or a 5xx.
+
+        An {"error": ...} body or a 4xx is an answer about the input, not
+        a sign the service is unhealthy; image and text services answer a
+        Rekognition or Comprehend outage with a 502.
+        """
+        return self.status is None or self.status >= 500
+
+
+class StageTimeout(DownstreamError):
+    def __init__(self, service: str, budget: float):
+        super().__init__(service, f"no answer within its {budget}s budget", 504)
+
+
+class CircuitOpen(DownstreamError):
+    def __init__(self, service: str):
+        super().__init__(service, "circuit open after repeated failures", 503)
+
+
+class ServiceClients:
+    """One long-lived, pooled aiohttp session per downstream service.
+
+    Sessions are opened once at startup and reused by every request, so
+    connections to each service stay alive between analyses instead of
+    paying TCP setup on every call. Services in ``local`` (name ->
+    LocalStage) are called in-process instead and get no session.
+
+    Each remote call has the service's timeout as its whole budget,
+    hedge included: services in ``hedged`` get a second request once the
+    first has taken longer than their recent p95. A circuit breaker per
+    service fails calls fast while it keeps failing.
+    """
+
+    def __init__(self, services: dict, timeouts: dict, local: dict = None, hedged: list = None):
+        self.services = services
+        self.timeouts = timeouts
+        self.local = local or {}
+        self.hedged = set(HEDGED_SERVICES if hedged is None else hedged)
+        self.breakers = {name: CircuitBreaker(name) for name in services}
+        self.latencies = {name: LatencyTracker() for name in services}
+        self._sessions = {}
+
+    async def start(self):
+        for stage in self.local.values():
+            await stage.start()
+        for name in self.services:
+            if name in self.local:
+                continue
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT_PER_HOST,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                use_dns_cache=True,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=self.timeouts.get(name),
+                connect=HTTP_CONNECT_TIMEOUT
+            )
+            self._sessions[name] = aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def close(self):
+        sessions, self._sessions = self._sessions, {}
+        for session in sessions.values():
+            await session.close()
+        for stage in self.local.values():
+            await stage.close()
+
+    def mode(self, service: str) -> str:
+        return "in-process" if service in self.local else "http"
+
+    def circuits(self) -> dict:
+        return {name: breaker.to_dict() for name, breaker in self.breakers.items() if name not in self.local}
+
+    def session(self, service: str) -> aiohttp.ClientSession:
+        if service not in self._sessions:
+            raise RuntimeError(f"No open HTTP session for service '{service}'")
+        return self._sessions[service]
+
+    async def post_json(self, service: str, path: str, payload: dict) -> dict:
+        """POST to a downstream service and return its decoded JSON body.
+
+        The response is always read in full inside the context manager so
+        the connection goes back to the pool. HTTP errors and the services'
+        ``{"error": ...}`` bodies are raised as ``DownstreamError``, a
+        spent budget as ``StageTimeout`` and an open circuit as
+        ``CircuitOpen``.
+        """
+        if service in self.local:
+            return await self.local[service].post_json(path, payload)
+        return await self._call(service, lambda: self._post(service, path, json=payload))
+
+    async def post_bytes(self, service: str, path: str, data: bytes,
+                         content_type: str = "application/octet-stream") -> dict:
+        """POST a raw body (an image) as is, with the same budget, hedging and circuit as ``post_json``"""
+        if service in self.local:
+            raise DownstreamError(service, "raw bodies can't be sent to an in-process stage", 501)
+        return await self._call(service, lambda: self._post(service, path, data=data,
+                                                            headers={"Content-Type": content_type}))
+
+    async def _call(self, service: str, attempt) -> dict:
+        breaker = self.breakers[service]
+        if not breaker.allow():
+            raise CircuitOpen(service)
+        budget = self.timeouts.get(service)
+        try:
+            if service in self.hedged:
+                call = hedged(attempt, self.latencies[service].hedge_delay(), service)
+            else:
+                call = attempt()
+            body = await asyncio.wait_for(call, budget)
+        except asyncio.TimeoutError:
+            breaker.record_failure()
+            raise StageTimeout(service, budget) from None
+        except DownstreamError as e:
+            if e.is_failure:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        except asyncio.CancelledError:
+            # The caller went away (client disconnect, a failed gather), which says nothing about the service
+            breaker.release()
+            raise
+        except Exception:
+            # Undecodable answers and the like
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return body
+
+    async def _post(self, service: str, path: str, **body) -> dict:
+        url = f"{self.services[service]}{path}"
+        start = time.perf_counter()
+        try:
+            async with self.session(service).post(url, **body) as response:
+                if response.status >= 400:
+                    raise DownstreamError(service, await response.text(), response.status)
+                body = await response.json()
+        except aiohttp.ClientError as e:
+            raise DownstreamError(service, f"unreachable: {e}") from e
+        self.latencies[service].observe(time.perf_counter() - start)
+        if isinstance(body, dict) and "error" in body:
+            raise DownstreamError(service, body["error"], response.status)
+        return body
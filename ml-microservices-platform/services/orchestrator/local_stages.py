@@ -0,0 +1,107 @@
+import importlib.util
+import inspect
+import os
+import sys
+from contextlib import AsyncExitStack
+from typing import get_type_hints
+from fastapi import HTTPException
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, ValidationError
+
+from http_clients import DownstreamError
+
+
+# Service directory of each stage that can run inside the orchestrator
+LOCAL_STAGE_DIRS = {
+    "context": "context-service",
+    "risk": "risk-service",
+    "fusion": "fusion-service"
+}
+# Where those directories live; the repo layout by default, see Dockerfile.inprocess
+LOCAL_SERVICES_DIR = os.getenv("LOCAL_SERVICES_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+def load_service_app(stage: str, services_dir: str = LOCAL_SERVICES_DIR):
+    """Import a stage's service app.py under its own module name, with its helper modules importable"""
+    directory = os.path.join(services_dir, LOCAL_STAGE_DIRS[stage])
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    name = f"{stage}_service_app"
+    spec = importlib.util.spec_from_file_location(name, os.path.join(directory, "app.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module.app
+
+
+def to_plain(value):
+    """What the body would look like after a JSON round trip, without doing one"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+    return value
+
+
+class LocalStage:
+    """A pipeline stage served by calling its FastAPI route handlers in-process.
+
+    Presents the same ``post_json`` as ServiceClients: the payload is
+    validated into the route's request model and the handler awaited
+    directly, so there is no socket, no JSON encoding and no middleware.
+    Errors surface as DownstreamError, as they would over HTTP. The
+    service's lifespan (rule watchers, result store, ...) runs between
+    ``start`` and ``close``.
+    """
+
+    def __init__(self, service: str, app):
+        self.service = service
+        self.app = app
+        self.handlers = {}
+        for route in app.routes:
+            if isinstance(route, APIRoute) and "POST" in route.methods:
+                hints = get_type_hints(route.endpoint)
+                body = [(name, hints.get(name)) for name in inspect.signature(route.endpoint).parameters]
+                body = [(name, model) for name, model in body if isinstance(model, type) and issubclass(model, BaseModel)]
+                if len(body) <= 1:
+                    self.handlers[route.path] = (route.endpoint, body[0] if body else None)
+        self._stack = None
+
+    async def start(self):
+        self._stack = AsyncExitStack()
+        await self._stack.enter_async_context(self.app.router.lifespan_context(self.app))
+
+    async def close(self):
+        stack, self._stack = self._stack, None
+        if stack is not None:
+            await stack.aclose()
+
+    async def post_json(self, path: str, payload: dict) -> dict:
+        if path not in self.handlers:
+            raise DownstreamError(self.service, f"No in-process handler for POST {path}", 404)
+        endpoint, body = self.handlers[path]
+        try:
+            if body is None:
+                result = await endpoint()
+            else:
+                name, model = body
+                result = await endpoint(**{name: model.model_validate(payload)})
+        except ValidationError as e:
+            raise DownstreamError(self.service, str(e), 422) from e
+        except HTTPException as e:
+            raise DownstreamError(self.service, str(e.detail), e.status_code) from e
+        except Exception as e:
+            raise DownstreamError(self.service, str(e), 500) from e
+        result = to_plain(result)
+        if isinstance(result, dict) and "error" in result:
+            raise DownstreamError(self.service, result["error"])
+        return result
+
+
+def load_local_stages(stages: list, services_dir: str = LOCAL_SERVICES_DIR) -> dict:
+    unknown = [stage for stage in stages if stage not in LOCAL_STAGE_DIRS]
+    if unknown:
+        raise ValueError(f"Stages {unknown} can't run in-process, expected some of: {', '.join(LOCAL_STAGE_DIRS)}")
+    return {stage: LocalStage(stage, load_service_app(stage, services_dir)) for stage in stages}
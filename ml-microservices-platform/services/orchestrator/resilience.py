@@ -0,0 +1,139 @@
+import asyncio
+import os
+import time
+from collections import deque
+from prometheus_client import Counter, Gauge
+
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+# Hedging waits for the service's recent p95 before sending a second
+# request; until enough latencies are seen it waits HEDGE_INITIAL_DELAY
+HEDGE_INITIAL_DELAY = float(os.getenv("HEDGE_INITIAL_DELAY", "1.0"))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "200"))
+LATENCY_MIN_SAMPLES = 20
+
+CIRCUIT_STATE = Gauge('circuit_state', 'Circuit breaker state per service (0 closed, 1 half-open, 2 open)', ['service'])
+CIRCUIT_REJECTIONS = Counter('circuit_rejections_total', 'Calls failed fast by an open circuit', ['service'])
+HEDGED_REQUESTS = Counter('hedged_requests_total', 'Hedge requests sent, and which attempt answered', ['service', 'outcome'])
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Fails calls to a service fast once it keeps failing.
+
+    Opens after ``failure_threshold`` consecutive failures; after
+    ``reset_timeout`` seconds one trial call is let through (half-open),
+    and its outcome closes or re-opens the circuit. A trial that ends
+    without an outcome (cancelled) is ``release``d; one not heard from
+    within ``reset_timeout`` is given up on and another is let through.
+    """
+
+    def __init__(self, service: str, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+                 reset_timeout: float = CIRCUIT_RESET_TIMEOUT):
+        self.service = service
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._trial_started = None
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(service=self.service).set(STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and (not self._trial_in_flight or
+                                        time.monotonic() - self._trial_started >= self.reset_timeout):
+            self._trial_in_flight = True
+            self._trial_started = time.monotonic()
+            return True
+        CIRCUIT_REJECTIONS.labels(service=self.service).inc()
+        return False
+
+    def release(self):
+        """A call ended without telling whether the service is healthy; the next call may be the trial"""
+        if self.state == HALF_OPEN:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        self.failures = 0
+        self._trial_in_flight = False
+        if self.state != CLOSED:
+            print(f"✅ Circuit for {self.service} closed")
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_in_flight = False
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            print(f"⚠️ Circuit for {self.service} opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def to_dict(self) -> dict:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+class LatencyTracker:
+    """Recent successful call latencies for one service, for the hedge delay"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self._p95 = None
+
+    def observe(self, seconds: float):
+        self.samples.append(seconds)
+        self.count += 1
+        # Re-sorting a few hundred floats is cheap, but not on every call
+        if self.count % 10 == 0:
+            self._p95 = None
+
+    def p95(self):
+        if len(self.samples) < LATENCY_MIN_SAMPLES:
+            return None
+        if self._p95 is None:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[int(len(ordered) * 0.95)]
+        return self._p95
+
+    def hedge_delay(self) -> float:
+        p95 = self.p95()
+        return HEDGE_INITIAL_DELAY if p95 is None else max(p95, HEDGE_MIN_DELAY)
+
+
+async def hedged(call, delay: float, service: str):
+    """Await ``call()``; if it hasn't answered after ``delay``, start a second one and take whichever succeeds first"""
+    first = asyncio.ensure_future(call())
+    pending = {first}
+    try:
+        done, _ = await asyncio.wait(pending, timeout=delay)
+        if done:
+            pending = set()
+            return first.result()
+        HEDGED_REQUESTS.labels(service=service, outcome='sent').inc()
+        second = asyncio.ensure_future(call())
+        pending = {first, second}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for attempt in done:
+                if attempt.exception() is None:
+                    HEDGED_REQUESTS.labels(service=service,
+                                           outcome='hedge_won' if attempt is second else 'first_won').inc()
+                    return attempt.result()
+                error = attempt.exception()
+        raise error
+    finally:
+        for attempt in pending:
+            attempt.cancel()
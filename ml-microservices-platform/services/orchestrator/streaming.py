@@ -0,0 +1,128 @@
+import asyncio
+import json
+import os
+from typing import AsyncIterator, Awaitable, Callable
+from starlette.responses import StreamingResponse
+
+
+# Items analysed per batch call, batch calls in flight at once, and the
+# longest input line accepted (one item with its base64 image)
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", "50"))
+STREAM_WINDOW = int(os.getenv("STREAM_WINDOW", "4"))
+STREAM_MAX_LINE_BYTES = int(os.getenv("STREAM_MAX_LINE_BYTES", str(32 * 1024 * 1024)))
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], max_line_bytes: int = STREAM_MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """Split a byte stream into non-empty lines without buffering more than one line"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        if len(buffer) > max_line_bytes:
+            raise ValueError(f"Input line exceeds {max_line_bytes} bytes")
+    if buffer.strip():
+        yield buffer
+
+
+async def analyze_stream(lines: AsyncIterator[bytes],
+                         analyze_items: Callable[[list], Awaitable[list]],
+                         item_model,
+                         chunk_size: int = STREAM_CHUNK_SIZE,
+                         window: int = STREAM_WINDOW,
+                         ordered: bool = False) -> AsyncIterator[dict]:
+    """Analyse NDJSON items lazily and yield one result dict per input line.
+
+    Lines are read only when a window slot is free, grouped into chunks of
+    ``chunk_size`` and passed to ``analyze_items`` (the batch pipeline). At
+    most ``window`` chunks are in flight or waiting to be emitted, so memory
+    stays flat whatever the input size. Unordered mode emits each chunk as
+    soon as it finishes; ordered mode holds finished chunks back until all
+    earlier ones are out. Every result carries the 0-based input line index.
+    """
+    line_iter = lines.__aiter__()
+    pending = set()
+    finished = {}
+    next_chunk = next_emit = next_index = 0
+    exhausted = False
+
+    async def read_chunk() -> list:
+        nonlocal next_index
+        entries = []
+        while len(entries) < chunk_size:
+            try:
+                line = await line_iter.__anext__()
+            except StopAsyncIteration:
+                break
+            try:
+                entries.append((next_index, item_model.model_validate(json.loads(line)), None))
+            except Exception as e:
+                entries.append((next_index, None, f"invalid input line: {e}"))
+            next_index += 1
+        return entries
+
+    async def run_chunk(chunk_no: int, entries: list):
+        valid = [(index, item) for index, item, error in entries if error is None]
+        try:
+            analysed = await analyze_items([item for _, item in valid]) if valid else []
+            by_index = {index: result.model_dump(exclude={"index"}) for (index, _), result in zip(valid, analysed)}
+        except Exception as e:
+            by_index = {index: {"result": None, "error": f"chunk failed: {e}"} for index, _ in valid}
+        results = []
+        for index, _, error in entries:
+            results.append({"index": index, **by_index[index]} if error is None
+                           else {"index": index, "result": None, "error": error})
+        return chunk_no, results
+
+    try:
+        while True:
+            while not exhausted and len(pending) + len(finished) < window:
+                entries = await read_chunk()
+                exhausted = len(entries) < chunk_size
+                if entries:
+                    pending.add(asyncio.create_task(run_chunk(next_chunk, entries)))
+                    next_chunk += 1
+
+            if not pending and not finished:
+                break
+
+            if pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    chunk_no, results = task.result()
+                    finished[chunk_no] = results
+
+            if ordered:
+                while next_emit in finished:
+                    for result in finished.pop(next_emit):
+                        yield result
+                    next_emit += 1
+            else:
+                for chunk_no in list(finished):
+                    for result in finished.pop(chunk_no):
+                        yield result
+    finally:
+        # Client went away or the input broke: don't leave chunks running
+        for task in pending:
+            task.cancel()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse that leaves receive() to the endpoint.
+
+    Starlette's StreamingResponse watches receive() for a client disconnect
+    while it streams, which swallows the request body chunks an endpoint is
+    still reading. Here the endpoint owns receive(); a disconnect surfaces
+    as the end of request.stream() instead.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def to_ndjson(result: dict) -> bytes:
+    return (json.dumps(result, separators=(',', ':')) + "\n").encode("utf-8")
@@ -1,71 +1,113 @@
 from fastapi import FastAPI
-from pydantic import BaseModel
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field
+from typing import List, Optional
+import asyncio
+import os
 import time
 from prometheus_client import Counter, Histogram, generate_latest
-
-app = FastAPI(title="Risk Assessment Service")
+from crossmodal.lexicon import LexiconStore
+from crossmodal.rules import RuleStore
+from crossmodal.registry import DEFAULT_REGISTRY_DIR, RegistryRuleStore, RuleRegistry
+from batch_scoring import score_batch
+from shadow import ShadowScorer
 
 
 RISK_REQUEST_COUNT = Counter('risk_requests_total', 'Total risk assessment requests')
 RISK_PROCESSING_TIME = Histogram('risk_processing_seconds', 'Risk processing time')
 
+# What the rules read from each upstream result; anything else the
+# services send along is ignored
+class ImageAnalysis(BaseModel):
+    categories: List[str]
+    moderation_flagged: bool
+    moderation_labels: List[str] = []
+
+class TextAnalysis(BaseModel):
+    sentiment: str
+    unsafe_found: List[str]
+
+class ContextAnalysis(BaseModel):
+    context_score: float = Field(ge=0.0, le=1.0)
+
 class RiskRequest(BaseModel):
-    image_analysis: dict
-    text_analysis: dict
+    image_analysis: ImageAnalysis
+    text_analysis: TextAnalysis
+    context_analysis: Optional[ContextAnalysis] = None
+
+class RiskBatchRequest(BaseModel):
+    items: List[RiskRequest]
+
+class RiskBoundsRequest(BaseModel):
+    text_analysis: TextAnalysis
+    context_analysis: Optional[ContextAnalysis] = None
+
+class RiskBoundsResponse(BaseModel):
+    min_score: float
+    max_score: float
+    rules_version: str
+    lexicon_version: str
+    processing_time: float
 
 class RiskResponse(BaseModel):
     risk_score: float
     needs_review: bool
     explanation: str
+    rules_fired: List[str] = []
+    rules_version: str
+    lexicon_version: str
     processing_time: float
 
 
-SAFE_IMAGE_CATEGORIES = {'Family', 'Child', 'Person', 'Nature', 'Animal', 'People', 'Face', 'Portrait', 'Kid', 'Baby'}
-UNSAFE_IMAGE_CATEGORIES = {'Weapon', 'Violence', 'Fire', 'Riot', 'Protest', 'Drugs', 'Alcohol'}
+# Safe/unsafe image categories come from the shared versioned lexicon file
+# and are hot-swapped when it changes, see crossmodal.lexicon
+lexicon_store = LexiconStore()
+LEXICON_RELOAD_INTERVAL = float(os.getenv("LEXICON_RELOAD_INTERVAL", "30"))
 
-def assess_risk(image, text):
-    """EXACT COPY FROM MY LAMBDA - My core risk assessment logic"""
-    risk = 0.0
-    
- 
-    image_safe = any(cat in SAFE_IMAGE_CATEGORIES for cat in image['categories'])
-    image_unsafe = any(cat in UNSAFE_IMAGE_CATEGORIES for cat in image['categories'])
-    has_unsafe_words = len(text['unsafe_found']) > 0
-    
-    
-    if image_safe and has_unsafe_words:
-        risk += 0.6  
-        print(f"🚨 CONTEXTUAL MISMATCH: Safe image with unsafe words: {text['unsafe_found']}")
-    
-     
-    if image_unsafe and text['sentiment'] == 'POSITIVE':
-        risk += 0.5
-        print(f"🚨 CONTEXTUAL MISMATCH: Unsafe image with positive text")
-    
-    
-    if has_unsafe_words:
-        risk += 0.3
-        print(f"⚠️ UNSAFE WORDS DETECTED: {text['unsafe_found']}")
-    
-    if image['moderation_flagged']:
-        risk += 0.4
-        print(f"⚠️ IMAGE MODERATION FLAGGED: {image.get('moderation_labels', [])}")
-    
-    if text['sentiment'] == 'NEGATIVE':
-        risk += 0.2
-        print(f"📝 NEGATIVE SENTIMENT DETECTED")
-    
-    
-    if image_safe and text['sentiment'] == 'POSITIVE' and not has_unsafe_words:
-        risk -= 0.3  
-        risk = max(risk, 0.0)  
-        print(f"✅ CONTEXTUALLY ALIGNED: Safe image with positive text")
-    
-    
-    final_risk = min(max(risk, 0.0), 1.0)
-    print(f"🎯 FINAL RISK SCORE: {final_risk}")
-    
-    return final_risk
+# Rule definitions come from the shared versioned rules file, see
+# crossmodal.rules; they are compiled against each lexicon snapshot
+rule_store = RuleStore()
+RULES_RELOAD_INTERVAL = float(os.getenv("RULES_RELOAD_INTERVAL", "30"))
+
+# Retrained weights published by feedback-service replace the rules file's
+# weights; the rules themselves still come from the file, so edits to it
+# apply. 'current' serves traffic, 'candidate' is shadow-scored against it.
+# New versions are loaded and compiled in the watcher before they swap in
+registry = RuleRegistry(os.getenv("MODEL_REGISTRY_DIR", DEFAULT_REGISTRY_DIR))
+registry_store = RegistryRuleStore(registry, base=lambda: rule_store.current,
+                                   prepare=lambda rule_set: rule_set.compile(lexicon_store.current))
+REGISTRY_RELOAD_INTERVAL = float(os.getenv("REGISTRY_RELOAD_INTERVAL", "10"))
+
+shadow = ShadowScorer(
+    max_queue=int(os.getenv("SHADOW_MAX_QUEUE", "10000")),
+    sample_rate=float(os.getenv("SHADOW_SAMPLE_RATE", "1.0"))
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lexicon_watcher = asyncio.create_task(lexicon_store.watch(LEXICON_RELOAD_INTERVAL))
+    rules_watcher = asyncio.create_task(rule_store.watch(RULES_RELOAD_INTERVAL))
+    registry_watcher = asyncio.create_task(registry_store.watch(REGISTRY_RELOAD_INTERVAL))
+    shadow_scorer = asyncio.create_task(shadow.run(candidate_rules))
+    print(f"✅ Risk rules: {current_rules().version}, shadow candidate: {registry_store.candidate and registry_store.candidate.version}")
+    yield
+    lexicon_watcher.cancel()
+    rules_watcher.cancel()
+    registry_watcher.cancel()
+    shadow_scorer.cancel()
+
+app = FastAPI(title="Risk Assessment Service", lifespan=lifespan)
+
+def rule_inputs(request: RiskRequest) -> tuple:
+    """The (image, text, context) dicts the compiled rules read; context is None when it wasn't analysed"""
+    context = request.context_analysis.model_dump() if request.context_analysis is not None else None
+    return request.image_analysis.model_dump(), request.text_analysis.model_dump(), context
+
+def assess_risk(image, text, context, rules):
+    """Score one item with the compiled rule set; returns the score and the rules that fired"""
+    result = rules.evaluate(image, text, context)
+    print(f"🎯 FINAL RISK SCORE: {result.score} (rules: {', '.join(result.fired) or 'none'})")
+    return result
 
 def generate_explanation(risk_score, image, text):
     """EXACT COPY FROM MY LAMBDA - Explanation generation"""
@@ -78,29 +120,181 @@ def generate_explanation(risk_score, image, text):
     else:
         return "Very low risk: Content appears safe and contextually aligned"
 
+def active_rule_set():
+    """The rules file, with the published registry weights if there are any"""
+    return registry_store.current or rule_store.current
+
+def current_rules():
+    """Active rule set compiled against the active lexicon (recompiled only when either changes)"""
+    return active_rule_set().compile(lexicon_store.current)
+
+def candidate_rules():
+    """Compiled shadow candidate, or None when nothing is being shadow-tested"""
+    candidate = registry_store.candidate
+    return candidate.compile(lexicon_store.current) if candidate is not None else None
+
+def risk_response(inputs: tuple, rules, start_time: float) -> RiskResponse:
+    image, text, context = inputs
+    risk_score, rules_fired = assess_risk(image, text, context, rules)
+    explanation = generate_explanation(risk_score, image, text)
+    
+    return RiskResponse(
+        risk_score=risk_score,
+        needs_review=risk_score > 0.6,  
+        explanation=explanation,
+        rules_fired=rules_fired,
+        rules_version=rules.version,
+        lexicon_version=rules.lexicon.version,
+        processing_time=time.time() - start_time
+    )
+
 @app.post("/assess")
 async def assess_risk_endpoint(request: RiskRequest):
     start_time = time.time()
     RISK_REQUEST_COUNT.inc()
     
     try:
+        inputs = rule_inputs(request)
         with RISK_PROCESSING_TIME.time():
-            
-            risk_score = assess_risk(request.image_analysis, request.text_analysis)
-            explanation = generate_explanation(risk_score, request.image_analysis, request.text_analysis)
-            
-            processing_time = time.time() - start_time
-            
-            return RiskResponse(
-                risk_score=risk_score,
-                needs_review=risk_score > 0.6,  
-                explanation=explanation,
-                processing_time=processing_time
-            )
-            
+            response = risk_response(inputs, current_rules(), start_time)
+        if registry_store.candidate is not None:
+            shadow.offer(*inputs, response.risk_score, response.needs_review)
+        return response
     except Exception as e:
         return {"error": f"Risk assessment failed: {str(e)}"}
 
+@app.post("/assess/batch")
+async def assess_risk_batch(request: RiskBatchRequest):
+    """Score many items in one vectorised pass against a single rules snapshot; a failing item gets its own error entry"""
+    start_time = time.time()
+    rules = current_rules()
+    RISK_REQUEST_COUNT.inc(len(request.items))
+    
+    try:
+        items = [rule_inputs(item) for item in request.items]
+        with RISK_PROCESSING_TIME.time():
+            batch = score_batch(items, rules)
+    except Exception as e:
+        return {"error": f"Risk assessment failed: {str(e)}"}
+    
+    processing_time = time.time() - start_time
+    shadowing = registry_store.candidate is not None
+    results = []
+    for inputs, score, needs_review, rules_fired, explanation, error in zip(
+            items, batch.scores.tolist(), batch.needs_review.tolist(), batch.rules_fired(rules.rule_ids),
+            batch.explanations, batch.errors):
+        if error is not None:
+            results.append({"error": error})
+            continue
+        if shadowing:
+            shadow.offer(*inputs, score, needs_review)
+        results.append(RiskResponse(
+            risk_score=score,
+            needs_review=needs_review,
+            explanation=explanation,
+            rules_fired=rules_fired,
+            rules_version=rules.version,
+            lexicon_version=rules.lexicon.version,
+            processing_time=processing_time
+        ))
+    
+    return {"results": results, "processing_time": processing_time}
+
+@app.post("/assess/bounds")
+async def assess_risk_bounds(request: RiskBoundsRequest):
+    """The range /assess can return for any image, so a decision can be made before the image result arrives"""
+    start_time = time.time()
+    
+    try:
+        rules = current_rules()
+        context = request.context_analysis.model_dump() if request.context_analysis is not None else None
+        min_score, max_score = rules.bounds(request.text_analysis.model_dump(), context)
+        return RiskBoundsResponse(
+            min_score=min_score,
+            max_score=max_score,
+            rules_version=rules.version,
+            lexicon_version=rules.lexicon.version,
+            processing_time=time.time() - start_time
+        )
+    except Exception as e:
+        return {"error": f"Risk bounds failed: {str(e)}"}
+
+@app.post("/rules/reload")
+async def reload_rules():
+    """Reload the rules file now instead of waiting for the next poll"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, lambda: rule_store.reload(force=True))
+        return {"status": "reloaded", "rules_version": rule_store.current.version}
+    except Exception as e:
+        return {"error": f"Rules reload failed: {str(e)}", "rules_version": rule_store.current.version}
+
+@app.get("/rules")
+async def list_rules():
+    """The active rule definitions, for explaining rules_fired"""
+    rule_set = active_rule_set()
+    return {
+        "rules_version": rule_set.version,
+        "clamp": list(rule_set.clamp),
+        "rules": [rule.to_dict() for rule in rule_set.rules]
+    }
+
+@app.get("/models")
+async def list_models():
+    """Which rule versions serve traffic and shadow-score it, and where they came from"""
+    loop = asyncio.get_running_loop()
+    return {
+        "active_version": active_rule_set().version,
+        "rules_file_version": rule_store.current.version,
+        "current": await loop.run_in_executor(None, registry.current, 'current'),
+        "candidate": await loop.run_in_executor(None, registry.current, 'candidate')
+    }
+
+@app.post("/models/reload")
+async def reload_models():
+    """Pick up registry changes now instead of waiting for the next poll"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, registry_store.reload)
+        return {"status": "reloaded", **registry_store.versions(), "active_version": active_rule_set().version}
+    except Exception as e:
+        return {"error": f"Registry reload failed: {str(e)}", **registry_store.versions()}
+
+@app.post("/models/promote")
+async def promote_candidate():
+    """Serve the shadow candidate; the swap happens before this returns"""
+    loop = asyncio.get_running_loop()
+    try:
+        pointer = await loop.run_in_executor(None, registry.promote)
+        await loop.run_in_executor(None, registry_store.reload)
+        print(f"✅ Promoted rules {pointer['version']} after shadow stats {shadow.stats()}")
+        return {"status": "promoted", "active_version": active_rule_set().version, "shadow": shadow.stats()}
+    except Exception as e:
+        return {"error": f"Promotion failed: {str(e)}"}
+
+@app.post("/models/withdraw")
+async def withdraw_candidate():
+    """Stop shadow-testing the candidate without promoting it"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(None, registry.withdraw)
+        await loop.run_in_executor(None, registry_store.reload)
+        return {"status": "withdrawn", "active_version": active_rule_set().version}
+    except Exception as e:
+        return {"error": f"Withdrawal failed: {str(e)}"}
+
+@app.get("/shadow")
+async def shadow_stats():
+    """How often the candidate's review decisions agree with the active rules on live traffic"""
+    return {"active_version": active_rule_set().version, **shadow.stats()}
+
+@app.post("/lexicon/reload")
+async def reload_lexicon():
+    """Reload the lexicon file now instead of waiting for the next poll"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, lambda: lexicon_store.reload(force=True))
+        return {"status": "reloaded", "lexicon_version": lexicon_store.current.version}
+    except Exception as e:
+        return {"error": f"Lexicon reload failed: {str(e)}", "lexicon_version": lexicon_store.current.version}
+
 @app.get("/health")
 async def health():
     return {"status": "healthy", "service": "risk-assessment"}
@@ -0,0 +1,100 @@
+import asyncio
+import random
+from collections import deque
+from typing import Callable, Optional
+from prometheus_client import Counter, Gauge
+
+from batch_scoring import score_batch
+
+
+SHADOW_COMPARISONS = Counter('risk_shadow_comparisons_total', 'Shadow-scored requests, by review decision agreement',
+                             ['outcome'])
+SHADOW_DROPPED = Counter('risk_shadow_dropped_total', 'Requests dropped from the full shadow queue')
+SHADOW_AGREEMENT = Gauge('risk_shadow_agreement_rate', 'Review decision agreement of the candidate with the active rules')
+
+
+class ShadowScorer:
+    """Scores live traffic with the candidate rules, off the request path.
+
+    A request only appends its inputs and the active decision to a bounded
+    queue (``offer``); ``run`` drains it in batches, scores them with the
+    candidate in a worker thread and compares review decisions and scores.
+    When the queue is full the oldest entries are dropped rather than
+    slowing requests down. Counts start over whenever the candidate
+    version changes.
+    """
+
+    def __init__(self, max_queue: int = 10000, sample_rate: float = 1.0, batch_size: int = 256):
+        self.sample_rate = sample_rate
+        self.batch_size = batch_size
+        self.queue = deque(maxlen=max_queue)
+        self._reset(None)
+
+    def _reset(self, version: Optional[str]):
+        self.version = version
+        self.compared = 0
+        self.agreed = 0
+        self.score_diff_sum = 0.0
+        self.dropped = 0
+        self.errors = 0
+
+    def offer(self, image: dict, text: dict, context: Optional[dict], score: float, needs_review: bool):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+            SHADOW_DROPPED.inc()
+        self.queue.append((image, text, context, score, needs_review))
+
+    def _take(self) -> list:
+        batch = []
+        while self.queue and len(batch) < self.batch_size:
+            batch.append(self.queue.popleft())
+        return batch
+
+    async def run(self, candidate_rules: Callable, interval: float = 0.5):
+        """Drain the queue forever; ``candidate_rules`` returns the compiled candidate, or None"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                rules = candidate_rules()
+                if rules is None:
+                    self.queue.clear()
+                    continue
+                if rules.version != self.version:
+                    self._reset(rules.version)
+                while self.queue:
+                    batch = self._take()
+                    scores = await loop.run_in_executor(
+                        None, score_batch, [inputs[:3] for inputs in batch], rules
+                    )
+                    self._compare(batch, scores)
+            except Exception as e:
+                print(f"❌ Shadow scoring failed: {e}")
+
+    def _compare(self, batch: list, scores):
+        for (_, _, _, score, needs_review), candidate_score, candidate_review, error in zip(
+                batch, scores.scores.tolist(), scores.needs_review.tolist(), scores.errors):
+            if error is not None:
+                self.errors += 1
+                continue
+            agree = candidate_review == needs_review
+            self.compared += 1
+            self.agreed += agree
+            self.score_diff_sum += abs(candidate_score - score)
+            SHADOW_COMPARISONS.labels(outcome='agree' if agree else 'disagree').inc()
+        if self.compared:
+            SHADOW_AGREEMENT.set(self.agreed / self.compared)
+
+    def stats(self) -> dict:
+        return {
+            "candidate_version": self.version,
+            "compared": self.compared,
+            "agreed": self.agreed,
+            "agreement_rate": self.agreed / self.compared if self.compared else None,
+            "mean_abs_score_diff": self.score_diff_sum / self.compared if self.compared else None,
+            "queued": len(self.queue),
+            "dropped": self.dropped,
+            "errors": self.errors
+        }
@@ -1,14 +1,28 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 import boto3
+import asyncio
+import hashlib
+from botocore.config import Config
+import os
 import time
 from prometheus_client import Counter, Histogram, generate_latest
-
-app = FastAPI(title="Text Analysis Service")
+from crossmodal.concurrency import BoundedExecutor, Overloaded
+from crossmodal.cache import ResultCache
+from crossmodal.lexicon import LexiconStore
+from batching import COMPREHEND_CALLS, DocumentError, SentimentBatcher, combine_sentiments, split_text
+from language import detect_language
+from local_sentiment import LocalSentimentStore, SampleLog, confidence_band
 
 
 TEXT_REQUEST_COUNT = Counter('text_requests_total', 'Total text analysis requests')
 TEXT_PROCESSING_TIME = Histogram('text_processing_seconds', 'Text processing time')
+TEXT_THROTTLED_COUNT = Counter('text_throttled_total', 'Text requests rejected because the AWS concurrency limit was reached')
+TEXT_LANGUAGES = Counter('text_languages_total', 'Texts analysed, by the language they were routed to', ['language'])
+TEXT_CHUNKS = Histogram('text_chunks', 'Comprehend-sized chunks per text', buckets=(1, 2, 3, 5, 10, 20))
+LOCAL_SENTIMENT_COUNT = Counter('text_local_sentiment_total', 'Texts the local sentiment model was used for, by outcome', ['outcome'])
+LOCAL_SENTIMENT_AGREEMENT = Counter('text_local_sentiment_comparisons_total', 'Local predictions checked against Comprehend, by agreement and local confidence band', ['agreed', 'confidence'])
 
 class TextRequest(BaseModel):
     text_content: str
@@ -16,37 +30,187 @@ class TextRequest(BaseModel):
 class TextResponse(BaseModel):
     sentiment: str
     unsafe_found: list
+    unsafe_matches: list = []
+    safe_found: list = []
     sentiment_scores: dict
+    language: str = "en"
+    # "local" when the in-process model answered instead of Comprehend
+    sentiment_source: str = "comprehend"
+    lexicon_version: str
     processing_time: float
 
 
-UNSAFE_WORDS = {
-    'kill', 'murder', 'bomb', 'terrorist', 'weapon', 'gun', 'attack', 
-    'racist', 'hate', 'porn', 'violent', 'protest', 'riot', 'assault',
-    'weapons', 'violence', 'harm', 'danger', 'threat', 'death', 'dead',
-    'suicide', 'bombing', 'explosion', 'shoot', 'shooting', 'hostage',
-    'terrorism', 'extremist', 'radical', 'abuse', 'assault', 'rape',
-    'pedophile', 'child abuse', 'molest', 'blackmail', 'extortion'
-}
+# Unsafe/safe word lists come from the shared versioned lexicon file and are
+# hot-swapped when it changes, see crossmodal.lexicon
+lexicon_store = LexiconStore()
+LEXICON_RELOAD_INTERVAL = float(os.getenv("LEXICON_RELOAD_INTERVAL", "30"))
+
+
+AWS_MAX_CONCURRENCY = int(os.getenv("AWS_MAX_CONCURRENCY", "16"))
+AWS_RETRY_AFTER_SECONDS = int(os.getenv("AWS_RETRY_AFTER_SECONDS", "1"))
+
+aws_executor = BoundedExecutor(AWS_MAX_CONCURRENCY, retry_after=AWS_RETRY_AFTER_SECONDS, name="comprehend")
+
+comprehend = boto3.client(
+    'comprehend',
+    region_name='us-east-1',
+    config=Config(max_pool_connections=aws_executor.max_workers)
+)
+
+# Concurrent texts are coalesced into batch_detect_sentiment calls of up to
+# COMPREHEND_BATCH_SIZE documents per language, waiting at most
+# COMPREHEND_BATCH_WINDOW_MS for a batch to fill, see batching.py. With
+# COMPREHEND_BATCHING=false each text gets its own detect_sentiment call
+COMPREHEND_BATCHING = os.getenv("COMPREHEND_BATCHING", "true").lower() == "true"
+COMPREHEND_BATCH_SIZE = int(os.getenv("COMPREHEND_BATCH_SIZE", "25"))
+COMPREHEND_BATCH_WINDOW_MS = float(os.getenv("COMPREHEND_BATCH_WINDOW_MS", "10"))
+# Language code for texts whose language can't be told or has no Comprehend sentiment model
+TEXT_DEFAULT_LANGUAGE = os.getenv("TEXT_DEFAULT_LANGUAGE", "en")
+
+# A batch call carries up to COMPREHEND_BATCH_SIZE texts, so admission
+# counts queued texts against that many per concurrent call
+sentiment_batcher = SentimentBatcher(
+    comprehend, aws_executor, batch_size=COMPREHEND_BATCH_SIZE, window=COMPREHEND_BATCH_WINDOW_MS / 1000,
+    max_pending=AWS_MAX_CONCURRENCY * COMPREHEND_BATCH_SIZE
+) if COMPREHEND_BATCHING else None
+
+# Comprehend results keyed by the SHA-256 of the normalized text
+result_cache = ResultCache.from_env("text")
 
+# In-process sentiment model (local_sentiment.py), used per LOCAL_SENTIMENT_MODE:
+#   off         Comprehend only
+#   shadow      Comprehend answers; the local prediction is only compared with it
+#   fallback    Comprehend answers; the local model does when Comprehend fails or throttles
+#   first_pass  the local model answers when at least LOCAL_SENTIMENT_MIN_CONFIDENCE
+#               sure, Comprehend otherwise (and the local model if Comprehend fails)
+# Only texts in the model's languages use it. Agreement with Comprehend is
+# counted whenever both ran. LOCAL_SENTIMENT_SAMPLES_PATH, if set, collects
+# texts with Comprehend's labels to train the model on
+LOCAL_SENTIMENT_MODES = ("off", "shadow", "fallback", "first_pass")
+LOCAL_SENTIMENT_MODE = os.getenv("LOCAL_SENTIMENT_MODE", "off").lower()
+LOCAL_SENTIMENT_MIN_CONFIDENCE = float(os.getenv("LOCAL_SENTIMENT_MIN_CONFIDENCE", "0.9"))
+LOCAL_SENTIMENT_SAMPLES_PATH = os.getenv("LOCAL_SENTIMENT_SAMPLES_PATH", "")
+if LOCAL_SENTIMENT_MODE not in LOCAL_SENTIMENT_MODES:
+    raise ValueError(f"LOCAL_SENTIMENT_MODE must be one of: {', '.join(LOCAL_SENTIMENT_MODES)}")
 
-comprehend = boto3.client('comprehend', region_name='us-east-1')
+local_sentiment_store = None
+if LOCAL_SENTIMENT_MODE != "off":
+    try:
+        local_sentiment_store = LocalSentimentStore()
+    except FileNotFoundError as e:
+        print(f"⚠️ Local sentiment model not found, running with Comprehend only: {e}")
+sample_log = SampleLog(LOCAL_SENTIMENT_SAMPLES_PATH) if LOCAL_SENTIMENT_SAMPLES_PATH else None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    lexicon_watcher = asyncio.create_task(lexicon_store.watch(LEXICON_RELOAD_INTERVAL))
+    model_watcher = None
+    if local_sentiment_store is not None:
+        model_watcher = asyncio.create_task(local_sentiment_store.watch(LEXICON_RELOAD_INTERVAL))
+        print(f"✅ Local sentiment model {local_sentiment_store.current.version} in {LOCAL_SENTIMENT_MODE} mode")
+    yield
+    lexicon_watcher.cancel()
+    if model_watcher is not None:
+        model_watcher.cancel()
+    if sentiment_batcher is not None:
+        await sentiment_batcher.flush()
+    aws_executor.shutdown()
+    await result_cache.close()
+    if sample_log is not None:
+        sample_log.close()
+
+app = FastAPI(title="Text Analysis Service", lifespan=lifespan)
+
+def text_cache_key(text: str) -> str:
+    """Copy-pasted captions differing only in case or whitespace share one key"""
+    normalized = ' '.join(text.casefold().split())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
 
-def analyze_text(text):
-    """EXACT COPY FROM YOUR LAMBDA - Text analysis logic"""
-    sentiment = comprehend.detect_sentiment(Text=text, LanguageCode='en')
-    text_lower = text.lower()
+async def detect_sentiment(text):
+    """Sentiment for the text: from the result cache when seen before, else from Comprehend or the local model"""
+    cache_key = text_cache_key(text)
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        return cached
     
+    language = detect_language(text, TEXT_DEFAULT_LANGUAGE)
+    TEXT_LANGUAGES.labels(language=language).inc()
+    local = local_prediction(text, language)
+    if local is not None and LOCAL_SENTIMENT_MODE == "first_pass":
+        if local['Confidence'] >= LOCAL_SENTIMENT_MIN_CONFIDENCE:
+            LOCAL_SENTIMENT_COUNT.labels(outcome='served').inc()
+            return local
+        LOCAL_SENTIMENT_COUNT.labels(outcome='escalated').inc()
     
-    unsafe_found = []
-    for word in UNSAFE_WORDS:
-        if f' {word} ' in f' {text_lower} ':
-            unsafe_found.append(word)
+    try:
+        sentiment = await comprehend_sentiment(text, language)
+    except Exception as e:
+        if local is None or LOCAL_SENTIMENT_MODE == "shadow":
+            raise
+        # Not cached, so Comprehend is asked again once it recovers
+        LOCAL_SENTIMENT_COUNT.labels(outcome='fallback').inc()
+        print(f"⚠️ Comprehend failed, using the local sentiment model: {e}")
+        return local
+    
+    if local is not None:
+        agreed = local['Sentiment'] == sentiment['Sentiment']
+        LOCAL_SENTIMENT_AGREEMENT.labels(agreed=str(agreed).lower(), confidence=confidence_band(local['Confidence'])).inc()
+    if sample_log is not None:
+        await asyncio.get_running_loop().run_in_executor(None, sample_log.add, text, sentiment['Sentiment'], language)
+    await result_cache.set(cache_key, sentiment)
+    return sentiment
+
+def local_prediction(text: str, language: str):
+    """The local model's sentiment, or None when it is off or wasn't trained on the language"""
+    if local_sentiment_store is None:
+        return None
+    model = local_sentiment_store.current
+    if language not in model.languages:
+        LOCAL_SENTIMENT_COUNT.labels(outcome='unsupported_language').inc()
+        return None
+    return {**model.predict(text), 'LanguageCode': language, 'Source': 'local'}
+
+async def comprehend_sentiment(text: str, language: str) -> dict:
+    """Comprehend sentiment for the text in ``language``"""
+    # Comprehend rejects documents over 5,000 bytes; longer texts are scored in pieces
+    chunks = split_text(text)
+    TEXT_CHUNKS.observe(len(chunks))
+    
+    if sentiment_batcher is not None:
+        results = await asyncio.gather(*(sentiment_batcher.detect(chunk, language) for chunk in chunks))
+    else:
+        with aws_executor.admit():
+            results = await asyncio.gather(*(detect_chunk_sentiment(chunk, language) for chunk in chunks))
+    
+    sentiment = combine_sentiments(results, [len(chunk.encode('utf-8')) for chunk in chunks])
+    return {**sentiment, 'LanguageCode': language}
+
+async def detect_chunk_sentiment(chunk: str, language: str) -> dict:
+    """One detect_sentiment call, for when batching is off"""
+    COMPREHEND_CALLS.labels(api='detect_sentiment', language=language).inc()
+    response = await aws_executor.run(comprehend.detect_sentiment, Text=chunk, LanguageCode=language)
+    return {
+        'Sentiment': response['Sentiment'],
+        'SentimentScore': response['SentimentScore']
+    }
+
+async def analyze_text(text):
+    """Text analysis logic from your Lambda, with the Comprehend call run off the event loop"""
+    lexicon = lexicon_store.current
+    sentiment = await detect_sentiment(text)
+    
+    unsafe_matches = lexicon.unsafe_matcher.find_all(text)
     
     return {
         'sentiment': sentiment['Sentiment'],
-        'unsafe_found': unsafe_found,
-        'sentiment_scores': sentiment['SentimentScore']
+        'unsafe_found': list(dict.fromkeys(match.term for match in unsafe_matches)),
+        'unsafe_matches': [match._asdict() for match in unsafe_matches],
+        'safe_found': lexicon.safe_matcher.matched_terms(text),
+        'sentiment_scores': sentiment['SentimentScore'],
+        # Results cached before language routing were all scored as English
+        'language': sentiment.get('LanguageCode', 'en'),
+        'sentiment_source': sentiment.get('Source', 'comprehend'),
+        'lexicon_version': lexicon.version
     }
 
 @app.post("/analyze")
@@ -57,23 +221,54 @@ async def analyze_text_endpoint(request: TextRequest):
     try:
         with TEXT_PROCESSING_TIME.time():
             
-            text_result = analyze_text(request.text_content)
+            text_result = await analyze_text(request.text_content)
             
             processing_time = time.time() - start_time
             
             return TextResponse(
                 sentiment=text_result['sentiment'],
                 unsafe_found=text_result['unsafe_found'],
+                unsafe_matches=text_result['unsafe_matches'],
+                safe_found=text_result['safe_found'],
                 sentiment_scores=text_result['sentiment_scores'],
+                language=text_result['language'],
+                sentiment_source=text_result['sentiment_source'],
+                lexicon_version=text_result['lexicon_version'],
                 processing_time=processing_time
             )
             
-    except Exception as e:
+    except Overloaded as e:
+        TEXT_THROTTLED_COUNT.inc()
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+    except DocumentError as e:
+        # Comprehend rejected this text; the service itself is fine
         return {"error": f"Text processing failed: {str(e)}"}
+    except Exception as e:
+        # Comprehend (or the service) failing is a 502, so callers' circuit breakers see it
+        raise HTTPException(status_code=502, detail=f"Text processing failed: {str(e)}")
+
+@app.post("/lexicon/reload")
+async def reload_lexicon():
+    """Reload the lexicon file now instead of waiting for the next poll"""
+    try:
+        await asyncio.get_running_loop().run_in_executor(None, lambda: lexicon_store.reload(force=True))
+        return {"status": "reloaded", "lexicon_version": lexicon_store.current.version}
+    except Exception as e:
+        return {"error": f"Lexicon reload failed: {str(e)}", "lexicon_version": lexicon_store.current.version}
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "text-analysis"}
+    model = local_sentiment_store.current if local_sentiment_store is not None else None
+    return {
+        "status": "healthy",
+        "service": "text-analysis",
+        "local_sentiment": {
+            "mode": LOCAL_SENTIMENT_MODE if model is not None else "off",
+            "version": model and model.version,
+            "languages": model and sorted(model.languages),
+            "min_confidence": LOCAL_SENTIMENT_MIN_CONFIDENCE
+        }
+    }
 
 @app.get("/metrics")
 async def metrics():
@@ -0,0 +1,143 @@
+import asyncio
+from typing import Dict, List
+from prometheus_client import Counter, Histogram
+from crossmodal.concurrency import BoundedExecutor, Overloaded
+
+
+COMPREHEND_BATCH_DOCUMENTS = Histogram('comprehend_batch_documents', 'Documents per batch_detect_sentiment call',
+                                       buckets=(1, 2, 5, 10, 15, 20, 25))
+COMPREHEND_CALLS = Counter('comprehend_calls_total', 'Comprehend sentiment API calls', ['api', 'language'])
+COMPREHEND_DOCUMENT_ERRORS = Counter('comprehend_document_errors_total', 'Documents Comprehend returned an error for', ['code'])
+
+# Per-document limits of detect_sentiment and batch_detect_sentiment
+COMPREHEND_MAX_BYTES = 5000
+COMPREHEND_MAX_BATCH = 25
+
+SENTENCE_ENDS = ".!?。！？\n"
+
+
+class DocumentError(Exception):
+    """One document of a batch call was rejected; the rest of the batch is unaffected"""
+
+
+def split_text(text: str, max_bytes: int = COMPREHEND_MAX_BYTES) -> List[str]:
+    """Split ``text`` into pieces of at most ``max_bytes`` UTF-8 bytes each.
+
+    Cuts at the last sentence end in the second half of each piece, else
+    the last whitespace there, else mid-word (never mid-character).
+    """
+    encoded = text.encode('utf-8')
+    if len(encoded) <= max_bytes:
+        return [text]
+    chunks, position = [], 0
+    while len(encoded) - position > max_bytes:
+        window = encoded[position:position + max_bytes].decode('utf-8', 'ignore')
+        half = len(window) // 2
+        cut = max(window.rfind(end, half) for end in SENTENCE_ENDS) + 1
+        if not cut:
+            cut = max(window.rfind(' ', half), window.rfind('\t', half)) + 1 or len(window)
+        piece = window[:cut]
+        position += len(piece.encode('utf-8'))
+        if piece.strip():
+            chunks.append(piece)
+    rest = encoded[position:].decode('utf-8')
+    if rest.strip() or not chunks:
+        chunks.append(rest)
+    return chunks
+
+
+def combine_sentiments(results: List[dict], weights: List[int]) -> dict:
+    """One sentiment for a text from its chunks': scores averaged by chunk size, label from the top score"""
+    if len(results) == 1:
+        return results[0]
+    total = sum(weights)
+    scores = {
+        name: sum(result['SentimentScore'][name] * weight for result, weight in zip(results, weights)) / total
+        for name in results[0]['SentimentScore']
+    }
+    return {'Sentiment': max(scores, key=scores.get).upper(), 'SentimentScore': scores}
+
+
+class SentimentBatcher:
+    """Coalesces concurrent sentiment requests into batch_detect_sentiment calls.
+
+    ``detect`` queues a document under its language code. A language's
+    queue is sent as one call when it reaches ``batch_size`` documents or
+    ``window`` seconds after its first document arrived, whichever is
+    first. Calls run on ``executor``'s thread pool, so at most its
+    ``max_workers`` are in flight. Admission counts documents rather than
+    requests: ``detect`` raises ``Overloaded`` once ``max_pending`` are
+    queued or in flight. Everything but the calls runs on the event loop.
+    """
+
+    def __init__(self, client, executor: BoundedExecutor, batch_size: int = COMPREHEND_MAX_BATCH,
+                 window: float = 0.01, max_pending: int = 400):
+        self.client = client
+        self.executor = executor
+        self.batch_size = min(batch_size, COMPREHEND_MAX_BATCH)
+        self.window = window
+        self.max_pending = max_pending
+        self.pending = 0
+        self._queues: Dict[str, list] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._calls = set()
+
+    async def detect(self, text: str, language: str) -> dict:
+        if self.pending >= self.max_pending:
+            raise Overloaded(self.executor.retry_after)
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault(language, [])
+        queue.append((text, future))
+        if len(queue) >= self.batch_size:
+            self._send(language)
+        elif len(queue) == 1:
+            self._timers[language] = asyncio.get_running_loop().call_later(self.window, self._send, language)
+        self.pending += 1
+        try:
+            return await future
+        finally:
+            self.pending -= 1
+
+    def _send(self, language: str):
+        timer = self._timers.pop(language, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._queues.pop(language, None)
+        if batch:
+            call = asyncio.create_task(self._call(language, batch))
+            # The loop only keeps weak references to tasks
+            self._calls.add(call)
+            call.add_done_callback(self._calls.discard)
+
+    async def _call(self, language: str, batch: list):
+        COMPREHEND_BATCH_DOCUMENTS.observe(len(batch))
+        COMPREHEND_CALLS.labels(api='batch_detect_sentiment', language=language).inc()
+        try:
+            response = await self.executor.run(
+                self.client.batch_detect_sentiment, TextList=[text for text, _ in batch], LanguageCode=language
+            )
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for result in response.get('ResultList', []):
+            future = batch[result['Index']][1]
+            if not future.done():
+                future.set_result({'Sentiment': result['Sentiment'], 'SentimentScore': result['SentimentScore']})
+        for error in response.get('ErrorList', []):
+            COMPREHEND_DOCUMENT_ERRORS.labels(code=error['ErrorCode']).inc()
+            future = batch[error['Index']][1]
+            if not future.done():
+                future.set_exception(DocumentError(f"{error['ErrorCode']}: {error['ErrorMessage']}"))
+        for _, future in batch:
+            if not future.done():
+                future.set_exception(DocumentError("Missing from the batch_detect_sentiment response"))
+
+    async def flush(self):
+        """Send whatever is queued now and wait for every call in flight"""
+        for language in list(self._queues):
+            self._send(language)
+        if self._calls:
+            await asyncio.gather(*self._calls, return_exceptions=True)
@@ -0,0 +1,78 @@
+import re
+from collections import Counter
+from typing import Optional
+
+
+# Languages Comprehend's sentiment API accepts
+COMPREHEND_LANGUAGES = {"en", "es", "fr", "de", "it", "pt", "ar", "hi", "ja", "ko", "zh", "zh-TW"}
+
+# Characters looked at per text; a few thousand settle the language of anything longer
+SAMPLE_CHARS = 4096
+
+# High-frequency function words per Latin-script language. Words several
+# languages share score for all of them and cancel out; the rest decide
+FUNCTION_WORDS = {
+    "en": "the and is are was were to of in that it you this with for not have be on my me what so just but they we at i",
+    "es": "el la los las que y es en un una por con para no se lo del al muy pero está como más yo mi este esta son",
+    "fr": "le la les des et est un une du que en pas pour avec je il elle nous vous ce cette sur dans mais très qui au",
+    "de": "der die das und ist nicht ein eine ich du sie wir mit auf für den dem zu es sehr auch aber von wie war sind",
+    "it": "il lo la gli le e è di che un una non per con sono mi ti questo questa molto ma anche della del ho come",
+    "pt": "o a os as e é de que um uma não para com do da em no na muito mas eu você isso esse está são meu",
+}
+FUNCTION_WORDS = {language: set(words.split()) for language, words in FUNCTION_WORDS.items()}
+
+# Characters written differently in traditional and simplified Chinese, pairwise
+TRADITIONAL = set("們這個說國時會來對為與學愛還點麼開關題經發現長見從讓東車樣電話書氣體過當給應")
+SIMPLIFIED = set("们这个说国时会来对为与学爱还点么开关题经发现长见从让东车样电话书气体过当给应")
+
+WORD = re.compile(r"[^\W\d_]+")
+
+
+def script(char: str) -> Optional[str]:
+    """The writing system of a letter, by Unicode block"""
+    code = ord(char)
+    if code < 0x250:
+        return "latin" if char.isalpha() else None
+    if 0x600 <= code <= 0x6FF or 0x750 <= code <= 0x77F or 0xFB50 <= code <= 0xFEFF:
+        return "arabic"
+    if 0x900 <= code <= 0x97F:
+        return "devanagari"
+    if 0x3040 <= code <= 0x30FF:
+        return "kana"
+    if 0xAC00 <= code <= 0xD7A3 or 0x1100 <= code <= 0x11FF or 0x3130 <= code <= 0x318F:
+        return "hangul"
+    if 0x4E00 <= code <= 0x9FFF or 0x3400 <= code <= 0x4DBF:
+        return "han"
+    return "other" if char.isalpha() else None
+
+
+def detect_language(text: str, default: str = "en") -> str:
+    """Comprehend language code for ``text``, worked out locally from its script and function words.
+
+    Non-Latin scripts map straight to their language (Han with any kana
+    is Japanese; Han is zh-TW when traditional forms outnumber simplified
+    ones). Latin text goes to the language whose function words it uses
+    most. ``default`` is returned when nothing decides it, and for scripts
+    Comprehend has no sentiment model for.
+    """
+    sample = text[:SAMPLE_CHARS]
+    scripts = Counter(filter(None, map(script, sample)))
+    if not scripts:
+        return default
+    dominant = scripts.most_common(1)[0][0]
+
+    if dominant in ("han", "kana"):
+        if scripts["kana"]:
+            return "ja"
+        traditional = sum(char in TRADITIONAL for char in sample)
+        simplified = sum(char in SIMPLIFIED for char in sample)
+        return "zh-TW" if traditional > simplified else "zh"
+    if dominant != "latin":
+        return {"arabic": "ar", "devanagari": "hi", "hangul": "ko"}.get(dominant, default)
+
+    words = WORD.findall(sample.lower())
+    hits = {language: sum(word in vocabulary for word in words) for language, vocabulary in FUNCTION_WORDS.items()}
+    best = max(hits.values())
+    if not best or hits.get(default) == best:
+        return default
+    return max(hits, key=hits.get)
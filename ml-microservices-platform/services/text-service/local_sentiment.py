@@ -0,0 +1,231 @@
+"""In-process sentiment model: a linear classifier over hashed word n-grams.
+
+Trained offline from texts Comprehend has already labelled (see
+``SampleLog``), so its predictions can be checked against Comprehend's
+and it can stand in for it. Train a model with:
+
+    python local_sentiment.py samples.jsonl --output data/sentiment-model.npz [--languages en]
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import zlib
+from datetime import datetime
+from typing import List, Optional, Tuple
+import numpy as np
+from crossmodal.reloading import ReloadingFileStore
+
+
+# Comprehend's labels, in the order of the model's output columns
+CLASSES = ('POSITIVE', 'NEGATIVE', 'NEUTRAL', 'MIXED')
+DIMENSIONS = 2 ** 18
+# Characters featurized per text; past this the prefix decides
+MAX_CHARS = 10000
+# Confidence bands the agreement with Comprehend is reported in
+CONFIDENCE_BANDS = (0.5, 0.7, 0.8, 0.9, 0.95)
+
+TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+def ngrams(text: str) -> List[str]:
+    """Lowercased words and punctuation/emoji, their bigrams, and a length bucket"""
+    tokens = TOKEN.findall(text[:MAX_CHARS].lower())
+    grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    # Never empty, which the training loop relies on
+    grams.append(f"<length {len(tokens).bit_length()}>")
+    return grams
+
+
+def featurize(text: str, dimensions: int = DIMENSIONS) -> Tuple[np.ndarray, np.ndarray]:
+    """Hashed feature indices and their (unit-norm) values; CRC32 is stable across processes, hash() is not"""
+    indices = np.array([zlib.crc32(gram.encode('utf-8')) for gram in ngrams(text)], dtype=np.int64) % dimensions
+    values = np.full(len(indices), 1 / np.sqrt(len(indices)), dtype=np.float32)
+    return indices, values
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+def confidence_band(confidence: float) -> str:
+    band = max((edge for edge in CONFIDENCE_BANDS if confidence >= edge), default=0.0)
+    return f"{band:g}"
+
+
+class SentimentModel:
+    """Multinomial logistic regression over hashed n-grams, for the languages it was trained on"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, version: str, languages: List[str],
+                 metrics: Optional[dict] = None):
+        self.weights = weights
+        self.bias = bias
+        self.dimensions = weights.shape[0]
+        self.version = version
+        self.languages = set(languages)
+        self.metrics = metrics or {}
+
+    def predict(self, text: str) -> dict:
+        """Comprehend-shaped sentiment for ``text``, plus ``Confidence``, the top score"""
+        indices, values = featurize(text, self.dimensions)
+        scores = softmax(values @ self.weights[indices] + self.bias)
+        best = int(np.argmax(scores))
+        return {
+            'Sentiment': CLASSES[best],
+            'SentimentScore': {name.capitalize(): float(score) for name, score in zip(CLASSES, scores)},
+            'Confidence': float(scores[best])
+        }
+
+    @classmethod
+    def load(cls, path: str) -> 'SentimentModel':
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if tuple(meta['classes']) != CLASSES:
+                raise ValueError(f"{path} has classes {meta['classes']}, expected {list(CLASSES)}")
+            return cls(data['weights'], data['bias'], meta['version'], meta['languages'], meta.get('metrics'))
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = {'version': self.version, 'languages': sorted(self.languages), 'classes': list(CLASSES),
+                'metrics': self.metrics}
+        # np.savez adds .npz to names without it
+        temporary = f"{path}.tmp.npz"
+        np.savez(temporary, weights=self.weights, bias=self.bias, meta=np.array(json.dumps(meta)))
+        os.replace(temporary, path)
+
+    @classmethod
+    def train(cls, texts: List[str], labels: List[str], languages: List[str], dimensions: int = DIMENSIONS,
+              epochs: int = 5, learning_rate: float = 0.5, l2: float = 1e-6, batch_size: int = 256,
+              seed: int = 0) -> 'SentimentModel':
+        """Fit by minibatch AdaGrad on the cross-entropy; only the rows a batch touches are updated"""
+        rows = [featurize(text, dimensions) for text in texts]
+        lengths = np.array([len(indices) for indices, _ in rows])
+        offsets = np.cumsum(lengths) - lengths
+        all_indices = np.concatenate([indices for indices, _ in rows])
+        all_values = np.concatenate([values for _, values in rows])
+        targets = np.array([CLASSES.index(label) for label in labels])
+
+        weights = np.zeros((dimensions, len(CLASSES)), dtype=np.float32)
+        bias = np.zeros(len(CLASSES), dtype=np.float32)
+        weights_sq = np.zeros_like(weights)
+        bias_sq = np.zeros_like(bias)
+        rng = np.random.default_rng(seed)
+
+        for _ in range(epochs):
+            order = rng.permutation(len(texts))
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                batch_lengths = lengths[batch]
+                row_starts = np.cumsum(batch_lengths) - batch_lengths
+                positions = np.repeat(offsets[batch] - row_starts, batch_lengths) + np.arange(batch_lengths.sum())
+                indices, values = all_indices[positions], all_values[positions]
+                contributions = weights[indices] * values[:, None]
+
+                gradient = softmax(np.add.reduceat(contributions, row_starts) + bias)
+                gradient[np.arange(len(batch)), targets[batch]] -= 1
+                gradient /= len(batch)
+
+                touched, inverse = np.unique(indices, return_inverse=True)
+                row_gradient = values[:, None] * np.repeat(gradient, batch_lengths, axis=0)
+                weight_gradient = np.stack([np.bincount(inverse, weights=row_gradient[:, c], minlength=len(touched))
+                                            for c in range(len(CLASSES))], axis=1) + l2 * weights[touched]
+                weights_sq[touched] += weight_gradient ** 2
+                weights[touched] -= learning_rate * weight_gradient / (np.sqrt(weights_sq[touched]) + 1e-8)
+                bias_gradient = gradient.sum(axis=0)
+                bias_sq += bias_gradient ** 2
+                bias -= learning_rate * bias_gradient / (np.sqrt(bias_sq) + 1e-8)
+
+        version = f"local-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+        return cls(weights, bias, version, languages)
+
+    def evaluate(self, texts: List[str], labels: List[str]) -> dict:
+        """Agreement with ``labels`` overall, and coverage/agreement at each confidence threshold"""
+        predictions = [self.predict(text) for text in texts]
+        agreed = np.array([p['Sentiment'] == label for p, label in zip(predictions, labels)])
+        confidence = np.array([p['Confidence'] for p in predictions])
+        thresholds = {}
+        for edge in CONFIDENCE_BANDS:
+            covered = confidence >= edge
+            thresholds[f"{edge:g}"] = {
+                'coverage': round(float(covered.mean()), 4),
+                'agreement': round(float(agreed[covered].mean()), 4) if covered.any() else None
+            }
+        return {'examples': len(texts), 'agreement': round(float(agreed.mean()), 4), 'by_min_confidence': thresholds}
+
+
+class LocalSentimentStore(ReloadingFileStore):
+    """Holds the active SentimentModel and hot-swaps it when the model file is replaced"""
+
+    loader = SentimentModel.load
+    path_env = "LOCAL_SENTIMENT_MODEL"
+    default_path = "data/sentiment-model.npz"
+    label = "Local sentiment model"
+
+
+class SampleLog:
+    """Appends texts with Comprehend's sentiment to a JSON-lines file, as training data for the local model"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def add(self, text: str, sentiment: str, language: str):
+        line = json.dumps({'text': text, 'sentiment': sentiment, 'language': language}, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read_samples(path: str, languages: List[str]) -> Tuple[List[str], List[str]]:
+    texts, labels = [], []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            sample = json.loads(line)
+            if sample.get('language', 'en') in languages and sample['sentiment'] in CLASSES:
+                texts.append(sample['text'])
+                labels.append(sample['sentiment'])
+    return texts, labels
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the local sentiment model from labelled samples")
+    parser.add_argument('samples', help="JSON lines with text, sentiment and (optionally) language")
+    parser.add_argument('--output', default=LocalSentimentStore.default_path)
+    parser.add_argument('--languages', default='en', help="Comma-separated language codes to train on")
+    parser.add_argument('--epochs', type=int, default=5)
+    parser.add_argument('--dimensions', type=int, default=DIMENSIONS)
+    parser.add_argument('--holdout', type=float, default=0.2)
+    args = parser.parse_args()
+
+    languages = args.languages.split(',')
+    texts, labels = read_samples(args.samples, languages)
+    if not texts:
+        raise SystemExit(f"❌ No samples in {', '.join(languages)} in {args.samples}")
+    # Held out by text hash, so retraining on a grown file keeps the same texts held out
+    held_out = [zlib.crc32(text.encode('utf-8')) % 1000 < args.holdout * 1000 for text in texts]
+    train_set = [(t, l) for t, l, h in zip(texts, labels, held_out) if not h]
+    test_set = [(t, l) for t, l, h in zip(texts, labels, held_out) if h]
+    if not train_set:
+        raise SystemExit(f"❌ All {len(texts)} samples were held out; add samples or lower --holdout")
+
+    model = SentimentModel.train(*map(list, zip(*train_set)), languages=languages, dimensions=args.dimensions,
+                                 epochs=args.epochs)
+    if test_set:
+        model.metrics = model.evaluate(*map(list, zip(*test_set)))
+    model.metrics['trained_on'] = len(train_set)
+    model.save(args.output)
+    print(f"✅ {model.version} written to {args.output}")
+    print(json.dumps(model.metrics, indent=2))
+
+
+if __name__ == "__main__":
+    main()
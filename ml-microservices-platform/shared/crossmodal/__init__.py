@@ -0,0 +1,5 @@
+"""Code shared by the cross-modal moderation services.
+
+Each service image copies this package next to its own app.py, so modules
+are imported as ``from crossmodal.<module> import ...``.
+"""
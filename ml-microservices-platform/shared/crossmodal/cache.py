@@ -0,0 +1,130 @@
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Optional
+from prometheus_client import Counter
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+
+CACHE_HITS = Counter('result_cache_hits_total', 'Result cache hits', ['cache', 'tier'])
+CACHE_MISSES = Counter('result_cache_misses_total', 'Result cache misses', ['cache'])
+CACHE_EVICTIONS = Counter('result_cache_evictions_total', 'Result cache evictions', ['cache', 'reason'])
+
+
+class LRUCache:
+    """In-process LRU of serialised results, bounded by entry count, total bytes and TTL"""
+
+    def __init__(self, name: str, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.total_bytes = 0
+        # key -> (expires_at, size_bytes, raw)
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, raw = entry
+        if expires_at < time.monotonic():
+            self._remove(key, "expired")
+            return None
+        self._entries.move_to_end(key)
+        return raw
+
+    def set(self, key: str, raw: str, size_bytes: int):
+        if size_bytes > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, size_bytes, raw)
+        self.total_bytes += size_bytes
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest, "size")
+
+    def _remove(self, key: str, reason: Optional[str]):
+        _, size_bytes, _ = self._entries.pop(key)
+        self.total_bytes -= size_bytes
+        if reason:
+            CACHE_EVICTIONS.labels(cache=self.name, reason=reason).inc()
+
+
+class ResultCache:
+    """Content-addressed cache for analysis results.
+
+    Keys are content hashes, so identical uploads share one entry. The
+    local LRU tier is always on; a Redis-compatible shared tier is used
+    when ``redis_url`` is given and the redis client is installed. The
+    shared tier is best effort: its errors are logged and treated as a miss.
+    Both tiers keep the JSON text, so every hit is a fresh dict that callers
+    may change without touching the cached result.
+    """
+
+    def __init__(self, name: str, max_entries: int = 10000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 86400, redis_url: Optional[str] = None):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUCache(name, max_entries, max_bytes, ttl_seconds)
+        self.shared = None
+        if redis_url:
+            if redis is None:
+                print(f"⚠️ {name} cache: redis package not installed, shared tier disabled")
+            else:
+                self.shared = redis.from_url(redis_url)
+
+    @classmethod
+    def from_env(cls, name: str) -> "ResultCache":
+        return cls(
+            name,
+            max_entries=int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "10000")),
+            max_bytes=int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            ttl_seconds=float(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400")),
+            redis_url=os.getenv("RESULT_CACHE_REDIS_URL") or None
+        )
+
+    def _shared_key(self, key: str) -> str:
+        return f"crossmodal:{self.name}:{key}"
+
+    async def get(self, key: str) -> Optional[dict]:
+        raw = self.local.get(key)
+        if raw is not None:
+            CACHE_HITS.labels(cache=self.name, tier='local').inc()
+            return json.loads(raw)
+
+        if self.shared is not None:
+            try:
+                raw = await self.shared.get(self._shared_key(key))
+            except Exception as e:
+                print(f"⚠️ {self.name} cache: shared tier read failed: {e}")
+                raw = None
+            if raw is not None:
+                CACHE_HITS.labels(cache=self.name, tier='shared').inc()
+                self.local.set(key, raw, len(raw))
+                return json.loads(raw)
+
+        CACHE_MISSES.labels(cache=self.name).inc()
+        return None
+
+    async def set(self, key: str, value: dict):
+        raw = json.dumps(value, separators=(',', ':'))
+        self.local.set(key, raw, len(raw))
+        if self.shared is not None:
+            try:
+                await self.shared.set(self._shared_key(key), raw, ex=int(self.ttl_seconds))
+            except Exception as e:
+                print(f"⚠️ {self.name} cache: shared tier write failed: {e}")
+
+    async def close(self):
+        if self.shared is not None:
+            await self.shared.close()
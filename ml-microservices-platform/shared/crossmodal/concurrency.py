@@ -0,0 +1,47 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class Overloaded(Exception):
+    """Raised when a request arrives while the concurrency limit is already reached"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Concurrency limit reached, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Thread pool for blocking SDK calls (boto3) with request admission control.
+
+    ``admit()`` bounds how many requests may be in flight at once and fails
+    fast with ``Overloaded`` instead of queueing without limit. ``run()``
+    moves a blocking call off the event loop. The pool is sized so every
+    admitted request can run ``calls_per_request`` calls side by side.
+    """
+
+    def __init__(self, max_concurrency: int, calls_per_request: int = 1, retry_after: int = 1, name: str = "aws"):
+        self.max_concurrency = max_concurrency
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.max_workers = max_concurrency * calls_per_request
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+
+    @contextmanager
+    def admit(self):
+        # Only touched from the event loop thread, so a plain counter is enough
+        if self.in_flight >= self.max_concurrency:
+            raise Overloaded(self.retry_after)
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
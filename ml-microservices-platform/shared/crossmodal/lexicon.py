@@ -0,0 +1,46 @@
+import json
+import os
+from crossmodal.matcher import TermMatcher
+from crossmodal.reloading import ReloadingFileStore
+
+
+DEFAULT_LEXICON_PATH = os.path.join(os.path.dirname(__file__), 'data', 'lexicon.json')
+
+REQUIRED_FIELDS = ('version', 'unsafe_words', 'safe_words', 'safe_image_categories', 'unsafe_image_categories')
+
+
+class Lexicon:
+    """One immutable, compiled version of the moderation word lists and category tables"""
+
+    def __init__(self, version: str, unsafe_words, safe_words, safe_image_categories, unsafe_image_categories):
+        self.version = str(version)
+        self.unsafe_words = frozenset(unsafe_words)
+        self.safe_words = frozenset(safe_words)
+        self.safe_image_categories = frozenset(safe_image_categories)
+        self.unsafe_image_categories = frozenset(unsafe_image_categories)
+        self.unsafe_matcher = TermMatcher(self.unsafe_words)
+        self.safe_matcher = TermMatcher(self.safe_words)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Lexicon":
+        missing = [field for field in REQUIRED_FIELDS if field not in data]
+        if missing:
+            raise ValueError(f"Lexicon is missing fields: {', '.join(missing)}")
+        return cls(**{field: data[field] for field in REQUIRED_FIELDS})
+
+    @classmethod
+    def load(cls, path: str) -> "Lexicon":
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+class LexiconStore(ReloadingFileStore):
+    """Holds the active Lexicon and hot-swaps it when the file on disk changes.
+
+    Compiling the matchers happens in ``Lexicon.load``, before the swap.
+    """
+
+    loader = Lexicon.load
+    path_env = "LEXICON_PATH"
+    default_path = DEFAULT_LEXICON_PATH
+    label = "Lexicon"
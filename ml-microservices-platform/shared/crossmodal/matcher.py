@@ -0,0 +1,114 @@
+import re
+from typing import Iterable, List, NamedTuple
+
+
+class TermMatch(NamedTuple):
+    term: str
+    start: int
+    end: int
+
+
+def normalize_term(term: str) -> str:
+    return ' '.join(term.lower().split())
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+def _phrase_pattern(term: str):
+    return re.compile(r'\s+'.join(re.escape(word) for word in term.split(' ')), re.IGNORECASE)
+
+
+def _trie_pattern(terms: Iterable[str]) -> str:
+    """Compile terms into one regex shaped like a prefix trie.
+
+    A plain ``a|b|c`` alternation makes ``re`` try every term at every
+    position; sharing prefixes keeps the work per position proportional to
+    the term length instead of the lexicon size.
+    """
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = {}
+    return _node_pattern(trie)
+
+
+def _node_pattern(node: dict) -> str:
+    is_end = '' in node
+    branches = [
+        (r'\s+' if char == ' ' else re.escape(char)) + _node_pattern(child)
+        for char, child in sorted(node.items()) if char
+    ]
+    if not branches:
+        return ''
+    if len(branches) == 1 and not is_end:
+        return branches[0]
+    # Greedy '?' tries the longer term first and backtracks to the shorter one
+    return '(?:' + '|'.join(branches) + ')' + ('?' if is_end else '')
+
+
+class TermMatcher:
+    """Whole-word matcher for a fixed lexicon, compiled once.
+
+    Terms match case-insensitively on word boundaries, so punctuation next
+    to a term ("bomb!", "gun,") still counts while substrings of longer
+    words ("gunner") do not. Multi-word phrases match across any run of
+    whitespace. Every term occurrence is reported, including terms nested
+    inside a longer phrase ("abuse" inside "child abuse").
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms = frozenset(t for t in (normalize_term(term) for term in terms) if t)
+        self._source = None
+        self._pattern = None
+        self._pattern_ignorecase = None
+        if self.terms:
+            # The lookahead makes every start position a candidate, so
+            # overlapping phrases are all found
+            self._source = r'(?<!\w)(?=(' + _trie_pattern(self.terms) + r')(?!\w))'
+            self._pattern = re.compile(self._source)
+        # A match at one start position only yields the longest term; shorter
+        # terms that are word-bounded prefixes of it are recovered from here
+        self._prefix_terms = {}
+        for term in self.terms:
+            prefixes = [
+                term[:i] for i in range(len(term) - 1, 0, -1)
+                if not _is_word_char(term[i]) and term[:i] in self.terms
+            ]
+            if prefixes:
+                self._prefix_terms[term] = [(prefix, _phrase_pattern(prefix)) for prefix in prefixes]
+
+    def __len__(self):
+        return len(self.terms)
+
+    def find_all(self, text: str) -> List[TermMatch]:
+        """All term occurrences in ``text`` with their character offsets"""
+        if self._pattern is None:
+            return []
+        # Scanning lowercased text without IGNORECASE is noticeably faster;
+        # fall back to IGNORECASE when lowercasing would shift offsets
+        lowered = text.lower()
+        if len(lowered) == len(text):
+            found = self._pattern.finditer(lowered)
+        else:
+            if self._pattern_ignorecase is None:
+                self._pattern_ignorecase = re.compile(self._source, re.IGNORECASE)
+            found = self._pattern_ignorecase.finditer(text)
+        matches = []
+        for m in found:
+            start = m.start(1)
+            term = normalize_term(m.group(1))
+            matches.append(TermMatch(term, start, m.end(1)))
+            for prefix, prefix_pattern in self._prefix_terms.get(term, ()):
+                prefix_match = prefix_pattern.match(text, start)
+                if prefix_match:
+                    matches.append(TermMatch(prefix, start, prefix_match.end()))
+        return matches
+
+    def matched_terms(self, text: str) -> List[str]:
+        """Distinct terms found in ``text``, in order of first occurrence"""
+        return list(dict.fromkeys(match.term for match in self.find_all(text)))
+
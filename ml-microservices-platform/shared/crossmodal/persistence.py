@@ -0,0 +1,220 @@
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+from prometheus_client import Counter, Gauge, Histogram
+
+
+PERSIST_ITEMS = Counter('persist_items_total', 'Items handed to the background DynamoDB writer, by outcome',
+                        ['table', 'outcome'])
+PERSIST_RETRIES = Counter('persist_retries_total', 'batch_write_item retries (unprocessed items or retryable errors)',
+                          ['table'])
+PERSIST_QUEUE_DEPTH = Gauge('persist_queue_depth', 'Items waiting in the background DynamoDB writer', ['table'])
+PERSIST_BATCH_SECONDS = Histogram('persist_batch_seconds', 'Time to write one batch, retries included', ['table'])
+
+# DynamoDB's batch_write_item limit
+MAX_BATCH_ITEMS = 25
+
+OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+RETRYABLE_ERRORS = {
+    'ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded',
+    'InternalServerError', 'ServiceUnavailable'
+}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Throttling, 5xx and connection errors are worth retrying; validation errors are not"""
+    response = getattr(error, 'response', None)
+    if not isinstance(response, dict):
+        return True
+    return response.get('Error', {}).get('Code') in RETRYABLE_ERRORS
+
+
+def ensure_table(dynamodb, table_name: str, key: str = 'analysis_id'):
+    """Create the results table if it doesn't exist, for local DynamoDB stand-ins"""
+    client = dynamodb.meta.client
+    try:
+        client.describe_table(TableName=table_name)
+        return
+    except client.exceptions.ResourceNotFoundException:
+        pass
+    client.create_table(
+        TableName=table_name,
+        KeySchema=[{'AttributeName': key, 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': key, 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST'
+    )
+    client.get_waiter('table_exists').wait(TableName=table_name)
+
+
+class BatchWriter:
+    """Background writer that persists items to one DynamoDB table in batches.
+
+    ``put`` only enqueues, so the caller never waits on DynamoDB. A worker
+    thread flushes with ``batch_write_item`` as soon as 25 items are queued
+    or the oldest queued item has waited ``flush_interval`` seconds.
+    Unprocessed items and retryable errors are retried with jittered
+    exponential backoff, up to ``max_retries`` times. The queue holds at
+    most ``max_queue`` items. When it is full, ``overflow_policy`` decides:
+    - ``drop_newest`` rejects the new item;
+    - ``drop_oldest`` evicts the oldest queued item;
+    - ``block`` waits up to ``block_timeout`` for room, then drops the new
+      item.
+    ``close`` stops intake and drains the queue.
+
+    ``dynamodb`` is a boto3 DynamoDB service resource, so items are plain
+    Python values (floats already converted to Decimal).
+    """
+
+    def __init__(self, dynamodb, table_name: str, max_batch: int = MAX_BATCH_ITEMS,
+                 flush_interval: float = 0.5, max_queue: int = 10000, overflow_policy: str = 'drop_oldest',
+                 block_timeout: float = 1.0, max_retries: int = 5, backoff_base: float = 0.05,
+                 backoff_max: float = 2.0):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {', '.join(OVERFLOW_POLICIES)}")
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.max_batch = max(1, min(max_batch, MAX_BATCH_ITEMS))
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # (enqueued_at, item)
+        self._queue = deque()
+        self._condition = threading.Condition()
+        self._closing = False
+        self._flush_requested = False
+        self._in_flight = 0
+        self._worker = threading.Thread(target=self._run, name=f"batch-writer-{table_name}", daemon=True)
+        self._worker.start()
+
+    @classmethod
+    def from_env(cls, dynamodb, table_name: str) -> "BatchWriter":
+        return cls(
+            dynamodb,
+            table_name,
+            max_batch=int(os.getenv("PERSIST_BATCH_SIZE", str(MAX_BATCH_ITEMS))),
+            flush_interval=float(os.getenv("PERSIST_FLUSH_INTERVAL", "0.5")),
+            max_queue=int(os.getenv("PERSIST_MAX_QUEUE", "10000")),
+            overflow_policy=os.getenv("PERSIST_OVERFLOW_POLICY", "drop_oldest"),
+            block_timeout=float(os.getenv("PERSIST_BLOCK_TIMEOUT", "1.0")),
+            max_retries=int(os.getenv("PERSIST_MAX_RETRIES", "5"))
+        )
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, item: dict) -> bool:
+        """Queue one item for writing; False if it was dropped by the overflow policy"""
+        with self._condition:
+            if self._closing:
+                PERSIST_ITEMS.labels(table=self.table_name, outcome='rejected_closed').inc()
+                return False
+            if len(self._queue) >= self.max_queue:
+                if self.overflow_policy == 'drop_newest':
+                    PERSIST_ITEMS.labels(table=self.table_name, outcome='dropped_overflow').inc()
+                    return False
+                if self.overflow_policy == 'drop_oldest':
+                    self._queue.popleft()
+                    PERSIST_ITEMS.labels(table=self.table_name, outcome='dropped_overflow').inc()
+                elif not self._condition.wait_for(lambda: len(self._queue) < self.max_queue or self._closing,
+                                                  timeout=self.block_timeout) or self._closing:
+                    PERSIST_ITEMS.labels(table=self.table_name, outcome='dropped_overflow').inc()
+                    return False
+            self._queue.append((time.monotonic(), item))
+            PERSIST_QUEUE_DEPTH.labels(table=self.table_name).set(len(self._queue))
+            # Wake the worker to start the flush_interval clock or write a full batch
+            if len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+                self._condition.notify_all()
+            return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything queued so far now; True once the queue is empty and no batch is in flight"""
+        with self._condition:
+            self._flush_requested = True
+            self._condition.notify_all()
+            return self._condition.wait_for(lambda: not self._queue and not self._in_flight, timeout=timeout)
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Stop accepting items, drain the queue and stop the worker; True if fully drained"""
+        with self._condition:
+            self._closing = True
+            self._condition.notify_all()
+        self._worker.join(timeout)
+        return not self._worker.is_alive()
+
+    def _next_batch(self) -> Optional[list]:
+        with self._condition:
+            while True:
+                if self._queue:
+                    full = len(self._queue) >= self.max_batch
+                    if full or self._closing or self._flush_requested:
+                        break
+                    remaining = self._queue[0][0] + self.flush_interval - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                elif self._closing:
+                    return None
+                else:
+                    self._flush_requested = False
+                    self._condition.wait()
+            batch = [self._queue.popleft()[1] for _ in range(min(self.max_batch, len(self._queue)))]
+            self._in_flight += 1
+            PERSIST_QUEUE_DEPTH.labels(table=self.table_name).set(len(self._queue))
+            # Room for producers blocked by the 'block' policy
+            self._condition.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            except Exception as e:
+                PERSIST_ITEMS.labels(table=self.table_name, outcome='failed').inc(len(batch))
+                print(f"❌ {self.table_name} writer: batch of {len(batch)} lost: {e}")
+            finally:
+                with self._condition:
+                    self._in_flight -= 1
+                    if not self._queue:
+                        self._flush_requested = False
+                    self._condition.notify_all()
+
+    def _write(self, batch: list):
+        requests = [{'PutRequest': {'Item': item}} for item in batch]
+        attempt = 0
+        with PERSIST_BATCH_SECONDS.labels(table=self.table_name).time():
+            while requests:
+                try:
+                    response = self.dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                    unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                    written = len(requests) - len(unprocessed)
+                    if written:
+                        PERSIST_ITEMS.labels(table=self.table_name, outcome='written').inc(written)
+                    requests = unprocessed
+                    error = None
+                except Exception as e:
+                    if not is_retryable(e):
+                        raise
+                    error = e
+                if not requests:
+                    return
+                attempt += 1
+                if attempt > self.max_retries:
+                    PERSIST_ITEMS.labels(table=self.table_name, outcome='failed').inc(len(requests))
+                    print(f"❌ {self.table_name} writer: giving up on {len(requests)} items "
+                          f"after {self.max_retries} retries: {error or 'still unprocessed'}")
+                    return
+                PERSIST_RETRIES.labels(table=self.table_name).inc()
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.5))
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Optional
+from crossmodal.rules import RuleSet
+
+
+DEFAULT_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "data/registry")
+
+
+STAGES = ('current', 'candidate')
+
+
+def apply_weights(base: RuleSet, published: dict) -> RuleSet:
+    """``base`` with a published version's weights, named after both.
+
+    Conditions, clamp and the rule list always come from ``base`` (the
+    rules file): rules added since the weights were fitted keep their
+    file weight, and weights for rules no longer in it are dropped.
+    """
+    weights = published['weights']
+    unknown = sorted(set(weights) - {rule.id for rule in base.rules})
+    if unknown:
+        print(f"⚠️ Rules {', '.join(unknown)} in {published['version']} are not in rules {base.version}, ignoring their weights")
+    if published.get('base_version') != base.version:
+        print(f"⚠️ Weights {published['version']} were fitted on rules {published.get('base_version')}, "
+              f"applying them to {base.version}")
+    version = f"{base.version.split('+')[0]}+{published['version'].split('+', 1)[-1]}"
+    return base.with_weights({rule_id: weight for rule_id, weight in weights.items() if rule_id not in unknown}, version)
+
+
+class RuleRegistry:
+    """Directory of published rule-weight versions.
+
+    Each version is written to ``rules/<version>.json`` as its weights by
+    rule id and the rules file version they were fitted on; the rules
+    themselves stay in the rules file, see ``apply_weights``. Two pointer
+    files name versions by stage: ``rules/current.json`` is the version
+    serving traffic and ``rules/candidate.json`` the one being
+    shadow-tested against it, each with its training metrics. Files are
+    replaced atomically, so a reader never sees a half-written one.
+    """
+
+    def __init__(self, directory: str = DEFAULT_REGISTRY_DIR):
+        self.directory = os.path.join(directory, 'rules')
+
+    def pointer_path(self, stage: str = 'current') -> str:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage '{stage}', expected one of: {', '.join(STAGES)}")
+        return os.path.join(self.directory, f"{stage}.json")
+
+    def _write(self, path: str, data: dict):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temporary, path)
+
+    def publish(self, version: str, weights: dict, base_version: str, metrics: Optional[dict] = None,
+                stage: str = 'current') -> dict:
+        """Write ``weights`` (rule id -> weight, fitted on rules ``base_version``) as ``version`` and point ``stage`` at it"""
+        filename = f"{version}.json"
+        self._write(os.path.join(self.directory, filename),
+                    {'version': version, 'base_version': base_version, 'weights': weights})
+        pointer = {
+            'version': version,
+            'file': filename,
+            'base_version': base_version,
+            'published_at': datetime.utcnow().isoformat(),
+            'metrics': metrics or {}
+        }
+        self._write(self.pointer_path(stage), pointer)
+        return pointer
+
+    def promote(self) -> dict:
+        """Make the candidate current and clear the candidate"""
+        pointer = self.current('candidate')
+        if pointer is None:
+            raise ValueError("No candidate to promote")
+        pointer = {**pointer, 'promoted_at': datetime.utcnow().isoformat()}
+        self._write(self.pointer_path('current'), pointer)
+        self.withdraw()
+        return pointer
+
+    def withdraw(self):
+        """Stop shadow-testing the candidate"""
+        if os.path.exists(self.pointer_path('candidate')):
+            os.remove(self.pointer_path('candidate'))
+
+    def current(self, stage: str = 'current') -> Optional[dict]:
+        """The pointer for ``stage``, or None if nothing is there"""
+        path = self.pointer_path(stage)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def load(self, filename: str) -> dict:
+        """A published version: its ``version``, ``base_version`` and ``weights``"""
+        with open(os.path.join(self.directory, filename), encoding='utf-8') as f:
+            data = json.load(f)
+        if 'weights' not in data:
+            # Versions published before only weights were kept hold the whole rule set
+            data = {'version': data['version'], 'base_version': data['version'].split('+')[0],
+                    'weights': {rule['id']: rule['weight'] for rule in data['rules']}}
+        return data
+
+    def load_current(self, stage: str = 'current') -> Optional[dict]:
+        pointer = self.current(stage)
+        return self.load(pointer['file']) if pointer else None
+
+
+class RegistryRuleStore:
+    """Rule sets for the registry's current and candidate stages, swapped in as they change.
+
+    Like ReloadingFileStore, but a stage's pointer may be absent: ``current``
+    is then None and the caller falls back to its own rules, and
+    ``candidate`` None means no shadow testing. A stage's rule set is
+    ``base()`` (the live rules file) with the published weights applied,
+    re-derived whenever either changes. A new version is fully loaded,
+    and passed through ``prepare`` (e.g. to compile it), before the
+    reference swap; a version that fails to load leaves the previous one
+    active.
+    """
+
+    label = "Registry rules"
+
+    def __init__(self, registry: RuleRegistry, base, prepare=None):
+        self.registry = registry
+        self.base = base
+        self.prepare = prepare
+        self.published = {stage: None for stage in STAGES}
+        self._applied = {stage: None for stage in STAGES}
+        self._mtimes = {stage: None for stage in STAGES}
+        self.reload()
+
+    @property
+    def current(self) -> Optional[RuleSet]:
+        return self.rule_set('current')
+
+    @property
+    def candidate(self) -> Optional[RuleSet]:
+        return self.rule_set('candidate')
+
+    def rule_set(self, stage: str) -> Optional[RuleSet]:
+        """The stage's weights applied to the current base rules, or None when nothing is published"""
+        published = self.published[stage]
+        if published is None:
+            return None
+        base = self.base()
+        applied = self._applied[stage]
+        if applied is None or applied[0] is not published or applied[1] is not base:
+            applied = (published, base, apply_weights(base, published))
+            self._applied[stage] = applied
+        return applied[2]
+
+    def _mtime(self, stage: str):
+        try:
+            return os.stat(self.registry.pointer_path(stage)).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload(self, force: bool = False) -> bool:
+        changed = False
+        for stage in STAGES:
+            mtime = self._mtime(stage)
+            if mtime == self._mtimes[stage] and not force:
+                continue
+            published = self.registry.load_current(stage) if mtime is not None else None
+            applied = None
+            if published is not None:
+                base = self.base()
+                applied = (published, base, apply_weights(base, published))
+                if self.prepare is not None:
+                    self.prepare(applied[2])
+            self._mtimes[stage] = mtime
+            self._applied[stage] = applied
+            self.published[stage] = published
+            changed = True
+        return changed
+
+    def versions(self) -> dict:
+        return {stage: getattr(self, stage).version if getattr(self, stage) else None for stage in STAGES}
+
+    async def watch(self, interval: float):
+        """Poll the pointers and hot-swap new versions; loading happens off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                previous = self.versions()
+                if await loop.run_in_executor(None, self.reload):
+                    print(f"🔄 {self.label} reloaded: {previous} -> {self.versions()}")
+            except Exception as e:
+                print(f"❌ {self.label} reload failed, keeping {self.versions()}: {e}")
@@ -0,0 +1,44 @@
+import asyncio
+import os
+
+
+class ReloadingFileStore:
+    """Holds the object loaded from a versioned file and replaces it when the file changes.
+
+    Readers take ``store.current`` once per request and use that snapshot
+    throughout, so a reload never changes it mid-request. A new version is
+    fully loaded before the single reference swap; if it fails to load, the
+    previous version stays active. Subclasses set ``loader`` (path -> object
+    with a ``version``), ``path_env``, ``default_path`` and ``label``.
+    """
+
+    loader = None
+    path_env = None
+    default_path = None
+    label = "File"
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv(self.path_env, self.default_path)
+        self._mtime = os.stat(self.path).st_mtime_ns
+        self.current = type(self).loader(self.path)
+
+    def reload(self, force: bool = False) -> bool:
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime and not force:
+            return False
+        current = type(self).loader(self.path)
+        self._mtime = mtime
+        self.current = current
+        return True
+
+    async def watch(self, interval: float):
+        """Poll the file and hot-swap new versions; loading happens off the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                previous = self.current.version
+                if await loop.run_in_executor(None, self.reload):
+                    print(f"🔄 {self.label} reloaded: {previous} -> {self.current.version}")
+            except Exception as e:
+                print(f"❌ {self.label} reload failed, keeping version {self.current.version}: {e}")
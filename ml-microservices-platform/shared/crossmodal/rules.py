@@ -0,0 +1,355 @@
+import itertools
+import json
+import operator as operators
+import os
+from typing import List, NamedTuple, Optional, Tuple
+from crossmodal.reloading import ReloadingFileStore
+
+
+DEFAULT_RULES_PATH = os.path.join(os.path.dirname(__file__), 'data', 'rules.json')
+
+# Fields a condition can test: name -> (input, key, required, default).
+# Required fields are read with [] so a malformed analysis fails the same
+# way whichever rules happen to fire.
+FIELDS = {
+    'image.categories': ('image', 'categories', True, None),
+    'image.moderation_flagged': ('image', 'moderation_flagged', True, None),
+    'image.moderation_labels': ('image', 'moderation_labels', False, ()),
+    'text.sentiment': ('text', 'sentiment', True, None),
+    'text.unsafe_found': ('text', 'unsafe_found', True, None),
+    'context.context_score': ('context', 'context_score', False, None),
+}
+
+# Operators by the kind of value they take
+SET_OPERATORS = ('any_in', 'in')
+BOOL_OPERATORS = ('not_empty', 'is')
+NUMBER_OPERATORS = ('gt', 'gte', 'lt', 'lte')
+OPERATORS = SET_OPERATORS + BOOL_OPERATORS + NUMBER_OPERATORS + ('equals',)
+
+COMPARISONS = {'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+COMPARISON_FUNCTIONS = {'gt': operators.gt, 'gte': operators.ge, 'lt': operators.lt, 'lte': operators.le}
+
+# Lexicon sets a condition may reference with {"lexicon": "<name>"}
+LEXICON_SETS = ('safe_image_categories', 'unsafe_image_categories', 'unsafe_words', 'safe_words')
+
+# Image conditions RuleEvaluator.bounds scores every combination of; past
+# this many it bounds the rules one at a time instead
+BOUNDS_EXACT_IMAGE_CONDITIONS = 10
+
+
+class RuleResult(NamedTuple):
+    score: float
+    fired: List[str]
+
+
+class Condition(NamedTuple):
+    field: str
+    operator: str
+    value: object
+
+    def to_dict(self) -> dict:
+        """The condition as written in the rules file"""
+        value = self.value
+        if isinstance(value, tuple) and value[:1] == ('lexicon',):
+            value = {'lexicon': value[1]}
+        elif isinstance(value, tuple) and value[:1] == ('values',):
+            value = list(value[1])
+        return {'field': self.field, self.operator: value}
+
+
+class Rule(NamedTuple):
+    id: str
+    description: str
+    when: tuple
+    weight: float
+    floor: Optional[float]
+    ceiling: Optional[float]
+
+    def to_dict(self) -> dict:
+        return {'id': self.id, 'description': self.description,
+                'when': [condition.to_dict() for condition in self.when],
+                'weight': self.weight, 'floor': self.floor, 'ceiling': self.ceiling}
+
+
+def parse_condition(data: dict) -> Condition:
+    field = data.get('field')
+    if field not in FIELDS:
+        raise ValueError(f"Unknown condition field: {field!r}")
+    operators = [key for key in data if key != 'field']
+    if len(operators) != 1 or operators[0] not in OPERATORS:
+        raise ValueError(f"Condition on {field} needs exactly one of: {', '.join(OPERATORS)}")
+    operator = operators[0]
+    value = data[operator]
+
+    if operator in SET_OPERATORS:
+        if isinstance(value, dict):
+            if value.get('lexicon') not in LEXICON_SETS:
+                raise ValueError(f"Condition on {field} references unknown lexicon set {value.get('lexicon')!r}")
+            value = ('lexicon', value['lexicon'])
+        elif isinstance(value, list):
+            value = ('values', tuple(value))
+        else:
+            raise ValueError(f"'{operator}' on {field} takes a list or a lexicon reference")
+    elif operator in BOOL_OPERATORS and not isinstance(value, bool):
+        raise ValueError(f"'{operator}' on {field} takes true or false")
+    elif operator in NUMBER_OPERATORS and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise ValueError(f"'{operator}' on {field} takes a number")
+    elif operator == 'equals' and isinstance(value, (list, dict)):
+        raise ValueError(f"'equals' on {field} takes a single value")
+    return Condition(field, operator, value)
+
+
+class RuleSet:
+    """One version of the risk rules as loaded from the rules file.
+
+    A rule fires when all of its ``when`` conditions hold, and then adds its
+    ``weight`` (negative weights lower the risk) and applies its optional
+    ``floor``/``ceiling``. Rules apply in file order and the total is
+    clamped to ``clamp``. ``compile`` turns the set into a RuleEvaluator
+    for one lexicon snapshot.
+    """
+
+    def __init__(self, version: str, rules: List[Rule], clamp=(0.0, 1.0)):
+        self.version = str(version)
+        self.rules = list(rules)
+        self.clamp = (float(clamp[0]), float(clamp[1]))
+        ids = [rule.id for rule in self.rules]
+        if len(set(ids)) != len(ids):
+            raise ValueError("Rule ids must be unique")
+        self._compiled = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RuleSet":
+        if 'version' not in data or 'rules' not in data:
+            raise ValueError("Rules file needs 'version' and 'rules'")
+        rules = []
+        for entry in data['rules']:
+            if 'id' not in entry or 'weight' not in entry:
+                raise ValueError(f"Rule needs an 'id' and a 'weight': {entry}")
+            rules.append(Rule(
+                id=str(entry['id']),
+                description=entry.get('description', ''),
+                when=tuple(parse_condition(condition) for condition in entry.get('when', [])),
+                weight=float(entry['weight']),
+                floor=float(entry['floor']) if entry.get('floor') is not None else None,
+                ceiling=float(entry['ceiling']) if entry.get('ceiling') is not None else None
+            ))
+        return cls(data['version'], rules, data.get('clamp', (0.0, 1.0)))
+
+    @classmethod
+    def load(cls, path: str) -> "RuleSet":
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+    def to_dict(self) -> dict:
+        """The rule set as written in the rules file"""
+        return {'version': self.version, 'clamp': list(self.clamp), 'rules': [rule.to_dict() for rule in self.rules]}
+
+    def with_weights(self, weights: dict, version: str) -> "RuleSet":
+        """A copy with some rule weights replaced (rule id -> weight), as ``version``"""
+        unknown = set(weights) - {rule.id for rule in self.rules}
+        if unknown:
+            raise ValueError(f"Unknown rule ids: {', '.join(sorted(unknown))}")
+        return RuleSet(version, [rule._replace(weight=float(weights.get(rule.id, rule.weight))) for rule in self.rules],
+                       self.clamp)
+
+    def compile(self, lexicon) -> "RuleEvaluator":
+        """Evaluator for ``lexicon``; reused while the same lexicon snapshot is passed in"""
+        compiled = self._compiled
+        if compiled is None or compiled.lexicon is not lexicon:
+            compiled = RuleEvaluator(self, lexicon)
+            self._compiled = compiled
+        return compiled
+
+
+class RuleEvaluator:
+    """A RuleSet compiled against one lexicon into a single Python function.
+
+    Each distinct condition becomes one slot: conditions used by several
+    rules are computed once per item, the rest are inlined so ``and``
+    short-circuits them. Set conditions test against frozensets built here,
+    once. ``read_rows`` returns the values of ``fields`` for a list of
+    (image, text, context) items, read exactly as ``evaluate`` reads them. The generated source is kept
+    on ``source`` for debugging.
+    """
+
+    def __init__(self, rule_set: RuleSet, lexicon):
+        self.version = rule_set.version
+        self.lexicon = lexicon
+        self.rule_ids = [rule.id for rule in rule_set.rules]
+        self.clamp = rule_set.clamp
+
+        # Distinct fields and conditions, in first-use order
+        self.fields = []
+        self.conditions = []
+        slots = {}
+        for rule in rule_set.rules:
+            for condition in rule.when:
+                if condition.field not in self.fields:
+                    self.fields.append(condition.field)
+                key = (condition.field, condition.operator, condition.value)
+                if key not in slots:
+                    slots[key] = len(self.conditions)
+                    self.conditions.append(Condition(condition.field, condition.operator,
+                                                     self._resolve(condition.value)))
+        # (id, weight, floor, ceiling, condition slots) per rule
+        self.rules = [
+            (rule.id, rule.weight, rule.floor, rule.ceiling,
+             tuple(dict.fromkeys(slots[(c.field, c.operator, c.value)] for c in rule.when)))
+            for rule in rule_set.rules
+        ]
+
+        self.source, namespace = self._generate()
+        exec(compile(self.source, f"<rules {self.version}>", 'exec'), namespace)
+        # evaluate(image, text, context=None) -> RuleResult: the risk score
+        # for one item and the ids of the rules that fired, in rule order
+        self.evaluate = namespace['evaluate']
+        self.read_rows = namespace['read_rows']
+        self._image_slots = [slot for slot, condition in enumerate(self.conditions)
+                             if FIELDS[condition.field][0] == 'image']
+
+    def _resolve(self, value):
+        if isinstance(value, tuple) and value and value[0] == 'lexicon':
+            return frozenset(getattr(self.lexicon, value[1]))
+        if isinstance(value, tuple) and value and value[0] == 'values':
+            return frozenset(value[1])
+        return value
+
+    def bounds(self, text: dict, context: Optional[dict] = None) -> Tuple[float, float]:
+        """Lowest and highest score ``evaluate`` can give for any image, from text and context alone.
+
+        Rules a text or context condition rules out are dropped. Every
+        combination of outcomes of the image conditions left is scored, so
+        the range is exact for these rules (or wider, when some
+        combinations can't happen together). Past
+        BOUNDS_EXACT_IMAGE_CONDITIONS of them, each rule that may fire is
+        taken to fire or not on its own: one pass over the rules, and a
+        range at least as wide.
+        """
+        inputs = {'text': text, 'context': context}
+        known = {}
+        for slot, (field, operator, value) in enumerate(self.conditions):
+            source, key, required, default = FIELDS[field]
+            if source == 'image':
+                continue
+            data = inputs[source]
+            known[slot] = test_condition(operator, value, data[key] if required else
+                                         (data.get(key, default) if data else default))
+        rules = [rule for rule in self.rules if all(known.get(slot, True) for slot in rule[4])]
+        open_slots = sorted({slot for rule in rules for slot in rule[4] if slot not in known})
+        low, high = self.clamp
+
+        if len(open_slots) > BOUNDS_EXACT_IMAGE_CONDITIONS:
+            # Firing a rule never lowers a higher running score below a lower
+            # one's, so the extremes stay the extremes rule by rule
+            lowest = highest = 0.0
+            for _, weight, floor, ceiling, rule_slots in rules:
+                fired_low, fired_high = (apply_rule(risk, weight, floor, ceiling) for risk in (lowest, highest))
+                if all(slot in known for slot in rule_slots):
+                    lowest, highest = fired_low, fired_high
+                else:
+                    lowest, highest = min(lowest, fired_low), max(highest, fired_high)
+            return min(max(lowest, low), high), min(max(highest, low), high)
+
+        scores = []
+        for outcomes in itertools.product((False, True), repeat=len(open_slots)):
+            holds = {**known, **dict(zip(open_slots, outcomes))}
+            risk = 0.0
+            for _, weight, floor, ceiling, rule_slots in rules:
+                if all(holds[slot] for slot in rule_slots):
+                    risk = apply_rule(risk, weight, floor, ceiling)
+            scores.append(min(max(risk, low), high))
+        return min(scores), max(scores)
+
+    def _generate(self):
+        namespace = {'RuleResult': RuleResult}
+        uses = [0] * len(self.conditions)
+        for _, _, _, _, rule_slots in self.rules:
+            for slot in rule_slots:
+                uses[slot] += 1
+
+        expressions = []
+        for slot, (field, operator, value) in enumerate(self.conditions):
+            var = f"f{self.fields.index(field)}"
+            if operator in SET_OPERATORS:
+                namespace[f"s{slot}"] = value
+                expression = (f"not s{slot}.isdisjoint({var})" if operator == 'any_in'
+                              else f"{var} in s{slot}")
+            elif operator == 'not_empty':
+                expression = f"len({var}) {'>' if value else '=='} 0"
+            elif operator == 'is':
+                expression = f"bool({var})" if value else f"not {var}"
+            elif operator == 'equals':
+                expression = f"{var} == {value!r}"
+            else:
+                expression = f"({var} is not None and {var} {COMPARISONS[operator]} {float(value)!r})"
+            expressions.append(expression)
+
+        reads, values = [], []
+        for index, field in enumerate(self.fields):
+            source, key, required, default = FIELDS[field]
+            if required:
+                value = f"{source}[{key!r}]"
+            else:
+                value = f"({source}.get({key!r}, {default!r}) if {source} else {default!r})"
+            reads.append(f"    f{index} = {value}")
+            values.append(value)
+        row = "(" + "".join(f"{value}, " for value in values) + ")"
+
+        lines = ["def read_rows(items):",
+                 f"    return [{row} for image, text, context in items]", ""]
+        lines.append("def evaluate(image, text, context=None):")
+        lines.extend(reads)
+        for slot, expression in enumerate(expressions):
+            if uses[slot] > 1:
+                lines.append(f"    c{slot} = {expression}")
+        lines.append("    risk = 0.0")
+        lines.append("    fired = []")
+        for rule_id, weight, floor, ceiling, rule_slots in self.rules:
+            test = " and ".join(
+                f"c{slot}" if uses[slot] > 1 else f"({expressions[slot]})" for slot in rule_slots
+            ) or "True"
+            lines.append(f"    if {test}:")
+            lines.append(f"        risk += {weight!r}")
+            if floor is not None:
+                lines.append(f"        if risk < {floor!r}: risk = {floor!r}")
+            if ceiling is not None:
+                lines.append(f"        if risk > {ceiling!r}: risk = {ceiling!r}")
+            lines.append(f"        fired.append({rule_id!r})")
+        low, high = self.clamp
+        lines.append(f"    return RuleResult(min(max(risk, {low!r}), {high!r}), fired)")
+        return "\n".join(lines) + "\n", namespace
+
+
+def apply_rule(risk: float, weight: float, floor: Optional[float], ceiling: Optional[float]) -> float:
+    """The running score after a rule fires, exactly as the generated ``evaluate`` updates it"""
+    risk += weight
+    if floor is not None and risk < floor:
+        risk = floor
+    if ceiling is not None and risk > ceiling:
+        risk = ceiling
+    return risk
+
+
+def test_condition(operator: str, expected, actual) -> bool:
+    """One condition on one value, exactly as the generated ``evaluate`` tests it"""
+    if operator == 'any_in':
+        return not expected.isdisjoint(actual)
+    if operator == 'in':
+        return actual in expected
+    if operator == 'not_empty':
+        return (len(actual) > 0) == expected
+    if operator == 'is':
+        return bool(actual) == expected
+    if operator == 'equals':
+        return actual == expected
+    return actual is not None and COMPARISON_FUNCTIONS[operator](actual, float(expected))
+
+
+class RuleStore(ReloadingFileStore):
+    """Holds the active RuleSet and hot-swaps it when the rules file changes"""
+
+    loader = RuleSet.load
+    path_env = "RULES_PATH"
+    default_path = DEFAULT_RULES_PATH
+    label = "Rules"
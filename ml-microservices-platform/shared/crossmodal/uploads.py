@@ -0,0 +1,32 @@
+import os
+from typing import AsyncIterator
+
+
+# Largest request body accepted with an image in it, in bytes
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+
+
+class BodyTooLarge(Exception):
+    """Raised once a request body has gone past the size limit; callers answer 413"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Request body exceeds the limit of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+async def limited(chunks: AsyncIterator[bytes], max_bytes: int = UPLOAD_MAX_BYTES) -> AsyncIterator[bytes]:
+    """Pass a body stream through chunk by chunk, failing as soon as it exceeds ``max_bytes``.
+
+    The check runs on every chunk, so an oversized upload is cut off after
+    at most one chunk over the limit instead of being read to the end.
+    """
+    received = 0
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise BodyTooLarge(max_bytes)
+        yield chunk
+
+
+async def read_limited(chunks: AsyncIterator[bytes], max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    return b"".join([chunk async for chunk in limited(chunks, max_bytes)])